@@ -14,7 +14,7 @@ const Feed = () => {
     try {
       const endpoint = feedType === "following" ? "/feed/" : "/posts/";
       const response = await axios.get(endpoint);
-      setPosts(response.data);
+      setPosts(response.data.results);
     } catch (error) {
       console.error("Error loading feed:", error);
     }
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import { useNavigate, useLocation } from "react-router-dom";
 import {
   Home,
@@ -21,18 +21,51 @@ const Header = () => {
   const { logout } = useAuth();
   const { theme, toggleTheme } = useTheme();
   const [notificationCount, setNotificationCount] = useState(0);
+  const unreadCountEtag = useRef(null);
 
   useEffect(() => {
     loadNotificationCount();
-    const interval = setInterval(loadNotificationCount, 30000);
-    return () => clearInterval(interval);
+    // Prefer pushed updates over Server-Sent Events; poll every 30 seconds
+    // if the stream is unavailable (e.g. the API is not served over ASGI).
+    let interval = null;
+    let source = null;
+    const startPolling = () => {
+      if (!interval) interval = setInterval(loadNotificationCount, 30000);
+    };
+    const token = localStorage.getItem("authToken");
+    if (window.EventSource && token) {
+      source = new EventSource(
+        `/api/notifications/stream/?token=${encodeURIComponent(token)}`
+      );
+      source.addEventListener("unread_count", (event) => {
+        setNotificationCount(JSON.parse(event.data).unread_count);
+      });
+      source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) startPolling();
+      };
+    } else {
+      startPolling();
+    }
+    return () => {
+      if (source) source.close();
+      if (interval) clearInterval(interval);
+    };
   }, []);
 
   const loadNotificationCount = async () => {
     try {
-      const response = await axios.get("/notifications/");
-      const unreadCount = response.data.filter((n) => !n.is_read).length;
-      setNotificationCount(unreadCount);
+      const headers = unreadCountEtag.current
+        ? { "If-None-Match": unreadCountEtag.current }
+        : {};
+      const response = await axios.get("/notifications/unread-count/", {
+        headers,
+        validateStatus: (status) => status === 200 || status === 304,
+      });
+      // 304 means the count has not changed since the last poll
+      if (response.status === 200) {
+        unreadCountEtag.current = response.headers.etag;
+        setNotificationCount(response.data.unread_count);
+      }
     } catch (error) {
       console.error("Error loading notification count:", error);
     }
@@ -14,8 +14,8 @@ const Notifications = () => {
 
   const loadNotifications = async () => {
     try {
-      const response = await axios.get("/notifications/");
-      setNotifications(response.data);
+      const response = await axios.get("/notifications/groups/");
+      setNotifications(response.data.results);
     } catch (error) {
       console.error("Error loading notifications:", error);
     }
@@ -24,7 +24,7 @@ const Notifications = () => {
 
   const markAsRead = async (notificationId) => {
     try {
-      await axios.post(`/notifications/${notificationId}/read/`);
+      await axios.post(`/notifications/groups/${notificationId}/read/`);
       setNotifications(
         notifications.map((n) =>
           n.id === notificationId ? { ...n, is_read: true } : n
@@ -104,7 +104,9 @@ const Notifications = () => {
           </div>
         ) : (
           <div>
-            {notifications.map((notification) => (
+            {notifications.map((notification) => {
+              const sender = notification.senders[0];
+              return (
               <div
                 key={notification.id}
                 className={`notification-item ${
@@ -116,14 +118,14 @@ const Notifications = () => {
                   }
                   if (notification.post) {
                     navigate("/");
-                  } else if (notification.notification_type === "follow") {
-                    navigate(`/profile/${notification.sender.id}`);
+                  } else if (notification.notification_type === "follow" && sender) {
+                    navigate(`/profile/${sender.id}`);
                   }
                 }}
               >
-                {notification.sender.profile?.profile_picture_url ? (
+                {sender && sender.profile_picture_url ? (
                   <img
-                    src={notification.sender.profile.profile_picture_url}
+                    src={sender.profile_picture_url}
                     alt="Profile"
                     style={{
                       width: "40px",
@@ -135,7 +137,7 @@ const Notifications = () => {
                   />
                 ) : (
                   <div className="user-avatar" style={{ marginRight: "12px" }}>
-                    {notification.sender.username.charAt(0).toUpperCase()}
+                    {sender ? sender.username.charAt(0).toUpperCase() : "?"}
                   </div>
                 )}
 
@@ -151,7 +153,7 @@ const Notifications = () => {
                       marginTop: "4px",
                     }}
                   >
-                    {formatTime(notification.created_at)}
+                    {formatTime(notification.latest_at)}
                   </p>
                 </div>
 
@@ -169,7 +171,8 @@ const Notifications = () => {
                   />
                 )}
               </div>
-            ))}
+              );
+            })}
           </div>
         )}
       </div>
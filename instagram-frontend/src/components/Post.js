@@ -2,6 +2,7 @@ import React, { useState } from "react";
 import { useNavigate } from "react-router-dom";
 import { Heart, MessageCircle, Send } from "lucide-react";
 import { useAuth } from "../contexts/AuthContext";
+import axios from "axios";
 
 const Post = ({
   post,
@@ -14,6 +15,8 @@ const Post = ({
   const [commentText, setCommentText] = useState("");
   const [showComments, setShowComments] = useState(false);
   const [submittingComment, setSubmittingComment] = useState(false);
+  const [thread, setThread] = useState([]);
+  const [threadNext, setThreadNext] = useState(null);
   const { user } = useAuth();
   const navigate = useNavigate();
 
@@ -37,6 +40,25 @@ const Post = ({
     setSubmittingComment(false);
   };
 
+  const loadThread = async (url = `/posts/${post.id}/comments/`) => {
+    try {
+      const response = await axios.get(url);
+      setThread((previous) =>
+        url === `/posts/${post.id}/comments/`
+          ? response.data.results
+          : [...previous, ...response.data.results]
+      );
+      setThreadNext(response.data.next);
+    } catch (error) {
+      console.error("Error loading comments:", error);
+    }
+  };
+
+  const handleShowComments = async () => {
+    await loadThread();
+    setShowComments(true);
+  };
+
   const handleFollow = () => {
     if (post.user.is_following) {
       onUnfollow(post.user.id);
@@ -64,9 +86,9 @@ const Post = ({
           className="post-user"
           onClick={() => navigate(`/profile/${post.user.id}`)}
         >
-          {post.user.profile?.profile_picture_url ? (
+          {post.user.profile_picture_url ? (
             <img
-              src={post.user.profile.profile_picture_url}
+              src={post.user.profile_picture_url}
               alt="Profile"
               style={{
                 width: "44px",
@@ -102,15 +124,30 @@ const Post = ({
         )}
       </div>
 
-      <img
-        src={post.image_display_url || post.image_url}
-        alt="Post"
-        className="post-image"
-        onError={(e) => {
-          e.target.src =
-            "data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNDAwIiBoZWlnaHQ9IjQwMCIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48cmVjdCB3aWR0aD0iMTAwJSIgaGVpZ2h0PSIxMDAlIiBmaWxsPSIjZGRkIi8+PHRleHQgeD0iNTAlIiB5PSI1MCUiIGZvbnQtZmFtaWx5PSJBcmlhbCIgZm9udC1zaXplPSIxOCIgZmlsbD0iIzk5OSIgdGV4dC1hbmNob3I9Im1pZGRsZSIgZHk9Ii4zZW0iPkltYWdlIG5vdCBmb3VuZDwvdGV4dD48L3N2Zz4=";
-        }}
-      />
+      {post.image_state === "processing" ? (
+        <div
+          className="post-image"
+          style={{
+            display: "flex",
+            alignItems: "center",
+            justifyContent: "center",
+            aspectRatio: "1",
+            color: "var(--text-secondary)",
+          }}
+        >
+          Processing photo...
+        </div>
+      ) : (
+        <img
+          src={post.image_display_url || post.image_url}
+          alt="Post"
+          className="post-image"
+          onError={(e) => {
+            e.target.src =
+              "data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNDAwIiBoZWlnaHQ9IjQwMCIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48cmVjdCB3aWR0aD0iMTAwJSIgaGVpZ2h0PSIxMDAlIiBmaWxsPSIjZGRkIi8+PHRleHQgeD0iNTAlIiB5PSI1MCUiIGZvbnQtZmFtaWx5PSJBcmlhbCIgZm9udC1zaXplPSIxOCIgZmlsbD0iIzk5OSIgdGV4dC1hbmNob3I9Im1pZGRsZSIgZHk9Ii4zZW0iPkltYWdlIG5vdCBmb3VuZDwvdGV4dD48L3N2Zz4=";
+          }}
+        />
+      )}
 
       <div className="post-actions">
         <button
@@ -150,16 +187,16 @@ const Post = ({
       )}
 
       <div className="post-comments">
-        {post.comments.slice(0, 2).map((comment) => (
+        {!showComments && post.comments.map((comment) => (
           <div key={comment.id} className="comment">
             <span className="comment-user">{comment.user.username}</span>
             {comment.text}
           </div>
         ))}
 
-        {post.comments_count > 2 && !showComments && (
+        {post.has_more_comments && !showComments && (
           <button
-            onClick={() => setShowComments(true)}
+            onClick={handleShowComments}
             style={{
               background: "none",
               border: "none",
@@ -174,7 +211,7 @@ const Post = ({
         )}
       </div>
 
-      {showComments && post.comments.length > 2 && (
+      {showComments && (
         <div
           style={{
             maxHeight: "300px",
@@ -182,7 +219,7 @@ const Post = ({
             padding: "0 20px",
           }}
         >
-          {post.comments.slice(2).map((comment) => (
+          {thread.map((comment) => (
             <div
               key={comment.id}
               className="comment"
@@ -203,6 +240,21 @@ const Post = ({
               </div>
             </div>
           ))}
+          {threadNext && (
+            <button
+              onClick={() => loadThread(threadNext)}
+              style={{
+                background: "none",
+                border: "none",
+                color: "var(--text-secondary)",
+                cursor: "pointer",
+                fontSize: "14px",
+                padding: "8px 0",
+              }}
+            >
+              Load more comments
+            </button>
+          )}
         </div>
       )}
 
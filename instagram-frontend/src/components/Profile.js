@@ -37,7 +37,7 @@ const Profile = () => {
     try {
       const endpoint = userId ? `/posts/user/${userId}/` : "/posts/my/";
       const response = await axios.get(endpoint);
-      setPosts(response.data);
+      setPosts(response.data.results);
     } catch (error) {
       console.error("Error loading posts:", error);
     }
@@ -53,7 +53,7 @@ const Profile = () => {
     try {
       const endpoint = userId ? `/followers/${userId}/` : "/followers/";
       const response = await axios.get(endpoint);
-      setFollowers(response.data);
+      setFollowers(response.data.results);
     } catch (error) {
       console.error("Error loading followers:", error);
     }
@@ -63,7 +63,7 @@ const Profile = () => {
     try {
       const endpoint = userId ? `/following/${userId}/` : "/following/";
       const response = await axios.get(endpoint);
-      setFollowing(response.data);
+      setFollowing(response.data.results);
     } catch (error) {
       console.error("Error loading following:", error);
     }
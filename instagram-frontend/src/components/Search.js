@@ -111,9 +111,9 @@ const Search = () => {
                   }}
                   onClick={() => navigate(`/profile/${user.id}`)}
                 >
-                  {user.profile?.profile_picture_url ? (
+                  {user.profile_picture_url ? (
                     <img
-                      src={user.profile.profile_picture_url}
+                      src={user.profile_picture_url}
                       alt="Profile"
                       style={{
                         width: "40px",
@@ -338,9 +338,9 @@ const Stories = () => {
                     }}
                     onClick={() => navigate(`/profile/${story.user.id}`)}
                   >
-                    {story.user.profile?.profile_picture_url ? (
+                    {story.user.profile_picture_url ? (
                       <img
-                        src={story.user.profile.profile_picture_url}
+                        src={story.user.profile_picture_url}
                         alt="Profile"
                         style={{
                           width: "24px",
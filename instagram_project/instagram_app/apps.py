@@ -1,5 +1,30 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 
 
 class InstagramAppConfig(AppConfig):
     name = 'instagram_app'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from .cache import invalidate_post
+        from .counters import recount_cascade, remember_cascade
+        from .sqlite import configure_connection
+        from .media import release_media, remember_media, sync_media
+        from .realtime import check_broker
+        from .search import index_user
+        connection_created.connect(configure_connection, dispatch_uid='instagram_app.sqlite')
+        checks.register(check_broker)
+        post_save.connect(index_user, sender=User, dispatch_uid='user-search-index')
+        post_delete.connect(invalidate_post, sender=self.get_model('Post'), dispatch_uid='response-cache-post')
+        # Cascade deletes bypass the counter updates the views make.
+        for model in (User, self.get_model('Post')):
+            pre_delete.connect(remember_cascade, sender=model, dispatch_uid=f'counters-before-{model.__name__}')
+            post_delete.connect(recount_cascade, sender=model, dispatch_uid=f'counters-after-{model.__name__}')
+        # Keep media reference counts in step with the rows that point at files.
+        for model in (self.get_model('Post'), self.get_model('Story'), self.get_model('UserProfile')):
+            pre_save.connect(remember_media, sender=model, dispatch_uid=f'media-before-{model.__name__}')
+            post_save.connect(sync_media, sender=model, dispatch_uid=f'media-after-{model.__name__}')
+            post_delete.connect(release_media, sender=model, dispatch_uid=f'media-delete-{model.__name__}')
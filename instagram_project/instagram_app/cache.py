@@ -0,0 +1,108 @@
+import hashlib
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+from . import routers
+
+TIMEOUT = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+KEY_PREFIX = 'respcache'
+STATS_KEYS = {
+    'hits': f'{KEY_PREFIX}:stats:hits',
+    'misses': f'{KEY_PREFIX}:stats:misses',
+}
+
+
+def _version_key(scope, obj_id):
+    return f'{KEY_PREFIX}:version:{scope}:{obj_id}'
+
+
+def versions(dependencies):
+    """Current version tokens for ``(scope, id)`` pairs, creating any that are missing."""
+    keys = [_version_key(scope, obj_id) for scope, obj_id in dependencies]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, None)
+        found.update(cache.get_many(missing))
+    return [found.get(key, '') for key in keys]
+
+
+def bump(scope, *ids):
+    """Invalidate every cached response that depends on the given objects."""
+    keys = [_version_key(scope, obj_id) for obj_id in ids]
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+    if transaction.get_connection().in_atomic_block:
+        # A concurrent reader may cache pre-commit data under the new version,
+        # so bump once more after the write is visible.
+        transaction.on_commit(lambda: cache.set_many({key: uuid.uuid4().hex for key in keys}, None))
+
+
+def invalidate_post(sender, instance, **kwargs):
+    """``post_delete`` handler: drop responses that showed the post or counted it."""
+    bump('post', instance.pk)
+    bump('user', instance.user_id)
+
+
+def _record(stat):
+    key = STATS_KEYS[stat]
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def stats():
+    values = cache.get_many(list(STATS_KEYS.values()))
+    hits = values.get(STATS_KEYS['hits'], 0)
+    misses = values.get(STATS_KEYS['misses'], 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else None,
+    }
+
+
+def reset_stats():
+    cache.delete_many(list(STATS_KEYS.values()))
+
+
+class CachedResponseMixin:
+    """
+    Cache successful GET responses under versioned keys.
+
+    Views list the ``(scope, id)`` pairs their response depends on in
+    ``get_cache_dependencies``; write paths call ``bump`` for the objects
+    they touch, which changes the key instead of deleting entries.
+    """
+    cache_timeout = TIMEOUT
+
+    def get_cache_dependencies(self):
+        return [('user', self.request.user.id)]
+
+    def get_cache_key(self, request):
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        version = hashlib.md5(':'.join(versions(self.get_cache_dependencies())).encode()).hexdigest()
+        return f'{KEY_PREFIX}:{self.__class__.__name__}:{request.user.id}:{path}:{version}'
+
+    def get(self, request, *args, **kwargs):
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            _record('hits')
+            return Response(data)
+
+        _record('misses')
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            timeout = self.cache_timeout
+            if routers.reading_from_replica():
+                # A lagging replica may predate the latest bump; keep such
+                # entries only about as long as replication lag is tolerated.
+                timeout = min(timeout, getattr(settings, 'REPLICA_STICKY_SECONDS', 10))
+            cache.set(key, response.data, timeout)
+        return response
@@ -0,0 +1,154 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from .models import Post, Like, Comment, Follow, Notification, Story, StoryView, UserProfile
+
+# counter field -> (source model, foreign key to the counted row, extra filters)
+POST_COUNTERS = {
+    'likes_count': (Like, 'post', {}),
+    'comments_count': (Comment, 'post', {}),
+}
+
+STORY_COUNTERS = {
+    'view_count': (StoryView, 'story', {}),
+}
+
+PROFILE_COUNTERS = {
+    'followers_count': (Follow, 'following', {}),
+    'following_count': (Follow, 'follower', {}),
+    'posts_count': (Post, 'user', {}),
+    'unread_notifications_count': (Notification, 'recipient', {'is_read': False}),
+}
+
+
+def _adjust(field, delta):
+    if delta < 0:
+        return Greatest(F(field) + delta, 0)
+    return F(field) + delta
+
+
+def _source_count(model, fk, filters, outer_field):
+    counts = (
+        model.objects.filter(**{fk: OuterRef(outer_field)}, **filters)
+        .order_by()
+        .values(fk)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def adjust_post(post_id, **deltas):
+    Post.objects.filter(pk=post_id).update(**{field: _adjust(field, delta) for field, delta in deltas.items()})
+
+
+def adjust_profile(user_id, **deltas):
+    updated = UserProfile.objects.filter(user_id=user_id).update(
+        **{field: _adjust(field, delta) for field, delta in deltas.items()}
+    )
+    if not updated:
+        # Users created outside registration may not have a profile yet;
+        # create it and count from the source tables, which already include
+        # the write being recorded.
+        UserProfile.objects.get_or_create(user_id=user_id)
+        rebuild_profiles(UserProfile.objects.filter(user_id=user_id))
+
+
+def post_counter_expressions():
+    return {field: _source_count(model, fk, filters, 'pk') for field, (model, fk, filters) in POST_COUNTERS.items()}
+
+
+def adjust_story(story_id, **deltas):
+    Story.objects.filter(pk=story_id).update(**{field: _adjust(field, delta) for field, delta in deltas.items()})
+
+
+def story_counter_expressions():
+    return {field: _source_count(model, fk, filters, 'pk') for field, (model, fk, filters) in STORY_COUNTERS.items()}
+
+
+def profile_counter_expressions():
+    return {
+        field: _source_count(model, fk, filters, 'user_id')
+        for field, (model, fk, filters) in PROFILE_COUNTERS.items()
+    }
+
+
+def rebuild_posts(queryset=None):
+    queryset = Post.objects.all() if queryset is None else queryset
+    return queryset.update(**post_counter_expressions())
+
+
+def rebuild_stories(queryset=None):
+    queryset = Story.objects.all() if queryset is None else queryset
+    return queryset.update(**story_counter_expressions())
+
+
+def rebuild_profiles(queryset=None, fields=None):
+    queryset = UserProfile.objects.all() if queryset is None else queryset
+    expressions = profile_counter_expressions()
+    if fields:
+        expressions = {field: expressions[field] for field in fields}
+    return queryset.update(**expressions)
+
+
+def _mismatches(queryset, expressions):
+    annotations = {f'actual_{field}': expression for field, expression in expressions.items()}
+    rows = queryset.annotate(**annotations).values('pk', *expressions, *annotations)
+    for row in rows.iterator():
+        drift = {
+            field: (row[field], row[f'actual_{field}'])
+            for field in expressions
+            if row[field] != row[f'actual_{field}']
+        }
+        if drift:
+            yield row['pk'], drift
+
+
+def post_mismatches():
+    return _mismatches(Post.objects.order_by(), post_counter_expressions())
+
+
+def story_mismatches():
+    return _mismatches(Story.objects.order_by(), story_counter_expressions())
+
+
+def profile_mismatches():
+    return _mismatches(UserProfile.objects.order_by(), profile_counter_expressions())
+
+
+def _rebuild_in_chunks(rebuild, model, field, ids, size=500):
+    ids = sorted(ids)
+    for start in range(0, len(ids), size):
+        rebuild(model.objects.filter(**{f'{field}__in': ids[start:start + size]}))
+
+
+def remember_cascade(sender, instance, **kwargs):
+    """pre_delete for User and Post: note whose counters the cascade is about to change.
+
+    Deleting a user or post removes follows, likes, comments, views and notifications
+    without going through the views that adjust counters, so the rows they counted
+    towards are recounted once the delete has run.
+    """
+    unread = Notification.objects.filter(is_read=False)
+    if isinstance(instance, Post):
+        instance._counter_cascade = (
+            set(),
+            set(),
+            {instance.user_id} | set(unread.filter(post=instance).values_list('recipient_id', flat=True)),
+        )
+        return
+    instance._counter_cascade = (
+        set(Like.objects.filter(user=instance).values_list('post_id', flat=True))
+        | set(Comment.objects.filter(user=instance).values_list('post_id', flat=True)),
+        set(StoryView.objects.filter(viewer=instance).values_list('story_id', flat=True)),
+        set(Follow.objects.filter(follower=instance).values_list('following_id', flat=True))
+        | set(Follow.objects.filter(following=instance).values_list('follower_id', flat=True))
+        | set(unread.filter(sender=instance).values_list('recipient_id', flat=True)),
+    )
+
+
+def recount_cascade(sender, instance, **kwargs):
+    """post_delete counterpart of remember_cascade."""
+    post_ids, story_ids, user_ids = getattr(instance, '_counter_cascade', ((), (), ()))
+    _rebuild_in_chunks(rebuild_posts, Post, 'id', post_ids)
+    _rebuild_in_chunks(rebuild_stories, Story, 'id', story_ids)
+    _rebuild_in_chunks(rebuild_profiles, UserProfile, 'user_id', user_ids)
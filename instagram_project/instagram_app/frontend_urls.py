@@ -963,13 +963,55 @@ def frontend_app(request):
         let currentFeedType = 'following'; // 'following' or 'explore'
         let currentFollowersTab = 'followers'; // 'followers' or 'following'
 
+        // Cursor pagination state: next page URL per list, null when exhausted
+        const nextPageUrls = {};
+        let loadingMore = false;
+
+        async function fetchPage(key, url) {
+            const response = await fetch(url, {
+                headers: { 'Authorization': `Bearer ${authToken}` }
+            });
+            if (!response.ok) {
+                throw new Error(`Failed to load ${key}: ${response.status}`);
+            }
+            const page = await response.json();
+            nextPageUrls[key] = page.next;
+            return page.results;
+        }
+
+        async function loadMore() {
+            let key = null;
+            if (!feedSection.classList.contains('hidden')) key = 'feed';
+            else if (!profileSection.classList.contains('hidden')) key = 'profilePosts';
+            else if (!notificationsSection.classList.contains('hidden')) key = 'notifications';
+            else if (!followersSection.classList.contains('hidden')) key = currentFollowersTab;
+            if (!key || !nextPageUrls[key] || loadingMore) return;
+
+            loadingMore = true;
+            try {
+                const items = await fetchPage(key, nextPageUrls[key]);
+                if (key === 'feed') displayPosts(items, currentFeedType === 'explore', true);
+                else if (key === 'profilePosts') displayUserPosts(items, true);
+                else if (key === 'notifications') displayNotifications(items, true);
+                else displayFollowersList(items, key, true);
+            } catch (error) {
+                console.error('Error loading more:', error);
+            }
+            loadingMore = false;
+        }
+
+        // Infinite scroll: fetch the next page when nearing the bottom
+        window.addEventListener('scroll', () => {
+            if (window.innerHeight + window.scrollY >= document.body.offsetHeight - 600) {
+                loadMore();
+            }
+        });
+
         // Initialize app
         if (authToken) {
             getCurrentUser().then(() => {
                 showFeed();
-                loadNotificationCount();
-                // Check for new notifications every 30 seconds
-                setInterval(loadNotificationCount, 30000);
+                startNotificationUpdates();
             }).catch(() => {
                 // Token might be expired
                 localStorage.removeItem('authToken');
@@ -1176,17 +1218,9 @@ def frontend_app(request):
 
         async function loadFollowingFeed() {
             try {
-                const response = await fetch(API_BASE + '/feed/', {
-                    headers: { 'Authorization': `Bearer ${authToken}` }
-                });
-                
-                if (response.ok) {
-                    const posts = await response.json();
-                    console.log('Following feed loaded:', posts.length, 'posts');
-                    displayPosts(posts);
-                } else {
-                    console.error('Failed to load following feed:', response.status);
-                }
+                const posts = await fetchPage('feed', API_BASE + '/feed/');
+                console.log('Following feed loaded:', posts.length, 'posts');
+                displayPosts(posts);
             } catch (error) {
                 console.error('Network error:', error);
             }
@@ -1194,25 +1228,19 @@ def frontend_app(request):
 
         async function loadExploreFeed() {
             try {
-                const response = await fetch(API_BASE + '/posts/', {
-                    headers: { 'Authorization': `Bearer ${authToken}` }
-                });
-                
-                if (response.ok) {
-                    const posts = await response.json();
-                    console.log('Explore feed loaded:', posts.length, 'posts');
-                    displayPosts(posts, true); // true = show follow buttons
-                }
+                const posts = await fetchPage('feed', API_BASE + '/posts/');
+                console.log('Explore feed loaded:', posts.length, 'posts');
+                displayPosts(posts, true); // true = show follow buttons
             } catch (error) {
                 console.error('Error loading explore feed:', error);
             }
         }
 
-        function displayPosts(posts, showFollowButtons = false) {
+        function displayPosts(posts, showFollowButtons = false, append = false) {
             const container = document.getElementById('feedPosts');
-            container.innerHTML = '';
+            if (!append) container.innerHTML = '';
 
-            if (posts.length === 0) {
+            if (posts.length === 0 && !append) {
                 const message = currentFeedType === 'following' 
                     ? 'No posts from people you follow yet! Try exploring or following some users.'
                     : 'No posts available yet!';
@@ -1244,8 +1272,8 @@ def frontend_app(request):
                     ${post.user.is_following ? 'Following' : 'Follow'}
                 </button>` : '';
             
-            const hasMoreComments = post.comments_count > 2;
-            const visibleComments = post.comments.slice(0, 2);
+            const hasMoreComments = post.has_more_comments;
+            const visibleComments = post.comments;
             
             div.innerHTML = `
                 <div class="post-header">
@@ -1333,22 +1361,16 @@ def frontend_app(request):
         async function loadUserPosts(userId = null) {
             try {
                 const endpoint = userId ? `/posts/user/${userId}/` : '/posts/my/';
-                const response = await fetch(API_BASE + endpoint, {
-                    headers: { 'Authorization': `Bearer ${authToken}` }
-                });
-                
-                if (response.ok) {
-                    const posts = await response.json();
-                    displayUserPosts(posts);
-                }
+                const posts = await fetchPage('profilePosts', API_BASE + endpoint);
+                displayUserPosts(posts);
             } catch (error) {
                 console.error('Error loading user posts:', error);
             }
         }
 
-        function displayUserPosts(posts) {
+        function displayUserPosts(posts, append = false) {
             const container = document.getElementById('profilePosts');
-            container.innerHTML = '';
+            if (!append) container.innerHTML = '';
 
             posts.forEach(post => {
                 const div = document.createElement('div');
@@ -1499,35 +1521,56 @@ def frontend_app(request):
         // Notifications functionality
         async function loadNotifications() {
             try {
-                const response = await fetch(API_BASE + '/notifications/', {
-                    headers: { 'Authorization': `Bearer ${authToken}` }
-                });
-                
-                if (response.ok) {
-                    const notifications = await response.json();
-                    displayNotifications(notifications);
-                }
+                const notifications = await fetchPage('notifications', API_BASE + '/notifications/groups/');
+                displayNotifications(notifications);
             } catch (error) {
                 console.error('Error loading notifications:', error);
             }
         }
 
+        let unreadCountEtag = null;
         async function loadNotificationCount() {
             try {
-                const response = await fetch(API_BASE + '/notifications/', {
-                    headers: { 'Authorization': `Bearer ${authToken}` }
-                });
+                const headers = { 'Authorization': `Bearer ${authToken}` };
+                if (unreadCountEtag) headers['If-None-Match'] = unreadCountEtag;
+                const response = await fetch(API_BASE + '/notifications/unread-count/', { headers });
                 
+                // 304 means the count has not changed since the last poll
                 if (response.ok) {
-                    const notifications = await response.json();
-                    const unreadCount = notifications.filter(n => !n.is_read).length;
-                    updateNotificationBadge(unreadCount);
+                    unreadCountEtag = response.headers.get('ETag');
+                    const data = await response.json();
+                    updateNotificationBadge(data.unread_count);
                 }
             } catch (error) {
                 console.error('Error loading notification count:', error);
             }
         }
 
+        // Push notification updates over Server-Sent Events when the server
+        // runs under ASGI, falling back to polling every 30 seconds.
+        let notificationPoller = null;
+        function startNotificationUpdates() {
+            loadNotificationCount();
+            if (!window.EventSource) {
+                startNotificationPolling();
+                return;
+            }
+            const source = new EventSource(`${API_BASE}/notifications/stream/?token=${encodeURIComponent(authToken)}`);
+            source.addEventListener('unread_count', (event) => {
+                updateNotificationBadge(JSON.parse(event.data).unread_count);
+            });
+            source.addEventListener('notification', () => {
+                if (!notificationsSection.classList.contains('hidden')) loadNotifications();
+            });
+            source.onerror = () => {
+                if (source.readyState === EventSource.CLOSED) startNotificationPolling();
+            };
+        }
+
+        function startNotificationPolling() {
+            if (!notificationPoller) notificationPoller = setInterval(loadNotificationCount, 30000);
+        }
+
         function updateNotificationBadge(count) {
             const badge = document.getElementById('notificationBadge');
             if (count > 0) {
@@ -1538,29 +1581,31 @@ def frontend_app(request):
             }
         }
 
-        function displayNotifications(notifications) {
+        function displayNotifications(notifications, append = false) {
             const container = document.getElementById('notificationsList');
             
-            if (notifications.length === 0) {
+            if (notifications.length === 0 && !append) {
                 container.innerHTML = '<p style="text-align: center; color: #8e8e8e; padding: 40px;">No notifications yet</p>';
                 return;
             }
 
-            container.innerHTML = notifications.map(notification => `
-                <div class="notification-item ${!notification.is_read ? 'unread' : ''}" onclick="markNotificationRead(${notification.id})">
-                    <div class="notification-avatar">${notification.sender.username.charAt(0).toUpperCase()}</div>
+            const html = notifications.map(group => `
+                <div class="notification-item ${!group.is_read ? 'unread' : ''}" onclick="markNotificationGroupRead(${group.id})">
+                    <div class="notification-avatar">${group.senders.length ? group.senders[0].username.charAt(0).toUpperCase() : '?'}</div>
                     <div class="notification-content">
-                        <p class="notification-text">${notification.message}</p>
-                        <p class="notification-time">${formatTime(notification.created_at)}</p>
+                        <p class="notification-text">${group.message}</p>
+                        <p class="notification-time">${formatTime(group.latest_at)}</p>
                     </div>
-                    ${notification.post_image ? `<img src="${notification.post_image}" class="notification-post-image" alt="Post">` : ''}
+                    ${group.post_image ? `<img src="${group.post_image}" class="notification-post-image" alt="Post">` : ''}
                 </div>
             `).join('');
+            if (append) container.insertAdjacentHTML('beforeend', html);
+            else container.innerHTML = html;
         }
 
-        async function markNotificationRead(notificationId) {
+        async function markNotificationGroupRead(groupId) {
             try {
-                await fetch(`${API_BASE}/notifications/${notificationId}/read/`, {
+                await fetch(`${API_BASE}/notifications/groups/${groupId}/read/`, {
                     method: 'POST',
                     headers: { 'Authorization': `Bearer ${authToken}` }
                 });
@@ -1601,14 +1646,8 @@ def frontend_app(request):
 
         async function loadFollowers() {
             try {
-                const response = await fetch(API_BASE + '/followers/', {
-                    headers: { 'Authorization': `Bearer ${authToken}` }
-                });
-                
-                if (response.ok) {
-                    const followers = await response.json();
-                    displayFollowersList(followers, 'followers');
-                }
+                const followers = await fetchPage('followers', API_BASE + '/followers/');
+                displayFollowersList(followers, 'followers');
             } catch (error) {
                 console.error('Error loading followers:', error);
             }
@@ -1616,29 +1655,23 @@ def frontend_app(request):
 
         async function loadFollowing() {
             try {
-                const response = await fetch(API_BASE + '/following/', {
-                    headers: { 'Authorization': `Bearer ${authToken}` }
-                });
-                
-                if (response.ok) {
-                    const following = await response.json();
-                    displayFollowersList(following, 'following');
-                }
+                const following = await fetchPage('following', API_BASE + '/following/');
+                displayFollowersList(following, 'following');
             } catch (error) {
                 console.error('Error loading following:', error);
             }
         }
 
-        function displayFollowersList(users, type) {
+        function displayFollowersList(users, type, append = false) {
             const container = document.getElementById('followersContent');
             
-            if (users.length === 0) {
+            if (users.length === 0 && !append) {
                 const message = type === 'followers' ? 'No followers yet' : 'Not following anyone yet';
                 container.innerHTML = `<p style="text-align: center; color: #8e8e8e; padding: 40px;">${message}</p>`;
                 return;
             }
 
-            container.innerHTML = users.map(user => `
+            const html = users.map(user => `
                 <div class="user-result">
                     <div class="user-info" onclick="showProfile(${user.id})" style="cursor: pointer;">
                         <div class="user-avatar">${user.username.charAt(0).toUpperCase()}</div>
@@ -1652,6 +1685,8 @@ def frontend_app(request):
                     </button>
                 </div>
             `).join('');
+            if (append) container.insertAdjacentHTML('beforeend', html);
+            else container.innerHTML = html;
         }
 
         // Comment functionality
@@ -1667,30 +1702,26 @@ def frontend_app(request):
             }
         }
 
-        async function loadComments(postId) {
+        async function loadComments(postId, append = false) {
             try {
-                const response = await fetch(`${API_BASE}/posts/${postId}/comments/`, {
-                    headers: { 'Authorization': `Bearer ${authToken}` }
-                });
-                
-                if (response.ok) {
-                    const comments = await response.json();
-                    displayComments(postId, comments);
-                }
+                const key = `comments-${postId}`;
+                const url = append ? nextPageUrls[key] : `${API_BASE}/posts/${postId}/comments/`;
+                const comments = await fetchPage(key, url);
+                displayComments(postId, comments, append);
             } catch (error) {
                 console.error('Error loading comments:', error);
             }
         }
 
-        function displayComments(postId, comments) {
+        function displayComments(postId, comments, append = false) {
             const container = document.getElementById(`comments-list-${postId}`);
             
-            if (comments.length === 0) {
+            if (comments.length === 0 && !append) {
                 container.innerHTML = '<p style="text-align: center; color: #8e8e8e; padding: 20px;">No comments yet</p>';
                 return;
             }
 
-            container.innerHTML = comments.map(comment => `
+            const html = comments.map(comment => `
                 <div class="comment-expanded">
                     <strong>${comment.user.username}</strong>
                     <span style="margin-left: 8px;">${comment.text}</span>
@@ -1699,6 +1730,11 @@ def frontend_app(request):
                     </div>
                 </div>
             `).join('');
+            const moreButton = nextPageUrls[`comments-${postId}`]
+                ? `<button class="show-comments-btn" onclick="this.remove(); loadComments(${postId}, true)">Load more comments</button>`
+                : '';
+            if (append) container.insertAdjacentHTML('beforeend', html + moreButton);
+            else container.innerHTML = html + moreButton;
         }
 
         async function addComment(postId) {
@@ -0,0 +1,180 @@
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import ImageJob, Post
+from . import cache as response_cache
+from . import images
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = getattr(settings, 'IMAGE_JOB_MAX_ATTEMPTS', 3)
+# Seconds before the first retry; doubled for every further attempt.
+RETRY_DELAY = getattr(settings, 'IMAGE_JOB_RETRY_DELAY', 30)
+# A claimed job becomes available again if its worker dies mid-way.
+LEASE_SECONDS = getattr(settings, 'IMAGE_JOB_LEASE_SECONDS', 600)
+THREADS = getattr(settings, 'IMAGE_WORKER_THREADS', 2)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _backend():
+    return getattr(settings, 'IMAGE_QUEUE', 'memory')
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix='image-worker')
+        return _executor
+
+
+def _run_in_thread(job_id):
+    close_old_connections()
+    try:
+        run_job(job_id)
+    except Exception:
+        logger.exception('Image job %s crashed', job_id)
+    finally:
+        close_old_connections()
+
+
+def _submit(job_id, delay=0):
+    if delay:
+        timer = threading.Timer(delay, _submit, args=(job_id,))
+        timer.daemon = True
+        timer.start()
+    else:
+        _get_executor().submit(_run_in_thread, job_id)
+
+
+def _lease(seconds=0):
+    return timezone.now() + timedelta(seconds=seconds + LEASE_SECONDS)
+
+
+def enqueue(instance):
+    """Queue variant generation for a post or story saved with ``image_state='processing'``."""
+    field = 'post' if isinstance(instance, Post) else 'story'
+    backend = _backend()
+    job = ImageJob(**{field: instance})
+    if backend == 'memory':
+        # Leased to this process; `resume` picks it up if the process dies first.
+        job.available_at = _lease()
+    job.save()
+    if backend == 'memory':
+        transaction.on_commit(lambda: _submit(job.id))
+    elif backend == 'sync':
+        run_job(job.id, instance)
+    # 'database': picked up by `manage.py run_image_worker`.
+    return job
+
+
+def _finish(instance):
+    instance.image_state = 'ready'
+    type(instance).objects.filter(pk=instance.pk).update(image_state='ready')
+    if isinstance(instance, Post):
+        response_cache.bump('post', instance.pk)
+        response_cache.bump('user', instance.user_id)
+
+
+def _fail(job, instance, error):
+    job.last_error = f'{type(error).__name__}: {error}'
+    if job.attempts >= MAX_ATTEMPTS:
+        job.failed = True
+        job.save(update_fields=['last_error', 'failed'])
+        instance.image_state = 'failed'
+        type(instance).objects.filter(pk=instance.pk).update(image_state='failed')
+        logger.error('Image job %s failed after %d attempts: %s', job.id, job.attempts, job.last_error)
+        return
+    delay = RETRY_DELAY * 2 ** (job.attempts - 1)
+    if _backend() == 'memory':
+        job.available_at = _lease(delay)
+    else:
+        job.available_at = timezone.now() + timedelta(seconds=delay)
+    job.save(update_fields=['last_error', 'available_at'])
+    logger.warning('Image job %s failed (attempt %d), retrying in %ss: %s', job.id, job.attempts, delay, job.last_error)
+    if _backend() == 'memory':
+        _submit(job.id, delay)
+
+
+def run_job(job_id, instance=None):
+    """Generate the variants for one job; returns True when it succeeded."""
+    if not ImageJob.objects.filter(pk=job_id, failed=False).update(attempts=F('attempts') + 1, available_at=_lease()):
+        return False
+    job = ImageJob.objects.select_related('post', 'story').get(pk=job_id)
+    instance = instance or job.target
+    try:
+        images.process(instance)
+    except Exception as error:
+        _fail(job, instance, error)
+        return False
+    _finish(instance)
+    job.delete()
+    return True
+
+
+def claim(batch_size):
+    """Lease up to ``batch_size`` due jobs for this worker and return their ids."""
+    with transaction.atomic():
+        jobs = ImageJob.objects.filter(failed=False, available_at__lte=timezone.now())
+        if connection.features.has_select_for_update_skip_locked:
+            jobs = jobs.select_for_update(skip_locked=True)
+        ids = list(jobs.values_list('id', flat=True)[:batch_size])
+        ImageJob.objects.filter(id__in=ids).update(available_at=_lease())
+    return ids
+
+
+def claim_stale(batch_size=1000):
+    """
+    Lease every due job and return their ids: with IMAGE_QUEUE = 'memory',
+    jobs whose server process died before running or finishing them.
+    """
+    ids = []
+    while batch := claim(batch_size):
+        ids += batch
+    return ids
+
+
+def resume():
+    """Run this process's share of the jobs orphaned by dead server processes (IMAGE_QUEUE = 'memory')."""
+    if _backend() != 'memory':
+        # run_image_worker claims them once their lease runs out.
+        return []
+    try:
+        ids = claim_stale()
+    except DatabaseError:
+        # E.g. started before the first migrate; left for the next start.
+        logger.exception('Could not resume orphaned image jobs')
+        return []
+    for job_id in ids:
+        _submit(job_id)
+    if ids:
+        logger.warning('Resuming %d image jobs left by a dead process', len(ids))
+    return ids
+
+
+def requeue_failed():
+    """Move dead-lettered jobs back to the queue; returns their ids."""
+    jobs = ImageJob.objects.filter(failed=True)
+    ids = list(jobs.values_list('id', flat=True))
+    jobs.update(failed=False, attempts=0, available_at=timezone.now())
+    return ids
+
+
+def _init_process():
+    import django
+    django.setup()
+
+
+def run_in_processes(job_ids, processes):
+    """Run jobs in a pool of worker processes; returns how many succeeded."""
+    # Children must open their own database connections.
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_process) as pool:
+        return sum(pool.map(run_job, job_ids))
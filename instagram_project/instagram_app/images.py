@@ -0,0 +1,106 @@
+import logging
+import posixpath
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> longest edge in pixels, largest first.
+VARIANTS = getattr(settings, 'IMAGE_VARIANTS', {'full': 1440, 'feed': 640, 'thumbnail': 160})
+# Output format -> encoder quality; the first format is the one served by default.
+FORMATS = getattr(settings, 'IMAGE_VARIANT_FORMATS', {'webp': 80, 'jpeg': 85})
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+
+def _open(file):
+    image = Image.open(file)
+    # Let the JPEG decoder downscale by a power of two while decoding, which
+    # is far cheaper than decoding a 12 MP original at full size.
+    largest = max(VARIANTS.values())
+    image.draft('RGB', (largest, largest))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    return image
+
+
+def _flatten(image):
+    if image.mode == 'RGB':
+        return image
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def _encode(image, image_format, quality):
+    buffer = BytesIO()
+    if image_format == 'jpeg':
+        _flatten(image).save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, format=image_format.upper(), quality=quality, method=4)
+    # No exif/icc arguments are passed, so encoded variants carry no metadata.
+    return buffer.getvalue()
+
+
+def render_variants(file):
+    """
+    Decode an uploaded image, apply its EXIF orientation and return
+    ``{variant: (width, height, {format: bytes})}`` without any metadata.
+    """
+    image = _open(file)
+    rendered = {}
+    for name, edge in sorted(VARIANTS.items(), key=lambda item: -item[1]):
+        # Each variant is resized from the previous, larger one.
+        image.thumbnail((edge, edge), Image.LANCZOS)
+        rendered[name] = (image.width, image.height, {
+            image_format: _encode(image, image_format, quality) for image_format, quality in FORMATS.items()
+        })
+    return rendered
+
+
+def store_variants(instance, rendered):
+    """Save rendered variants next to ``instance.image`` and return the ``image_variants`` value."""
+    storage = instance.image.storage
+    directory, filename = posixpath.split(instance.image.name)
+    stem = posixpath.splitext(filename)[0]
+    # When reprocessing, the source is itself a variant: reuse its directory and base name.
+    if posixpath.basename(directory) != 'variants':
+        directory = posixpath.join(directory, 'variants')
+    for name in VARIANTS:
+        if stem.endswith(f'_{name}'):
+            stem = stem[:-len(name) - 1]
+            break
+    variants = {}
+    for name, (width, height, encoded) in rendered.items():
+        files = {}
+        for image_format, data in encoded.items():
+            path = posixpath.join(directory, f'{stem}_{name}.{EXTENSIONS.get(image_format, image_format)}')
+            files[image_format] = storage.save(path, ContentFile(data))
+        variants[name] = {'width': width, 'height': height, 'files': files}
+    return variants
+
+
+def process(instance):
+    """
+    Generate responsive variants for ``instance.image`` (a Post or Story).
+
+    The uploaded original is replaced by the largest variant, so the file
+    served from ``image`` no longer carries EXIF data such as GPS position.
+    Processing again starts from that lossy variant, not the original.
+    """
+    if not instance.image:
+        return False
+    with instance.image.open('rb') as file:
+        rendered = render_variants(file)
+
+    variants = store_variants(instance, rendered)
+    largest = max(variants, key=lambda name: variants[name]['width'] * variants[name]['height'])
+    files = variants[largest]['files']
+    instance.image.name = files.get('jpeg') or next(iter(files.values()))
+    instance.image_variants = variants
+    # Saving through the model releases the original upload and any previous
+    # generation of variants (see media.py).
+    instance.save(update_fields=['image', 'image_variants'])
+    return True
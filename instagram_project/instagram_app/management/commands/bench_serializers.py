@@ -0,0 +1,55 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.request import Request
+from instagram_app.models import Follow, UserProfile
+from instagram_app.serializers import UserSerializer, UserSummarySerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare the per-object serialization cost of UserSerializer and UserSummarySerializer.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Number of users to serialize per round.')
+        parser.add_argument('--rounds', type=int, default=5, help='Number of timed rounds per serializer.')
+
+    def handle(self, *args, **options):
+        # Seed throwaway users inside a transaction that is always rolled back.
+        with transaction.atomic():
+            users = self.seed(options['users'])
+            request = self.make_request(users[0])
+            for serializer_class in (UserSerializer, UserSummarySerializer):
+                self.bench(serializer_class, users, request, options['rounds'])
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        User.objects.bulk_create([User(username=f'bench_user_{i}') for i in range(count)])
+        users = list(User.objects.filter(username__startswith='bench_user_').order_by('id'))
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+        Follow.objects.bulk_create([Follow(follower=users[0], following=user) for user in users[1::2]])
+        return list(User.objects.filter(id__in=[user.id for user in users]).select_related('profile'))
+
+    def make_request(self, viewer):
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=viewer)
+        request = Request(request)
+        request.user = viewer
+        return request
+
+    def bench(self, serializer_class, users, request, rounds):
+        best = None
+        for _ in range(rounds):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                serializer_class(users, many=True, context={'request': request}).data
+                elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+
+        per_object_us = best / len(users) * 1_000_000
+        self.stdout.write(
+            f'{serializer_class.__name__:<24} {per_object_us:8.1f} us/object  '
+            f'{len(queries.captured_queries) / len(users):6.2f} queries/object'
+        )
@@ -0,0 +1,27 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from instagram_app import media
+from instagram_app.models import MediaBlob
+
+
+class Command(BaseCommand):
+    help = 'Delete stored media blobs that no post, story or profile has referenced for the grace period.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-seconds', type=int, default=int(media.GRACE_PERIOD.total_seconds()),
+            help='Only collect blobs unreferenced for at least this long.',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted.')
+
+    def handle(self, *args, **options):
+        grace_period = timedelta(seconds=options['grace_seconds'])
+        if options['dry_run']:
+            cutoff = timezone.now() - grace_period
+            blobs = MediaBlob.objects.filter(refcount=0, released_at__lt=cutoff)
+            total = sum(blobs.values_list('size', flat=True))
+            self.stdout.write(f'{blobs.count()} unreferenced blobs ({total} bytes) would be deleted.')
+            return
+        collected = media.collect_garbage(grace_period)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {collected} unreferenced blobs.'))
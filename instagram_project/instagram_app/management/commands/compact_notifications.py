@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from instagram_app import retention
+
+
+class Command(BaseCommand):
+    help = 'Archive read notifications older than NOTIFICATION_RETENTION_DAYS and drop their read groups.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--archive',
+            choices=['table', 'jsonl'],
+            default='table',
+            help='Move notifications to the ArchivedNotification table or append them to a gzipped JSON Lines file.',
+        )
+        parser.add_argument('--output', help='Archive file for --archive jsonl (default: notifications-<date>.jsonl.gz).')
+        parser.add_argument('--batch-size', type=int, default=retention.BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, help='Stop each notification type after this many batches.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows would be compacted.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        if options['dry_run']:
+            for notification_type, cutoff in retention.cutoffs().items():
+                notifications = retention.expired_notifications(notification_type, cutoff).count()
+                groups = retention.expired_groups(notification_type, cutoff).count()
+                self.stdout.write(f'{notification_type}: {notifications} notifications and {groups} groups before {cutoff:%Y-%m-%d}')
+            return
+
+        if options['archive'] == 'jsonl':
+            path = options['output'] or f'notifications-{timezone.now():%Y%m%d}.jsonl.gz'
+            archive = retention.archive_to_jsonl(path)
+        else:
+            archive = retention.archive_to_table
+
+        results = retention.compact(archive, batch_size=options['batch_size'], max_batches=options['max_batches'])
+        for notification_type, (archived, groups) in results.items():
+            self.stdout.write(f'{notification_type}: archived {archived} notifications, deleted {groups} groups')
+        self.stdout.write(self.style.SUCCESS(
+            f'Compacted {sum(archived for archived, _ in results.values())} notifications.'
+        ))
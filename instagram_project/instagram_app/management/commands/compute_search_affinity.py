@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+from instagram_app import search
+
+
+class Command(BaseCommand):
+    help = 'Precompute friends-of-friends affinity used to rank user search results.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Users recomputed per transaction.')
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='Only recompute these user ids.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        written = search.rebuild_affinity(options['user_ids'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} affinity rows.'))
@@ -0,0 +1,168 @@
+import random
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.request import Request
+from instagram_app import search, timeline, views
+from instagram_app.models import Comment, Follow, Notification, Post, Story, TimelineEntry, UserProfile
+from instagram_app.pagination import KeysetPagination
+
+PAGE_SIZE = KeysetPagination.page_size + 1
+# Queries allowed to sort, and why the sort stays small.
+BOUNDED_SORTS = {
+    'stories': 'only live stories of followed accounts are sorted',
+    'user search trigram': 'groups only the postings of the query\'s trigrams',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'EXPLAIN the hot read queries, built by the views themselves, on seeded data and check that each '
+        'one uses its index without sorting.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Number of users to seed.')
+        parser.add_argument('--posts', type=int, default=20, help='Posts per seeded user.')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the full plan for every query.')
+
+    def handle(self, *args, **options):
+        # Seed throwaway rows inside a transaction that is always rolled back.
+        with transaction.atomic():
+            users = self.seed(options['users'], options['posts'])
+            failures = [
+                label for label, queryset, index in self.hot_queries(users)
+                if not self.check_plan(label, queryset, index, options['verbose_plans'])
+            ]
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f'No sort-free index scan for: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('Every hot query uses its index without sorting.'))
+
+    def seed(self, user_count, posts_per_user):
+        User.objects.bulk_create([User(username=f'explain_user_{i}') for i in range(user_count)])
+        users = list(User.objects.filter(username__startswith='explain_user_').order_by('id'))
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+
+        now = timezone.now()
+        rng = random.Random(0)
+        Post.objects.bulk_create([
+            # A few accounts over the fan-out limit, whose posts are merged on read.
+            Post(user=user, image_url='https://example.com/p.jpg', timeline_fanout='pull' if i % 50 == 0 else 'push')
+            for i, user in enumerate(users) for _ in range(posts_per_user)
+        ], batch_size=1000)
+        posts = list(Post.objects.filter(user__in=users).values_list('id', flat=True))
+        Follow.objects.bulk_create([
+            Follow(follower=follower, following=following)
+            for follower in users for following in rng.sample(users, min(len(users), 50)) if following != follower
+        ], batch_size=1000, ignore_conflicts=True)
+        followed = Follow.objects.filter(follower=users[0]).values('following_id')
+        TimelineEntry.objects.bulk_create([
+            TimelineEntry(user=users[0], post=post, created_at=post.created_at)
+            for post in Post.objects.filter(user__in=followed).only('id', 'created_at')
+        ], batch_size=1000)
+        Comment.objects.bulk_create([
+            Comment(post_id=post_id, user=rng.choice(users), text='nice')
+            for post_id in posts for _ in range(3)
+        ], batch_size=1000)
+        Story.objects.bulk_create([
+            Story(user=user, image_url='https://example.com/s.jpg', expires_at=now + timedelta(hours=rng.randint(-48, 24)))
+            for user in users for _ in range(5)
+        ], batch_size=1000)
+        Notification.objects.bulk_create([
+            Notification(
+                recipient=recipient,
+                sender=sender,
+                notification_type='like',
+                post_id=rng.choice(posts),
+                is_read=rng.random() < 0.9,
+            )
+            for recipient in users for sender in rng.sample(users, min(len(users), 20))
+        ], batch_size=1000, ignore_conflicts=True)
+
+        search.rebuild()
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return users
+
+    @staticmethod
+    def view(view_class, user, **kwargs):
+        """``view_class`` set up as it would be for a GET by ``user``."""
+        request = Request(RequestFactory().get('/'))
+        request.user = user
+        return view_class(request=request, args=(), kwargs=kwargs, format_kwarg=None)
+
+    def view_page(self, view_class, user, after_first_page=False, **kwargs):
+        """The page query ``view_class`` runs for ``user``: the first page, or the one after it."""
+        view = self.view(view_class, user, **kwargs)
+        queryset = view.get_queryset()
+        paginator = KeysetPagination()
+        cursor = None
+        if after_first_page:
+            # The last row shown on the first page.
+            last = list(paginator.page_queryset(queryset, view, limit=PAGE_SIZE))[-2]
+            cursor = (getattr(last, paginator.get_ordering(queryset, view)[0]), last.pk)
+        return paginator.page_queryset(queryset, view, cursor, PAGE_SIZE)
+
+    def hot_queries(self, users):
+        viewer = users[0]
+        author = Follow.objects.filter(follower=viewer).values_list('following_id', flat=True).first()
+        post = Post.objects.filter(user=viewer).first()
+        last_entry = list(timeline.timeline_page(viewer, limit=PAGE_SIZE))[-2]
+        return [
+            ('feed', timeline.timeline_page(viewer, limit=PAGE_SIZE), 'timeline_user_created_idx'),
+            (
+                'feed page 2',
+                timeline.timeline_page(viewer, (last_entry.created_at, last_entry.post_id), PAGE_SIZE),
+                'timeline_user_created_idx',
+            ),
+            ('feed pull authors', timeline.fanout_on_read_author_ids(viewer), 'post_user_fanout_idx'),
+            ('feed pull', timeline.author_page(viewer, author, limit=PAGE_SIZE), 'post_user_created_idx'),
+            ('explore', self.view_page(views.PostListCreateView, viewer), 'post_created_idx'),
+            ('explore page 2', self.view_page(views.PostListCreateView, viewer, True), 'post_created_idx'),
+            ('user posts', self.view_page(views.UserPostsView, viewer, user_id=viewer.id), 'post_user_created_idx'),
+            (
+                'user posts page 2',
+                self.view_page(views.UserPostsView, viewer, True, user_id=viewer.id),
+                'post_user_created_idx',
+            ),
+            ('followers', self.view_page(views.FollowersListView, viewer, user_id=author), 'follow_following_created_idx'),
+            ('following', self.view_page(views.FollowingListView, viewer, user_id=author), 'follow_follower_created_idx'),
+            ('comments', self.view_page(views.CommentListCreateView, viewer, post_id=post.id), 'comment_post_created_idx'),
+            ('notifications', self.view_page(views.NotificationListView, viewer), 'notification_recipient_idx'),
+            ('notification groups', self.view_page(views.NotificationGroupListView, viewer), 'notifgroup_recipient_idx'),
+            ('stories', self.view(views.StoryListCreateView, viewer).get_queryset(), 'story_user_expires_idx'),
+            (
+                'user stories',
+                self.view(views.UserStoriesView, viewer, user_id=viewer.id).get_queryset(),
+                'story_user_expires_idx',
+            ),
+            (
+                'mark all read',
+                Notification.objects.filter(recipient=viewer, is_read=False).order_by(),
+                'notification_unread_idx',
+            ),
+            ('user search prefix', search.prefix_matches('username', 'explain_user_1', viewer.id), 'usersearch_username_idx'),
+            ('user search name', search.prefix_matches('full_name', 'explain', viewer.id), 'usersearch_full_name_idx'),
+            ('user search trigram', search.trigram_matches(search.trigrams('user_12'), viewer.id), 'usersearch_trigram_idx'),
+        ]
+
+    def check_plan(self, label, queryset, index, verbose):
+        plan = queryset.explain()
+        if index not in plan:
+            status = self.style.ERROR('MISSING')
+        elif 'USE TEMP B-TREE' in plan and label not in BOUNDED_SORTS:
+            # The index is used, but the rows still have to be sorted.
+            status = self.style.ERROR('SORTED')
+        else:
+            status = self.style.SUCCESS('ok')
+        ok = status == self.style.SUCCESS('ok')
+        self.stdout.write(f'{label:<22} {index:<28} {status}')
+        if verbose or not ok:
+            self.stdout.write('\n'.join(f'    {line}' for line in plan.splitlines()))
+        return ok
@@ -0,0 +1,32 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from instagram_app import timeline
+
+
+class Command(BaseCommand):
+    help = (
+        'Fan out posts left pending by a server process that died, and trim every home timeline '
+        'to TIMELINE_MAX_ENTRIES.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-seconds', type=int, default=int(timeline.PENDING_GRACE.total_seconds()),
+            help='Only fan out posts pending for at least this long.',
+        )
+        parser.add_argument('--batch-size', type=int, default=timeline.BATCH_SIZE, help='Users trimmed per query.')
+        parser.add_argument('--interval', type=float, default=300.0, help='Seconds to sleep between passes.')
+        parser.add_argument('--once', action='store_true', help='Run a single pass and exit.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        while True:
+            fanned_out = timeline.fan_out_pending(timedelta(seconds=options['grace_seconds']))
+            trimmed = timeline.trim_all(options['batch_size'])
+            if fanned_out or trimmed:
+                self.stdout.write(f'Fanned out {fanned_out} pending posts, trimmed {trimmed} timeline entries')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,49 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from instagram_app import counters
+from instagram_app.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized like/comment/follower/post/story-view counters from their source tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report counters that drifted from their source tables; exit non-zero if any did.',
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            self.check_counters()
+            return
+
+        missing = User.objects.filter(profile__isnull=True).values_list('id', flat=True)
+        created = UserProfile.objects.bulk_create([UserProfile(user_id=user_id) for user_id in missing])
+        posts = counters.rebuild_posts()
+        stories = counters.rebuild_stories()
+        profiles = counters.rebuild_profiles()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt counters for {posts} posts, {stories} stories and {profiles} profiles '
+            f'({len(created)} profiles created).'
+        ))
+
+    def check_counters(self):
+        drifted = 0
+        for label, mismatches in (
+            ('Post', counters.post_mismatches()),
+            ('Story', counters.story_mismatches()),
+            ('UserProfile', counters.profile_mismatches()),
+        ):
+            for pk, drift in mismatches:
+                drifted += 1
+                details = ', '.join(f'{field}: stored {stored}, actual {actual}' for field, (stored, actual) in drift.items())
+                self.stdout.write(f'{label} {pk}: {details}')
+
+        missing = User.objects.filter(profile__isnull=True).count()
+        if missing:
+            self.stdout.write(f'{missing} users have no profile')
+        if drifted or missing:
+            raise CommandError(f'{drifted} rows with drifted counters, {missing} users without a profile.')
+        self.stdout.write(self.style.SUCCESS('All counters are consistent.'))
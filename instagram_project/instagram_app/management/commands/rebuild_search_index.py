@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from instagram_app import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the user search index (normalized names and trigrams) from the user table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=search.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        indexed = search.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} users.'))
@@ -0,0 +1,51 @@
+import os
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+from instagram_app import image_jobs
+from instagram_app.models import ImageJob, Post, Story
+
+
+class Command(BaseCommand):
+    help = (
+        'Regenerate image variants for existing post and story images in parallel. The original uploads are '
+        'not kept, so processed images are re-encoded from their largest variant and lose a little quality '
+        'on every run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--model', choices=['post', 'story', 'all'], default='all')
+        parser.add_argument('--missing', action='store_true', help='Only images that have no variants yet.')
+        parser.add_argument('--failed', action='store_true', help='Only retry dead-lettered image jobs.')
+        parser.add_argument(
+            '--stale', action='store_true', help='Only run queued jobs whose lease ran out, e.g. after a server crash.'
+        )
+
+    def handle(self, *args, **options):
+        if options['failed']:
+            job_ids = image_jobs.requeue_failed()
+        elif options['stale']:
+            job_ids = image_jobs.claim_stale()
+        else:
+            job_ids = self.create_jobs(options['model'], options['missing'])
+
+        if not job_ids:
+            self.stdout.write('Nothing to reprocess.')
+            return
+        succeeded = image_jobs.run_in_processes(job_ids, options['processes'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Reprocessed {succeeded} of {len(job_ids)} images; failures stay in the dead-letter queue.'
+        ))
+
+    def create_jobs(self, model, missing):
+        jobs = []
+        for name, model_class in (('post', Post), ('story', Story)):
+            if model not in (name, 'all'):
+                continue
+            queryset = model_class.objects.exclude(image='').exclude(image__isnull=True)
+            # Queued, running and dead-lettered jobs already cover their image (see --failed).
+            queryset = queryset.exclude(Exists(ImageJob.objects.filter(**{name: OuterRef('pk')})))
+            if missing:
+                queryset = queryset.filter(image_variants={})
+            jobs += [ImageJob(**{f'{name}_id': pk}) for pk in queryset.values_list('pk', flat=True).iterator()]
+        return [job.id for job in ImageJob.objects.bulk_create(jobs, batch_size=1000)]
@@ -0,0 +1,25 @@
+import os
+import time
+from django.core.management.base import BaseCommand
+from instagram_app import image_jobs
+
+
+class Command(BaseCommand):
+    help = "Generate image variants for queued uploads (IMAGE_QUEUE = 'database') in a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=32)
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit.')
+
+    def handle(self, *args, **options):
+        while True:
+            job_ids = image_jobs.claim(options['batch_size'])
+            if job_ids:
+                succeeded = image_jobs.run_in_processes(job_ids, options['processes'])
+                self.stdout.write(f'Processed {len(job_ids)} image jobs ({len(job_ids) - succeeded} failed)')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
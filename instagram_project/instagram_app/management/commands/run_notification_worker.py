@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from instagram_app import notifications
+
+
+class Command(BaseCommand):
+    help = "Process queued notification writes (NOTIFICATION_QUEUE = 'database')."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=notifications.BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit.')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = notifications.process_database_jobs(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Processed {processed} notification jobs')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
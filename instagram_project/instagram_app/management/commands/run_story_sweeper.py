@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from instagram_app import media, stories
+
+
+class Command(BaseCommand):
+    help = 'Delete expired stories in batches, archive their metadata and collect their unreferenced media.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=stories.BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, help='Stop each pass after this many batches.')
+        parser.add_argument('--no-archive', action='store_true', help='Delete expired stories without archiving them.')
+        parser.add_argument('--interval', type=float, default=60.0, help='Seconds to sleep between passes.')
+        parser.add_argument('--once', action='store_true', help='Run a single pass and exit.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        archive = None if options['no_archive'] else stories.archive_to_table
+        while True:
+            swept = stories.sweep(archive, batch_size=options['batch_size'], max_batches=options['max_batches'])
+            collected = media.collect_garbage()
+            if swept or collected:
+                self.stdout.write(f'Removed {swept} expired stories, deleted {collected} unreferenced blobs')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,119 @@
+import os
+import random
+import tempfile
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.db.utils import ConnectionHandler
+from django.test.utils import override_settings
+
+SCHEMA = [
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, likes_count INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL)',
+    'CREATE TABLE "like" (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, post_id INTEGER NOT NULL, UNIQUE (user_id, post_id))',
+]
+POSTS = 100
+ALIAS = 'stress_sqlite'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure concurrent SQLite write throughput on the like write path, first with '
+        "SQLite's defaults and then with SQLITE_PRAGMAS and immediate transactions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Concurrent writer threads.')
+        parser.add_argument('--readers', type=int, default=2, help='Concurrent reader threads.')
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds to run each profile.')
+
+    def handle(self, *args, **options):
+        # Both profiles go through Django's SQLite backend, so the tuned one
+        # gets its pragmas from the connection_created hook like the app does.
+        profiles = [
+            ('default', {'SQLITE_PRAGMAS': {}}, 'DEFERRED'),
+            ('tuned', {}, 'IMMEDIATE'),
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            for label, overrides, transaction_mode in profiles:
+                path = os.path.join(directory, f'{label}.sqlite3')
+                self.configure(path, transaction_mode)
+                try:
+                    with override_settings(**overrides):
+                        self.create()
+                        writes, errors, reads = self.run(options)
+                finally:
+                    connections[ALIAS].close()
+                    del connections[ALIAS]
+                    del connections.settings[ALIAS]
+                self.stdout.write(
+                    f'{label:<8} {writes / options["duration"]:9.1f} writes/s  '
+                    f'{errors:6d} "database is locked" errors  {reads / options["duration"]:9.1f} reads/s'
+                )
+
+    def configure(self, path, transaction_mode):
+        """Register ALIAS for a SQLite database at ``path``; each thread gets its own connection."""
+        # Python's default 5 second timeout, as Django used before SQLITE_PRAGMAS.
+        database = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': path,
+            'OPTIONS': {'timeout': 5, 'transaction_mode': transaction_mode},
+        }
+        connections.settings[ALIAS] = ConnectionHandler({'default': database}).settings['default']
+
+    def create(self):
+        with transaction.atomic(using=ALIAS), connections[ALIAS].cursor() as cursor:
+            for statement in SCHEMA:
+                cursor.execute(statement)
+            cursor.executemany('INSERT INTO post (created_at) VALUES (%s)', [(time.time(),)] * POSTS)
+
+    def run(self, options):
+        deadline = time.monotonic() + options['duration']
+        totals = {'writes': 0, 'errors': 0, 'reads': 0}
+        lock = threading.Lock()
+
+        def add(**counts):
+            with lock:
+                for key, value in counts.items():
+                    totals[key] += value
+
+        def writer(index):
+            rng = random.Random(index)
+            writes = errors = 0
+            user_id = index * 10_000_000
+            while time.monotonic() < deadline:
+                user_id += 1
+                post_id = rng.randint(1, POSTS)
+                try:
+                    # Mirrors toggle_like: look up the like, insert it, bump the counter.
+                    with transaction.atomic(using=ALIAS), connections[ALIAS].cursor() as cursor:
+                        cursor.execute('SELECT 1 FROM "like" WHERE user_id = %s AND post_id = %s', (user_id, post_id))
+                        if not cursor.fetchone():
+                            cursor.execute('INSERT INTO "like" (user_id, post_id) VALUES (%s, %s)', (user_id, post_id))
+                            cursor.execute('UPDATE post SET likes_count = likes_count + 1 WHERE id = %s', (post_id,))
+                    writes += 1
+                except OperationalError:
+                    errors += 1
+            connections[ALIAS].close()
+            add(writes=writes, errors=errors)
+
+        def reader(index):
+            reads = 0
+            while time.monotonic() < deadline:
+                try:
+                    with connections[ALIAS].cursor() as cursor:
+                        cursor.execute('SELECT id, likes_count FROM post ORDER BY created_at DESC LIMIT 20')
+                        cursor.fetchall()
+                    reads += 1
+                except OperationalError:
+                    pass
+            connections[ALIAS].close()
+            add(reads=reads)
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+        threads += [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return totals['writes'], totals['errors'], totals['reads']
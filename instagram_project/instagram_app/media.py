@@ -0,0 +1,98 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .models import MediaBlob
+
+# Unreferenced blobs are kept this long, so an upload that deduplicated
+# against a blob can still reference it before the blob is collected.
+GRACE_PERIOD = timedelta(seconds=getattr(settings, 'MEDIA_GC_GRACE_SECONDS', 3600))
+MEDIA_FIELDS = {'image', 'image_variants', 'profile_picture'}
+
+
+def media_names(instance):
+    """Storage names of every file a Post, Story or UserProfile references."""
+    names = set()
+    for field in ('image', 'profile_picture'):
+        file = getattr(instance, field, None)
+        if file:
+            names.add(file.name)
+    for variant in (getattr(instance, 'image_variants', None) or {}).values():
+        names.update(variant['files'].values())
+    return names
+
+
+def register(name, size):
+    """
+    Record a stored blob; it stays unreferenced (and collectable) until
+    ``retain``. Inside a transaction, this holds the blob's row until the
+    commit, so ``collect_garbage`` cannot delete the file in the meantime.
+    """
+    MediaBlob.objects.bulk_create([MediaBlob(name=name, size=size)], ignore_conflicts=True)
+    MediaBlob.objects.filter(name=name, refcount=0).update(released_at=timezone.now())
+
+
+def retain(names):
+    if not names:
+        return
+    MediaBlob.objects.bulk_create([MediaBlob(name=name) for name in names], ignore_conflicts=True)
+    MediaBlob.objects.filter(name__in=names).update(refcount=F('refcount') + 1, released_at=None)
+
+
+def release(names):
+    if not names:
+        return
+    MediaBlob.objects.filter(name__in=names).update(refcount=Greatest(F('refcount') - 1, 0))
+    MediaBlob.objects.filter(name__in=names, refcount=0, released_at__isnull=True).update(released_at=timezone.now())
+
+
+def collect_garbage(grace_period=GRACE_PERIOD, batch_size=500, storage=None):
+    """Delete blobs that have been unreferenced for longer than ``grace_period``; returns how many."""
+    storage = storage or default_storage
+    cutoff = timezone.now() - grace_period
+    collected = 0
+    while True:
+        blobs = list(MediaBlob.objects.filter(refcount=0, released_at__lt=cutoff).values_list('id', 'name')[:batch_size])
+        if not blobs:
+            return collected
+        collected += sum(_collect(blob_id, name, cutoff, storage) for blob_id, name in blobs)
+
+
+def _collect(blob_id, name, cutoff, storage):
+    with transaction.atomic():
+        # Re-check under the row lock: since the blob was selected, an upload
+        # may have registered the same content again or a post referenced it.
+        blob = MediaBlob.objects.select_for_update().filter(id=blob_id, refcount=0, released_at__lt=cutoff).first()
+        if blob is None:
+            return False
+        # File first, row last: an upload of the same content waits on the
+        # row in ``register`` until this commits, then finds the file gone
+        # and writes it again.
+        storage.delete(name)
+        blob.delete()
+    return True
+
+
+def remember_media(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not MEDIA_FIELDS & set(update_fields):
+        instance._media_before = None
+        return
+    previous = sender.objects.filter(pk=instance.pk).first() if instance.pk else None
+    instance._media_before = media_names(previous) if previous else set()
+
+
+def sync_media(sender, instance, **kwargs):
+    before = getattr(instance, '_media_before', None)
+    if before is None:
+        return
+    after = media_names(instance)
+    retain(after - before)
+    release(before - after)
+    instance._media_before = None
+
+
+def release_media(sender, instance, **kwargs):
+    release(media_names(instance))
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:49
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(model, fk, outer_field):
+    counts = (
+        model.objects.filter(**{fk: OuterRef(outer_field)})
+        .order_by()
+        .values(fk)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def populate_counters(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    UserProfile = apps.get_model('instagram_app', 'UserProfile')
+    Post = apps.get_model('instagram_app', 'Post')
+    Like = apps.get_model('instagram_app', 'Like')
+    Comment = apps.get_model('instagram_app', 'Comment')
+    Follow = apps.get_model('instagram_app', 'Follow')
+
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=user_id) for user_id in User.objects.filter(profile__isnull=True).values_list('id', flat=True)]
+    )
+    Post.objects.update(
+        likes_count=_count(Like, 'post', 'pk'),
+        comments_count=_count(Comment, 'post', 'pk'),
+    )
+    UserProfile.objects.update(
+        followers_count=_count(Follow, 'following', 'user_id'),
+        following_count=_count(Follow, 'follower', 'user_id'),
+        posts_count=_count(Post, 'user', 'user_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_app', '0007_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
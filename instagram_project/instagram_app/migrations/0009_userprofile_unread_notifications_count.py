@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:54
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_unread_counts(apps, schema_editor):
+    UserProfile = apps.get_model('instagram_app', 'UserProfile')
+    Notification = apps.get_model('instagram_app', 'Notification')
+    unread = (
+        Notification.objects.filter(recipient=OuterRef('user_id'), is_read=False)
+        .order_by()
+        .values('recipient')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    UserProfile.objects.update(unread_notifications_count=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_app', '0008_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='unread_notifications_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_unread_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:57
+
+from datetime import datetime, timezone
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_groups(apps, schema_editor):
+    Notification = apps.get_model('instagram_app', 'Notification')
+    NotificationGroup = apps.get_model('instagram_app', 'NotificationGroup')
+    window = int(getattr(settings, 'NOTIFICATION_GROUP_WINDOW_HOURS', 24) * 3600)
+    groups = {}
+    rows = Notification.objects.order_by('created_at').values_list(
+        'recipient_id', 'sender_id', 'notification_type', 'post_id', 'created_at', 'is_read'
+    )
+    for recipient_id, sender_id, notification_type, post_id, created_at, is_read in rows.iterator(chunk_size=2000):
+        start = datetime.fromtimestamp(int(created_at.timestamp()) // window * window, tz=timezone.utc)
+        key = f"{notification_type}:{post_id or '-'}:{int(start.timestamp())}"
+        group = groups.get((recipient_id, key))
+        if group is None:
+            group = groups[(recipient_id, key)] = NotificationGroup(
+                recipient_id=recipient_id,
+                key=key,
+                notification_type=notification_type,
+                post_id=post_id,
+                bucket_start=start,
+                is_read=True,
+                sample_sender_ids=[],
+            )
+        group.count += 1
+        group.latest_at = created_at
+        group.is_read = group.is_read and is_read
+        group.sample_sender_ids = [sender_id] + group.sample_sender_ids[:2]
+    NotificationGroup.objects.bulk_create(groups.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_app', '0010_notificationjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('notification_type', models.CharField(choices=[('like', 'Like'), ('comment', 'Comment'), ('follow', 'Follow')], max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('sample_sender_ids', models.JSONField(default=list)),
+                ('is_read', models.BooleanField(default=False)),
+                ('latest_at', models.DateTimeField()),
+                ('post', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='instagram_app.post')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_groups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-latest_at'],
+                'indexes': [models.Index(fields=['recipient', '-latest_at'], name='notifgroup_recipient_idx')],
+                'unique_together': {('recipient', 'key')},
+            },
+        ),
+        migrations.RunPython(populate_groups, migrations.RunPython.noop),
+    ]
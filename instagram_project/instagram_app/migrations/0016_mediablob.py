@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:10
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_references(apps, schema_editor):
+    MediaBlob = apps.get_model('instagram_app', 'MediaBlob')
+    references = Counter()
+    for model_name, field in (('Post', 'image'), ('Story', 'image'), ('UserProfile', 'profile_picture')):
+        model = apps.get_model('instagram_app', model_name)
+        fields = [field, 'image_variants'] if field == 'image' else [field]
+        for row in model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).values(*fields).iterator():
+            references[row[field]] += 1
+            for variant in (row.get('image_variants') or {}).values():
+                references.update(variant['files'].values())
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(name=name, refcount=count) for name, count in references.items()], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_app', '0015_image_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('released_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(condition=models.Q(('refcount', 0)), fields=['released_at'], name='mediablob_unreferenced_idx')],
+            },
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_app', '0018_story_view'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='story',
+            name='view_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='storyview',
+            index=models.Index(fields=['story', '-viewed_at'], name='storyview_story_viewed_idx'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:19
+
+import unicodedata
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Frozen copies of the search.py helpers, so later changes there do not
+# change what this migration does.
+def normalize(value):
+    return ' '.join(unicodedata.normalize('NFKC', value or '').casefold().split())
+
+
+def entry_values(username, first_name, last_name):
+    last_name = normalize(last_name)
+    # Cut to the column lengths: normalizing can lengthen a name.
+    return {
+        'username': normalize(username)[:150],
+        'full_name': normalize(f'{first_name} {last_name}')[:301],
+        'last_name': last_name[:150],
+    }
+
+
+def trigrams(*terms):
+    grams = set()
+    for term in terms:
+        for word in term.split():
+            grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+def populate(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    UserSearchEntry = apps.get_model('instagram_app', 'UserSearchEntry')
+    UserSearchTrigram = apps.get_model('instagram_app', 'UserSearchTrigram')
+    users = User.objects.order_by('id').values_list('id', 'username', 'first_name', 'last_name')
+    batch = []
+    for row in users.iterator(chunk_size=1000):
+        batch.append(UserSearchEntry(user_id=row[0], **entry_values(*row[1:])))
+        if len(batch) >= 1000:
+            _insert(batch, UserSearchEntry, UserSearchTrigram)
+            batch = []
+    if batch:
+        _insert(batch, UserSearchEntry, UserSearchTrigram)
+
+
+def _insert(entries, UserSearchEntry, UserSearchTrigram):
+    UserSearchEntry.objects.bulk_create(entries)
+    UserSearchTrigram.objects.bulk_create([
+        UserSearchTrigram(trigram=gram, user_id=entry.user_id)
+        for entry in entries
+        for gram in trigrams(entry.username, entry.full_name)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('instagram_app', '0019_story_view_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchEntry',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('username', models.CharField(max_length=150)),
+                ('full_name', models.CharField(blank=True, max_length=301)),
+                ('last_name', models.CharField(blank=True, max_length=150)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['username'], name='usersearch_username_idx'), models.Index(fields=['full_name'], name='usersearch_full_name_idx'), models.Index(fields=['last_name'], name='usersearch_last_name_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserSearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trigram', 'user'], name='usersearch_trigram_idx')],
+            },
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_app', '0023_follow_and_explore_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notification_recipient_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='notificationgroup',
+            name='notifgroup_recipient_idx',
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', '-created_at', '-id'], name='notification_recipient_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationgroup',
+            index=models.Index(fields=['recipient', '-latest_at', '-id'], name='notifgroup_recipient_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:47
+
+import instagram_app.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_app', '0024_keyset_tiebreak_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usersearchentry',
+            name='full_name',
+            field=instagram_app.models.BinaryCharField(blank=True, max_length=301),
+        ),
+        migrations.AlterField(
+            model_name='usersearchentry',
+            name='last_name',
+            field=instagram_app.models.BinaryCharField(blank=True, max_length=150),
+        ),
+        migrations.AlterField(
+            model_name='usersearchentry',
+            name='username',
+            field=instagram_app.models.BinaryCharField(max_length=150),
+        ),
+    ]
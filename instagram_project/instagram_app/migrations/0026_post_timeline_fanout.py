@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_existing_posts(apps, schema_editor):
+    # Existing posts were written to timelines unless their author was over
+    # the fan-out limit, in which case feeds merged them on read.
+    Post = apps.get_model('instagram_app', 'Post')
+    limit = getattr(settings, 'TIMELINE_FANOUT_FOLLOWER_LIMIT', 10000)
+    Post.objects.update(timeline_fanout='push')
+    Post.objects.filter(user__profile__followers_count__gte=limit).update(timeline_fanout='pull')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_app', '0025_user_search_binary_collation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='timeline_fanout',
+            field=models.CharField(choices=[('pending', 'Pending'), ('push', 'Written to follower timelines'), ('pull', 'Merged into feeds on read')], default='pending', max_length=10),
+        ),
+        migrations.RunPython(mark_existing_posts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['user', 'timeline_fanout'], name='post_user_fanout_idx'),
+        ),
+    ]
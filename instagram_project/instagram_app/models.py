@@ -1,10 +1,47 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+IMAGE_STATES = [
+    ('processing', 'Processing'),
+    ('ready', 'Ready'),
+    ('failed', 'Failed'),
+]
+# How a post reaches its author's followers (see timeline.py).
+TIMELINE_FANOUTS = [
+    ('pending', 'Pending'),
+    ('push', 'Written to follower timelines'),
+    ('pull', 'Merged into feeds on read'),
+]
+
+
+class ResponsiveImageMixin:
+    """Variant lookups for models with ``image``, ``image_url``, ``image_variants`` and ``image_state`` fields."""
+
+    @property
+    def image_display_url(self):
+        if self.image:
+            # Unprocessed uploads may still carry EXIF data; they are not served.
+            return self.image.url if self.image_state == 'ready' else None
+        return self.image_url
+
+    def image_variant_url(self, variant, image_format=None):
+        """URL of a resized variant, falling back to the stored image when it has not been generated."""
+        files = self.image_variants.get(variant, {}).get('files')
+        if not files or self.image_state != 'ready':
+            return self.image_display_url
+        name = files.get(image_format) or next(iter(files.values()))
+        return self.image.storage.url(name)
+
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     profile_picture = models.ImageField(upload_to='profiles/', null=True, blank=True)
     bio = models.TextField(max_length=500, blank=True)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    posts_count = models.PositiveIntegerField(default=0)
+    unread_notifications_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -16,69 +53,115 @@ class UserProfile(models.Model):
             return self.profile_picture.url
         return None
 
+
 class Follow(models.Model):
     follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following')
-    following = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followers')
+    # Indexed by follow_following_created_idx, which also serves plain lookups.
+    following = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followers', db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ('follower', 'following')
+        indexes = [
+            # Follower and following lists, most recent first.
+            models.Index(fields=['following', '-created_at', '-id'], name='follow_following_created_idx'),
+            models.Index(fields=['follower', '-created_at', '-id'], name='follow_follower_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.follower.username} follows {self.following.username}"
 
-class Post(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
+
+class Post(ResponsiveImageMixin, models.Model):
+    # Indexed by post_user_created_idx, which also serves plain user lookups.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts', db_index=False)
     image = models.ImageField(upload_to='posts/', null=True, blank=True)
     image_url = models.URLField(max_length=500, blank=True, null=True)
     caption = models.TextField(blank=True)
+    image_variants = models.JSONField(default=dict, blank=True)
+    image_state = models.CharField(max_length=10, choices=IMAGE_STATES, default='ready')
+    timeline_fanout = models.CharField(max_length=10, choices=TIMELINE_FANOUTS, default='pending')
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='post_user_created_idx'),
+            # Explore: every post, newest first.
+            models.Index(fields=['-created_at', '-id'], name='post_created_idx'),
+            # Authors whose posts feeds have to merge on read.
+            models.Index(fields=['user', 'timeline_fanout'], name='post_user_fanout_idx'),
+        ]
 
     def __str__(self):
         return f"Post by {self.user.username}"
 
-    @property
-    def likes_count(self):
-        return self.likes.count()
 
-    @property
-    def comments_count(self):
-        return self.comments.count()
-    
-    @property
-    def image_display_url(self):
-        if self.image:
-            return self.image.url
-        return self.image_url
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at']
+        unique_together = ('user', 'post')
+        indexes = [
+            # post breaks ties in the feed's keyset order.
+            models.Index(fields=['user', '-created_at', '-post'], name='timeline_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in {self.user_id}'s timeline"
 
-class Story(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stories')
+
+class Story(ResponsiveImageMixin, models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stories', db_index=False)
     image = models.ImageField(upload_to='stories/', null=True, blank=True)
     image_url = models.URLField(max_length=500, blank=True, null=True)
     text = models.CharField(max_length=200, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True)
+    image_state = models.CharField(max_length=10, choices=IMAGE_STATES, default='ready')
+    view_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'expires_at'], name='story_user_expires_idx'),
+            # Lets the expiry sweeper find expired rows without a table scan.
+            models.Index(fields=['expires_at'], name='story_expires_idx'),
+        ]
 
     def __str__(self):
         return f"Story by {self.user.username}"
 
-    @property
-    def image_display_url(self):
-        if self.image:
-            return self.image.url
-        return self.image_url
-
     @property
     def is_expired(self):
         from django.utils import timezone
         return timezone.now() > self.expires_at
 
+
+class StoryView(models.Model):
+    story = models.ForeignKey(Story, on_delete=models.CASCADE, related_name='views', db_index=False)
+    viewer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    viewed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            # Also the index behind the tray's per-viewer "seen" lookups.
+            models.UniqueConstraint(fields=['story', 'viewer'], name='storyview_story_viewer_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['story', '-viewed_at'], name='storyview_story_viewed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.viewer_id} viewed story {self.story_id}"
+
+
 class Like(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='likes')
@@ -90,18 +173,23 @@ class Like(models.Model):
     def __str__(self):
         return f"{self.user.username} likes {self.post.id}"
 
+
 class Comment(models.Model):
-    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments', db_index=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['post', 'created_at'], name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return f"Comment by {self.user.username}"
 
+
 class Notification(models.Model):
     NOTIFICATION_TYPES = [
         ('like', 'Like'),
@@ -109,7 +197,7 @@ class Notification(models.Model):
         ('follow', 'Follow'),
     ]
     
-    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications', db_index=False)
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_notifications')
     notification_type = models.CharField(max_length=10, choices=NOTIFICATION_TYPES)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, null=True, blank=True)
@@ -119,6 +207,12 @@ class Notification(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ['recipient', 'sender', 'notification_type', 'post']
+        indexes = [
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notification_recipient_idx'),
+            # Only unread rows: serves unread counts and mark-all-read without
+            # growing with the read history.
+            models.Index(fields=['recipient'], condition=models.Q(is_read=False), name='notification_unread_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sender.username} {self.notification_type} - {self.recipient.username}"
@@ -131,4 +225,202 @@ class Notification(models.Model):
             return f"{self.sender.username} commented on your post"
         elif self.notification_type == 'follow':
             return f"{self.sender.username} started following you"
-        return "New notification"
\ No newline at end of file
+        return "New notification"
+
+
+class ArchivedNotification(models.Model):
+    """Read notification moved out of the hot table by ``manage.py compact_notifications``."""
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    notification_type = models.CharField(max_length=10, choices=Notification.NOTIFICATION_TYPES)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Archived {self.notification_type} for {self.recipient_id}"
+
+
+class ArchivedStory(models.Model):
+    """Expired story moved out of the live table by ``manage.py run_story_sweeper``; its media is released."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    text = models.CharField(max_length=200, blank=True)
+    image_url = models.URLField(max_length=500, blank=True, null=True)
+    created_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Archived story by {self.user_id}"
+
+
+class BinaryCharField(models.CharField):
+    """
+    CharField compared by code point on every backend, so the strings between
+    ``prefix`` and ``prefix + search.PREFIX_END`` are exactly those starting
+    with ``prefix``. SQLite compares this way already; PostgreSQL and MySQL
+    need a binary collation, which is also what lets range scans use the index.
+    """
+    collations = {'postgresql': 'C', 'mysql': 'utf8mb4_bin'}
+
+    def db_parameters(self, connection):
+        db_params = super().db_parameters(connection)
+        db_params['collation'] = self.collations.get(connection.vendor)
+        return db_params
+
+
+class UserSearchEntry(models.Model):
+    """
+    Normalized (NFKC, case-folded) names of a user, kept in sync by
+    ``search.index_user``; names that grow past the column when normalized
+    (e.g. 'ß' becomes 'ss') are cut to fit.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    username = BinaryCharField(max_length=150)
+    full_name = BinaryCharField(max_length=301, blank=True)
+    last_name = BinaryCharField(max_length=150, blank=True)
+
+    class Meta:
+        # Prefix searches are range scans on these.
+        indexes = [
+            models.Index(fields=['username'], name='usersearch_username_idx'),
+            models.Index(fields=['full_name'], name='usersearch_full_name_idx'),
+            models.Index(fields=['last_name'], name='usersearch_last_name_idx'),
+        ]
+
+    def __str__(self):
+        return self.username
+
+
+class UserSearchTrigram(models.Model):
+    trigram = models.CharField(max_length=3)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        # search.index_users replaces a user's rows as a whole, so the pairs
+        # stay unique without a constraint.
+        indexes = [
+            models.Index(fields=['trigram', 'user'], name='usersearch_trigram_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.trigram!r} -> {self.user_id}"
+
+
+class SearchAffinity(models.Model):
+    """How many accounts ``user`` follows also follow ``target``; precomputed by ``manage.py compute_search_affinity``."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', db_index=False)
+    target = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    mutual_count = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'target'], name='searchaffinity_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.target_id} ({self.mutual_count})"
+
+
+class ImageJob(models.Model):
+    """Queued image variant generation for a post or story (see image_jobs.py)."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    story = models.ForeignKey(Story, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    # Jobs that used up their attempts stay here as the dead-letter queue.
+    failed = models.BooleanField(default=False)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['failed', 'available_at'], name='imagejob_available_idx'),
+        ]
+
+    def __str__(self):
+        return f"Image job for {'post' if self.post_id else 'story'} {self.post_id or self.story_id}"
+
+    @property
+    def target(self):
+        return self.post or self.story
+
+
+class MediaBlob(models.Model):
+    """Reference count for a stored media file (see media.py)."""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=0)
+    # When the last reference went away; unreferenced blobs are collected
+    # after a grace period.
+    released_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['released_at'], condition=models.Q(refcount=0), name='mediablob_unreferenced_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} references)"
+
+
+class NotificationJob(models.Model):
+    """Queued notification write, used when NOTIFICATION_QUEUE is 'database'."""
+    ACTIONS = [
+        ('create', 'Create'),
+        ('retract', 'Retract'),
+    ]
+
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    notification_type = models.CharField(max_length=10, choices=Notification.NOTIFICATION_TYPES)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.action} {self.notification_type} for {self.recipient_id}"
+
+
+class NotificationGroup(models.Model):
+    """
+    Aggregate of a recipient's notifications sharing a type, post and time bucket
+    ("alice and 41 others liked your post"), maintained incrementally on write.
+    """
+    SAMPLE_SIZE = 3
+
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notification_groups')
+    key = models.CharField(max_length=64)
+    notification_type = models.CharField(max_length=10, choices=Notification.NOTIFICATION_TYPES)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+    sample_sender_ids = models.JSONField(default=list)
+    is_read = models.BooleanField(default=False)
+    latest_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-latest_at']
+        unique_together = ('recipient', 'key')
+        indexes = [
+            models.Index(fields=['recipient', '-latest_at', '-id'], name='notifgroup_recipient_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.count} {self.notification_type} notifications for {self.recipient_id}"
+
+    @staticmethod
+    def make_key(notification_type, post_id, bucket_start):
+        return f"{notification_type}:{post_id or '-'}:{int(bucket_start.timestamp())}"
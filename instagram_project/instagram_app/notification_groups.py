@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db.models import F
+from .models import Notification, NotificationGroup
+
+WINDOW = timedelta(hours=getattr(settings, 'NOTIFICATION_GROUP_WINDOW_HOURS', 24))
+
+
+def bucket_start(moment):
+    seconds = int(WINDOW.total_seconds())
+    return datetime.fromtimestamp(int(moment.timestamp()) // seconds * seconds, tz=dt_timezone.utc)
+
+
+def _group_rows(rows):
+    """Group (recipient_id, sender_id, notification_type, post_id, created_at) rows by recipient and key."""
+    groups = {}
+    for recipient_id, sender_id, notification_type, post_id, created_at in rows:
+        start = bucket_start(created_at)
+        key = (recipient_id, NotificationGroup.make_key(notification_type, post_id, start))
+        group = groups.setdefault(key, {
+            'notification_type': notification_type,
+            'post_id': post_id,
+            'bucket_start': start,
+            'latest_at': created_at,
+            'sender_ids': [],
+        })
+        group['latest_at'] = max(group['latest_at'], created_at)
+        group['sender_ids'].append(sender_id)
+    return groups
+
+
+def _existing(groups):
+    recipient_ids = {recipient_id for recipient_id, _ in groups}
+    keys = {key for _, key in groups}
+    return {
+        (group.recipient_id, group.key): group
+        for group in NotificationGroup.objects.filter(recipient_id__in=recipient_ids, key__in=keys)
+    }
+
+
+def add(rows):
+    groups = _group_rows(rows)
+    if not groups:
+        return
+    # Create missing groups empty, then increment: concurrent batches adding
+    # to the same group both land their counts.
+    NotificationGroup.objects.bulk_create([
+        NotificationGroup(
+            recipient_id=recipient_id,
+            key=key,
+            notification_type=group['notification_type'],
+            post_id=group['post_id'],
+            bucket_start=group['bucket_start'],
+            latest_at=group['latest_at'],
+        )
+        for (recipient_id, key), group in groups.items()
+    ], ignore_conflicts=True)
+
+    for lookup, instance in _existing(groups).items():
+        group = groups[lookup]
+        newest_first = list(reversed(group['sender_ids']))
+        samples = newest_first + [sender_id for sender_id in instance.sample_sender_ids if sender_id not in newest_first]
+        NotificationGroup.objects.filter(pk=instance.pk).update(
+            count=F('count') + len(group['sender_ids']),
+            sample_sender_ids=samples[:NotificationGroup.SAMPLE_SIZE],
+            latest_at=max(instance.latest_at, group['latest_at']),
+            is_read=False,
+        )
+
+
+def remove(rows):
+    groups = _group_rows(rows)
+    if not groups:
+        return
+    for lookup, instance in _existing(groups).items():
+        removed = groups[lookup]['sender_ids']
+        remaining = instance.count - len(removed)
+        if remaining <= 0:
+            instance.delete()
+            continue
+        samples = [sender_id for sender_id in instance.sample_sender_ids if sender_id not in removed]
+        if len(samples) < min(remaining, NotificationGroup.SAMPLE_SIZE):
+            samples = list(
+                notifications_in(instance).order_by('-created_at')
+                .values_list('sender_id', flat=True)[:NotificationGroup.SAMPLE_SIZE]
+            )
+        NotificationGroup.objects.filter(pk=instance.pk).update(
+            count=F('count') - len(removed),
+            sample_sender_ids=samples,
+        )
+
+
+def notifications_in(group):
+    return Notification.objects.filter(
+        recipient_id=group.recipient_id,
+        notification_type=group.notification_type,
+        post_id=group.post_id,
+        created_at__gte=group.bucket_start,
+        created_at__lt=group.bucket_start + WINDOW,
+    )
@@ -0,0 +1,189 @@
+import operator
+from collections import namedtuple
+from functools import reduce
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from .models import Notification, NotificationGroup, NotificationJob, UserProfile
+from .workers import BatchWorker
+from . import counters, notification_groups, realtime
+
+BATCH_SIZE = getattr(settings, 'NOTIFICATION_BATCH_SIZE', 500)
+FLUSH_INTERVAL = getattr(settings, 'NOTIFICATION_FLUSH_INTERVAL', 1.0)
+# Keeps the OR-ed key lookups well under the database's bound-parameter limit.
+KEY_CHUNK_SIZE = 200
+
+NotificationEvent = namedtuple('NotificationEvent', 'action recipient_id sender_id notification_type post_id')
+
+
+def _key(event):
+    return (event.recipient_id, event.sender_id, event.notification_type, event.post_id)
+
+
+def _chunks(items, size=KEY_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _keys_filter(events):
+    return reduce(operator.or_, (
+        Q(recipient_id=recipient_id, sender_id=sender_id, notification_type=notification_type, post_id=post_id)
+        for recipient_id, sender_id, notification_type, post_id in map(_key, events)
+    ))
+
+
+def coalesce(events):
+    """Keep only the last event per notification, so like/unlike flapping collapses to its final state."""
+    latest = {}
+    for event in events:
+        latest.pop(_key(event), None)
+        latest[_key(event)] = event
+    return list(latest.values())
+
+
+def process_events(events):
+    events = coalesce(events)
+    creates = [event for event in events if event.action == 'create']
+    retracts = [event for event in events if event.action == 'retract']
+    touched = set()
+    new = []
+
+    with transaction.atomic():
+        for chunk in _chunks(retracts):
+            removed = list(
+                Notification.objects.filter(_keys_filter(chunk))
+                .values_list('id', 'recipient_id', 'sender_id', 'notification_type', 'post_id', 'created_at')
+            )
+            if removed:
+                Notification.objects.filter(id__in=[row[0] for row in removed]).delete()
+                notification_groups.remove(row[1:] for row in removed)
+                touched.update(row[1] for row in removed)
+
+        for chunk in _chunks(creates):
+            existing = set(
+                Notification.objects.filter(_keys_filter(chunk))
+                .values_list('recipient_id', 'sender_id', 'notification_type', 'post_id')
+            )
+            new.extend(event for event in chunk if _key(event) not in existing)
+
+        created = Notification.objects.bulk_create([
+            Notification(
+                recipient_id=event.recipient_id,
+                sender_id=event.sender_id,
+                notification_type=event.notification_type,
+                post_id=event.post_id,
+            )
+            for event in new
+        ], batch_size=BATCH_SIZE, ignore_conflicts=True)
+        # ignore_conflicts also returns the rows a concurrent batch wrote
+        # first; only the rows stored with this batch's timestamps are new
+        # to the groups.
+        written_at = {(n.recipient_id, n.sender_id, n.notification_type, n.post_id): n.created_at for n in created}
+        inserted = []
+        for chunk in _chunks(new):
+            rows = (
+                Notification.objects.filter(_keys_filter(chunk))
+                .values_list('recipient_id', 'sender_id', 'notification_type', 'post_id', 'created_at')
+            )
+            inserted.extend(row for row in rows if written_at.get(row[:4]) == row[4])
+        notification_groups.add(inserted)
+        touched.update(event.recipient_id for event in new)
+
+        if touched:
+            # Recounting the touched recipients stays exact even when
+            # ignore_conflicts skipped rows written by a concurrent batch.
+            counters.rebuild_profiles(
+                UserProfile.objects.filter(user_id__in=touched), fields=['unread_notifications_count']
+            )
+
+    for chunk in _chunks(new):
+        for notification in Notification.objects.filter(_keys_filter(chunk)).select_related('sender__profile', 'post'):
+            realtime.publish_notification(notification)
+    unread = UserProfile.objects.filter(user_id__in=touched).values_list('user_id', 'unread_notifications_count')
+    for user_id, count in unread:
+        realtime.publish_unread_count(user_id, count)
+
+
+_memory_worker = BatchWorker(
+    process_events, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, name='notification-worker'
+)
+
+
+def flush():
+    """Process notification writes still queued in this process."""
+    _memory_worker.flush()
+
+
+def process_database_jobs(batch_size=BATCH_SIZE):
+    """Process one batch of queued NotificationJob rows; returns how many were handled."""
+    with transaction.atomic():
+        jobs = NotificationJob.objects.all()
+        if connection.features.has_select_for_update_skip_locked:
+            jobs = jobs.select_for_update(skip_locked=True)
+        jobs = list(jobs[:batch_size])
+        if not jobs:
+            return 0
+        process_events([
+            NotificationEvent(job.action, job.recipient_id, job.sender_id, job.notification_type, job.post_id)
+            for job in jobs
+        ])
+        NotificationJob.objects.filter(id__in=[job.id for job in jobs]).delete()
+    return len(jobs)
+
+
+def _enqueue(event):
+    backend = getattr(settings, 'NOTIFICATION_QUEUE', 'memory')
+    if backend == 'database':
+        NotificationJob.objects.create(**event._asdict())
+    elif backend == 'memory':
+        transaction.on_commit(lambda: _memory_worker.submit(event))
+    else:
+        process_events([event])
+
+
+def notify(recipient, sender, notification_type, post=None):
+    _enqueue(NotificationEvent('create', recipient.id, sender.id, notification_type, post.id if post else None))
+
+
+def retract(recipient, sender, notification_type, post=None):
+    _enqueue(NotificationEvent('retract', recipient.id, sender.id, notification_type, post.id if post else None))
+
+
+def _publish_unread_count(recipient):
+    realtime.publish_unread_count(recipient.id, unread_count(recipient))
+
+
+def mark_read(recipient, notification_id):
+    """Mark one notification read; returns False if it does not belong to ``recipient``."""
+    notifications = Notification.objects.filter(id=notification_id, recipient=recipient)
+    if notifications.filter(is_read=False).update(is_read=True):
+        counters.adjust_profile(recipient.id, unread_notifications_count=-1)
+        _publish_unread_count(recipient)
+        return True
+    return notifications.exists()
+
+
+def mark_group_read(recipient, group_id):
+    """Mark a notification group and the notifications in it read; returns False if it is not ``recipient``'s."""
+    group = NotificationGroup.objects.filter(id=group_id, recipient=recipient).first()
+    if group is None:
+        return False
+    NotificationGroup.objects.filter(pk=group.pk).update(is_read=True)
+    updated = notification_groups.notifications_in(group).filter(is_read=False).update(is_read=True)
+    if updated:
+        counters.adjust_profile(recipient.id, unread_notifications_count=-updated)
+        _publish_unread_count(recipient)
+    return True
+
+
+def mark_all_read(recipient):
+    Notification.objects.filter(recipient=recipient, is_read=False).update(is_read=True)
+    NotificationGroup.objects.filter(recipient=recipient, is_read=False).update(is_read=True)
+    UserProfile.objects.filter(user=recipient).update(unread_notifications_count=0)
+    realtime.publish_unread_count(recipient.id, 0)
+
+
+def unread_count(recipient):
+    count = UserProfile.objects.filter(user=recipient).values_list('unread_notifications_count', flat=True).first()
+    return count or 0
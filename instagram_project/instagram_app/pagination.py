@@ -0,0 +1,122 @@
+import base64
+import json
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def after_cursor(queryset, field, cursor, descending=True, tiebreak='pk'):
+    """Rows of ``queryset`` that come after ``cursor`` in ``(field, tiebreak)`` order."""
+    if not cursor:
+        return queryset
+    value, pk = cursor
+    lookup = 'lt' if descending else 'gt'
+    # The redundant inclusive bound gives the planner an index range to
+    # start from; the OR alone may be planned as a scan of both branches.
+    return queryset.filter(
+        Q(**{f'{field}__{lookup}e': value}),
+        Q(**{f'{field}__{lookup}': value}) | Q(**{f'{tiebreak}__{lookup}': pk}),
+    )
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination over ``(<ordering field>, id)``.
+
+    The ordering field comes from the view's ``keyset_ordering`` attribute or
+    the first entry of the model's ``Meta.ordering``, and ``id`` is used as a
+    tie-breaker in the same direction, so every page is a single index range
+    scan no matter how deep the client has scrolled.
+
+    Views whose rows do not come from a single queryset page them with
+    ``paginate_rows`` instead.
+    """
+    page_size = api_settings.PAGE_SIZE or 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, queryset, view):
+        ordering = getattr(view, 'keyset_ordering', None) or queryset.model._meta.ordering[0]
+        return ordering.lstrip('-'), ordering.startswith('-')
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            value = parse_datetime(value)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk
+
+    def encode_cursor(self, instance):
+        value = getattr(instance, self.field)
+        payload = json.dumps([value.isoformat(), instance.pk])
+        return base64.urlsafe_b64encode(payload.encode('ascii')).decode('ascii')
+
+    def page_queryset(self, queryset, view, cursor=None, limit=None):
+        """The query behind a page: up to ``limit`` rows of ``queryset`` after ``cursor``, in keyset order."""
+        field, descending = self.get_ordering(queryset, view)
+        prefix = '-' if descending else ''
+        rows = after_cursor(queryset, field, cursor, descending).order_by(f'{prefix}{field}', f'{prefix}pk')
+        return rows[:limit] if limit else rows
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_rows(
+            lambda cursor, limit: list(self.page_queryset(queryset, view, cursor, limit)),
+            request,
+            self.get_ordering(queryset, view)[0],
+        )
+
+    def paginate_rows(self, fetch, request, field):
+        """
+        Page the rows returned by ``fetch(cursor, limit)``: up to ``limit``
+        rows after the decoded cursor (None on the first page), ordered by
+        ``(field, pk)`` like ``paginate_queryset`` would order them.
+        """
+        self.request = request
+        self.field = field
+        page_size = self.get_page_size(request)
+        results = fetch(self.decode_cursor(request), page_size + 1)
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
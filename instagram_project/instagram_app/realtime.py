@@ -0,0 +1,231 @@
+import asyncio
+import contextlib
+import json
+import logging
+import threading
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = '/api/notifications/stream/'
+KEEPALIVE_SECONDS = getattr(settings, 'REALTIME_KEEPALIVE_SECONDS', 15)
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Broker:
+    """
+    Pub/sub interface used by the notification stream.
+
+    ``publish`` is synchronous and may be called from any thread (request
+    handlers run in worker threads); ``subscribe`` is an async context
+    manager yielding an object with an ``async get()`` method.
+    """
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        raise NotImplementedError
+
+
+class InMemoryBroker(Broker):
+    """Single-process broker: delivers to subscribers on this node only."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._deliver, queue, message)
+
+    @staticmethod
+    def _deliver(queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning('Dropping realtime message for a slow subscriber')
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, channel):
+        entry = (asyncio.get_running_loop(), asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE))
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(channel, set())
+                subscribers.discard(entry)
+                if not subscribers:
+                    self._subscribers.pop(channel, None)
+
+
+class RedisBroker(Broker):
+    """Multi-node broker on Redis pub/sub."""
+
+    def __init__(self, url='redis://localhost:6379/0'):
+        import redis
+        import redis.asyncio
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+        self._async_client = redis.asyncio.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        self._client.publish(channel, json.dumps(message))
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, channel):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        pubsub = self._async_client.pubsub()
+        await pubsub.subscribe(channel)
+
+        async def reader():
+            async for item in pubsub.listen():
+                if item['type'] == 'message':
+                    InMemoryBroker._deliver(queue, json.loads(item['data']))
+
+        task = asyncio.create_task(reader())
+        try:
+            yield queue
+        finally:
+            task.cancel()
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def _broker_class():
+    return import_string(getattr(settings, 'REALTIME_BROKER', 'instagram_app.realtime.InMemoryBroker'))
+
+
+def check_broker(app_configs=None, **kwargs):
+    """System check: notifications written in another process never reach an in-memory broker."""
+    if getattr(settings, 'NOTIFICATION_QUEUE', 'memory') == 'database' and issubclass(_broker_class(), InMemoryBroker):
+        return [checks.Error(
+            "InMemoryBroker cannot deliver notifications written by run_notification_worker "
+            "(NOTIFICATION_QUEUE = 'database').",
+            hint="Set REALTIME_BROKER = 'instagram_app.realtime.RedisBroker' and REALTIME_BROKER_URL.",
+            id='instagram_app.E001',
+        )]
+    return []
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            errors = check_broker()
+            if errors:
+                raise ImproperlyConfigured(errors[0].msg)
+            _broker = _broker_class()(**getattr(settings, 'REALTIME_BROKER_OPTIONS', {}))
+        return _broker
+
+
+def _publish_on_commit(user_id, message):
+    def publish():
+        try:
+            get_broker().publish(user_channel(user_id), message)
+        except Exception:
+            # Realtime delivery is best effort; clients resync on reconnect.
+            logger.exception('Failed to publish realtime message')
+    transaction.on_commit(publish)
+
+
+def publish_notification(notification):
+    from .serializers import NotificationSerializer
+    _publish_on_commit(notification.recipient_id, {
+        'event': 'notification',
+        'data': NotificationSerializer(notification).data,
+    })
+
+
+def publish_unread_count(user_id, count):
+    _publish_on_commit(user_id, {'event': 'unread_count', 'data': {'unread_count': count}})
+
+
+def _encode_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, default=str)}\n\n'.encode()
+
+
+def _authenticate(scope):
+    from django.contrib.auth.models import User
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    # EventSource cannot set headers, so the access token comes in the query string.
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+    if not token:
+        return None
+    try:
+        user_id = AccessToken(token)['user_id']
+    except (TokenError, KeyError):
+        return None
+    return User.objects.filter(id=user_id, is_active=True).first()
+
+
+async def _send_error(send, status, message):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps({'error': message}).encode()})
+
+
+async def notification_stream(scope, receive, send):
+    """ASGI Server-Sent Events endpoint pushing notifications and unread counts to one user."""
+    from .notifications import unread_count
+
+    user = await sync_to_async(_authenticate)(scope)
+    if user is None:
+        await _send_error(send, 401, 'Authentication credentials were not provided or are invalid.')
+        return
+
+    async with get_broker().subscribe(user_channel(user.id)) as queue:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        count = await sync_to_async(unread_count)(user)
+        await send({'type': 'http.response.body', 'body': _encode_event('unread_count', {'unread_count': count}), 'more_body': True})
+
+        disconnected = asyncio.ensure_future(receive())
+        try:
+            while True:
+                message = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({message, disconnected}, timeout=KEEPALIVE_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    if disconnected.result()['type'] == 'http.disconnect':
+                        message.cancel()
+                        break
+                    disconnected = asyncio.ensure_future(receive())
+                if message in done:
+                    payload = message.result()
+                    await send({'type': 'http.response.body', 'body': _encode_event(payload['event'], payload['data']), 'more_body': True})
+                    continue
+                message.cancel()
+                if not done:
+                    await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+        finally:
+            disconnected.cancel()
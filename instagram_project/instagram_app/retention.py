@@ -0,0 +1,89 @@
+import gzip
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import ArchivedNotification, Notification, NotificationGroup
+
+RETENTION_DAYS = getattr(settings, 'NOTIFICATION_RETENTION_DAYS', {})
+DEFAULT_RETENTION_DAYS = 90
+BATCH_SIZE = getattr(settings, 'NOTIFICATION_COMPACTION_BATCH_SIZE', 1000)
+ARCHIVE_FIELDS = ('id', 'recipient_id', 'sender_id', 'notification_type', 'post_id', 'created_at')
+
+
+def cutoffs(now=None):
+    """Map each notification type with a retention period to the creation time before which it expires."""
+    now = now or timezone.now()
+    result = {}
+    for notification_type, _ in Notification.NOTIFICATION_TYPES:
+        days = RETENTION_DAYS.get(notification_type, DEFAULT_RETENTION_DAYS)
+        if days is not None:
+            result[notification_type] = now - timedelta(days=days)
+    return result
+
+
+def expired_notifications(notification_type, cutoff):
+    # Unread notifications are never compacted, so unread counters stay exact.
+    return Notification.objects.filter(notification_type=notification_type, is_read=True, created_at__lt=cutoff)
+
+
+def expired_groups(notification_type, cutoff):
+    return NotificationGroup.objects.filter(notification_type=notification_type, is_read=True, latest_at__lt=cutoff)
+
+
+def archive_to_table(rows):
+    ArchivedNotification.objects.bulk_create([
+        ArchivedNotification(
+            recipient_id=row['recipient_id'],
+            sender_id=row['sender_id'],
+            notification_type=row['notification_type'],
+            post_id=row['post_id'],
+            created_at=row['created_at'],
+        )
+        for row in rows
+    ])
+
+
+def archive_to_jsonl(path):
+    """Return an archiver appending rows to a gzip-compressed JSON Lines file at ``path``."""
+    def archive(rows):
+        with gzip.open(path, 'at', encoding='utf-8') as archive_file:
+            for row in rows:
+                archive_file.write(json.dumps(row, default=str) + '\n')
+    return archive
+
+
+def _compact_batches(queryset, fields, batch_size, max_batches, archive=None):
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        # Each batch is its own short transaction: rows are archived and
+        # deleted together, and locks are never held across the whole run.
+        with transaction.atomic():
+            rows = list(queryset.order_by('id').values(*fields)[:batch_size])
+            if not rows:
+                break
+            queryset.model.objects.filter(id__in=[row['id'] for row in rows]).delete()
+            if archive is not None:
+                archive(rows)
+        total += len(rows)
+        batches += 1
+    return total
+
+
+def compact(archive=archive_to_table, batch_size=BATCH_SIZE, max_batches=None, now=None):
+    """
+    Move read notifications past their type's retention period out of the hot
+    table and drop the read notification groups they belonged to.
+
+    Returns ``{notification_type: (notifications_archived, groups_deleted)}``.
+    """
+    results = {}
+    for notification_type, cutoff in cutoffs(now).items():
+        archived = _compact_batches(
+            expired_notifications(notification_type, cutoff), ARCHIVE_FIELDS, batch_size, max_batches, archive
+        )
+        groups = _compact_batches(expired_groups(notification_type, cutoff), ('id',), batch_size, max_batches)
+        results[notification_type] = (archived, groups)
+    return results
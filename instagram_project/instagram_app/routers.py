@@ -0,0 +1,114 @@
+import contextvars
+import random
+import time
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+STICKY_COOKIE = 'db_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+
+def replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def reading_from_replica():
+    return bool(replica_aliases()) and _replica_reads.get()
+
+
+def _sticky_key(user_id):
+    return f'primary_until:{user_id}'
+
+
+def request_user_id(request):
+    """
+    Id of the requesting user, if any: the session user, else the user of a
+    valid JWT access token, read before DRF authenticates the request.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.id
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    try:
+        raw_token = header and authentication.get_raw_token(header)
+        if not raw_token:
+            return None
+        return authentication.get_validated_token(raw_token).get(jwt_settings.USER_ID_CLAIM)
+    except (AuthenticationFailed, TokenError):
+        return None
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends writes, and reads outside views marked ``replica_reads``, to the
+    primary; reads inside marked views go to a random replica.
+    """
+
+    def db_for_read(self, model, **hints):
+        if reading_from_replica():
+            return random.choice(replica_aliases())
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replica_aliases()
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Enables replica reads for safe requests to views with ``replica_reads = True``.
+
+    After a successful write, reads by the same user are pinned to the
+    primary for REPLICA_STICKY_SECONDS so they see their own writes despite
+    replica lag. The pin is a cache entry keyed by user id, which works for
+    the cross-origin JWT client; same-origin and anonymous clients also get
+    a short-lived cookie.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _replica_reads.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400 and replica_aliases():
+            sticky_seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+            until = int(time.time()) + sticky_seconds
+            # DRF has authenticated the request by now.
+            user_id = request_user_id(request)
+            if user_id is not None:
+                cache.set(_sticky_key(user_id), until, sticky_seconds)
+            response.set_cookie(STICKY_COOKIE, str(until), max_age=sticky_seconds, httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        if request.method in SAFE_METHODS and getattr(view_class, 'replica_reads', False) and not self.is_pinned(request):
+            _replica_reads.set(True)
+
+    @staticmethod
+    def is_pinned(request):
+        try:
+            if int(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time():
+                return True
+        except ValueError:
+            pass
+        user_id = request_user_id(request)
+        return user_id is not None and cache.get(_sticky_key(user_id), 0) > time.time()
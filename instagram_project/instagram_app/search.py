@@ -0,0 +1,274 @@
+import hashlib
+import heapq
+import math
+import unicodedata
+from collections import defaultdict, namedtuple
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from .models import Follow, SearchAffinity, UserSearchEntry, UserSearchTrigram
+
+RESULT_LIMIT = getattr(settings, 'USER_SEARCH_RESULT_LIMIT', 10)
+BATCH_SIZE = getattr(settings, 'USER_SEARCH_BATCH_SIZE', 1000)
+# Text matches re-ranked per searcher, and how long they are shared between
+# searchers typing the same prefix.
+CANDIDATE_LIMIT = getattr(settings, 'USER_SEARCH_CANDIDATES', 50)
+CANDIDATE_CACHE_TIMEOUT = getattr(settings, 'USER_SEARCH_CANDIDATE_CACHE_TIMEOUT', 60)
+# Seconds a searcher's ranked results are cached (until they follow or unfollow someone).
+CACHE_TIMEOUT = getattr(settings, 'USER_SEARCH_CACHE_TIMEOUT', 60)
+WEIGHTS = {
+    'following': 40,
+    # Per doubling of the followed accounts that also follow the hit.
+    'mutual': 10,
+    # Per tenfold of the hit's followers.
+    'followers': 5,
+    **getattr(settings, 'USER_SEARCH_WEIGHTS', {}),
+}
+# Text relevance of exact username, username prefix, full-name prefix,
+# last-name prefix and trigram matches.
+TIER_SCORES = (100, 60, 50, 40, 20)
+# Friends-of-friends kept per user by rebuild_affinity.
+AFFINITY_LIMIT = getattr(settings, 'USER_SEARCH_AFFINITY_LIMIT', 500)
+NAME_FIELDS = {'username', 'first_name', 'last_name'}
+# Sorts after every character, so [prefix, prefix + PREFIX_END) is exactly
+# the strings starting with prefix: an index range scan on any backend,
+# unlike LIKE, which SQLite only optimizes for case-insensitive collations.
+PREFIX_END = '\U0010ffff'
+# Entry columns searched by prefix, in ranking order.
+PREFIX_FIELDS = ('username', 'full_name', 'last_name')
+
+
+def normalize(value):
+    return ' '.join(unicodedata.normalize('NFKC', value or '').casefold().split())
+
+
+def clip(field, value):
+    """``value`` cut to the length of the UserSearchEntry column ``field``: normalizing can lengthen a name."""
+    return value[:UserSearchEntry._meta.get_field(field).max_length]
+
+
+def entry_values(username, first_name, last_name):
+    last_name = normalize(last_name)
+    return {
+        'username': clip('username', normalize(username)),
+        'full_name': clip('full_name', normalize(f'{first_name} {last_name}')),
+        'last_name': clip('last_name', last_name),
+    }
+
+
+def trigrams(*terms):
+    grams = set()
+    for term in terms:
+        for word in term.split():
+            grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+def index_users(users):
+    """(Re)build the search rows of ``users``; returns how many were indexed."""
+    entries = [
+        UserSearchEntry(user_id=user.id, **entry_values(user.username, user.first_name, user.last_name))
+        for user in users
+    ]
+    user_ids = [entry.user_id for entry in entries]
+    with transaction.atomic():
+        UserSearchTrigram.objects.filter(user_id__in=user_ids).delete()
+        UserSearchEntry.objects.filter(user_id__in=user_ids).delete()
+        UserSearchEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+        UserSearchTrigram.objects.bulk_create([
+            UserSearchTrigram(trigram=gram, user_id=entry.user_id)
+            for entry in entries
+            for gram in trigrams(entry.username, entry.full_name)
+        ], batch_size=BATCH_SIZE)
+    return len(entries)
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """Re-index every user in batches; returns how many were indexed."""
+    indexed = 0
+    batch = []
+    for user in User.objects.only(*NAME_FIELDS).order_by('id').iterator(chunk_size=batch_size):
+        batch.append(user)
+        if len(batch) >= batch_size:
+            indexed += index_users(batch)
+            batch = []
+    if batch:
+        indexed += index_users(batch)
+    return indexed
+
+
+def index_user(sender, instance, update_fields=None, **kwargs):
+    # Saves that cannot change a name (e.g. last_login on login) skip the index.
+    if update_fields is not None and not NAME_FIELDS & set(update_fields):
+        return
+    index_users([instance])
+
+
+def prefix_matches(field, query, exclude=None, limit=RESULT_LIMIT):
+    # A query longer than the column can only match names that were cut to fit.
+    query = clip(field, query)
+    return (
+        UserSearchEntry.objects.filter(**{f'{field}__gte': query, f'{field}__lt': query + PREFIX_END})
+        .exclude(user_id=exclude)
+        .order_by(field, 'user_id')
+        .values_list('user_id', flat=True)[:limit]
+    )
+
+
+def trigram_matches(grams, exclude=None, limit=RESULT_LIMIT):
+    """Users whose username or name contains every one of ``grams``."""
+    return (
+        UserSearchTrigram.objects.filter(trigram__in=grams)
+        .exclude(user_id=exclude)
+        .values('user_id')
+        .annotate(hits=Count('id'))
+        .filter(hits=len(grams))
+        .order_by('user_id')
+        .values_list('user_id', flat=True)[:limit]
+    )
+
+
+def matches(query, exclude=None, limit=RESULT_LIMIT):
+    """
+    ``(user_id, tier)`` for up to ``limit`` users matching ``query``, best
+    match first; ``tier`` indexes TIER_SCORES: exact username, username
+    prefix, full-name prefix, last-name prefix, then users whose username or
+    name contains every trigram of the query.
+
+    Prefix steps are index range scans stopped after ``limit`` rows and the
+    trigram step reads only the index entries of the query's trigrams, so
+    the cost does not grow with the number of users.
+    """
+    query = normalize(query)
+    if not query:
+        return []
+    ranked = {}
+
+    def add(user_ids, tier):
+        for user_id in user_ids:
+            if len(ranked) >= limit:
+                return
+            ranked.setdefault(user_id, tier)
+
+    add(UserSearchEntry.objects.filter(username=clip('username', query)).exclude(user_id=exclude).values_list('user_id', flat=True), 0)
+    for tier, field in enumerate(PREFIX_FIELDS, start=1):
+        if len(ranked) >= limit:
+            return list(ranked.items())
+        add(prefix_matches(field, query, exclude, limit), tier)
+
+    grams = trigrams(query)
+    if grams and len(ranked) < limit:
+        # Users already ranked above may come back here too.
+        add(trigram_matches(grams, exclude, limit * 2), len(PREFIX_FIELDS) + 1)
+    return list(ranked.items())
+
+
+def search(query, exclude=None, limit=RESULT_LIMIT):
+    """Ids of up to ``limit`` users matching ``query`` by text alone, best first (see ``matches``)."""
+    return [user_id for user_id, _ in matches(query, exclude, limit)]
+
+
+def cached_matches(query, limit=CANDIDATE_LIMIT):
+    """``matches`` for everyone typing the same prefix, cached for CANDIDATE_CACHE_TIMEOUT seconds."""
+    key = f'usersearch:candidates:{limit}:{hashlib.md5(normalize(query).encode()).hexdigest()}'
+    candidates = cache.get(key)
+    if candidates is None:
+        candidates = matches(query, limit=limit)
+        cache.set(key, candidates, CANDIDATE_CACHE_TIMEOUT)
+    return candidates
+
+
+SearchHit = namedtuple('SearchHit', 'user is_following mutual_count score')
+
+
+def _score(tier, is_following, mutual_count, followers_count):
+    return (
+        TIER_SCORES[tier]
+        + (WEIGHTS['following'] if is_following else 0)
+        + WEIGHTS['mutual'] * math.log2(1 + mutual_count)
+        + WEIGHTS['followers'] * math.log10(1 + followers_count)
+    )
+
+
+def rank(query, viewer, limit=RESULT_LIMIT):
+    """
+    Text matches for ``query`` re-ranked for ``viewer`` as ``SearchHit``s:
+    accounts they follow, accounts followed by the accounts they follow
+    (from SearchAffinity) and accounts with many followers move up.
+    """
+    candidates = [(user_id, tier) for user_id, tier in cached_matches(query) if user_id != viewer.id]
+    if not candidates:
+        return []
+    user_ids = [user_id for user_id, _ in candidates]
+    following = set(
+        Follow.objects.filter(follower=viewer, following_id__in=user_ids).values_list('following_id', flat=True)
+    )
+    mutual = dict(
+        SearchAffinity.objects.filter(user=viewer, target_id__in=user_ids).values_list('target_id', 'mutual_count')
+    )
+    users = (
+        User.objects.select_related('profile')
+        .only('username', 'first_name', 'last_name', 'profile__profile_picture', 'profile__followers_count')
+        .in_bulk(user_ids)
+    )
+
+    hits = []
+    for user_id, tier in candidates:
+        user = users.get(user_id)
+        if user is None:
+            continue
+        profile = getattr(user, 'profile', None)
+        followers_count = profile.followers_count if profile else 0
+        is_following = user_id in following
+        score = _score(tier, is_following, mutual.get(user_id, 0), followers_count)
+        hits.append(SearchHit(user, is_following, mutual.get(user_id, 0), score))
+    # sorted() is stable: equal scores keep their text-match order.
+    return sorted(hits, key=lambda hit: -hit.score)[:limit]
+
+
+def _affinity_rows(user_ids):
+    """Top AFFINITY_LIMIT friends-of-friends for each of ``user_ids`` that the user does not follow yet."""
+    followed = defaultdict(set)
+    for follower_id, following_id in Follow.objects.filter(follower_id__in=user_ids).values_list('follower_id', 'following_id'):
+        followed[follower_id].add(following_id)
+    # follower__followers__follower is the searcher: they follow the
+    # account that follows the target.
+    pairs = (
+        Follow.objects.filter(follower__followers__follower_id__in=user_ids)
+        .values_list('follower__followers__follower_id', 'following_id')
+        .annotate(mutual=Count('id'))
+        .order_by()
+    )
+    candidates = defaultdict(list)
+    for user_id, target_id, mutual_count in pairs.iterator():
+        if target_id != user_id and target_id not in followed[user_id]:
+            candidates[user_id].append((mutual_count, target_id))
+    for user_id, targets in candidates.items():
+        for mutual_count, target_id in heapq.nlargest(AFFINITY_LIMIT, targets):
+            yield SearchAffinity(user_id=user_id, target_id=target_id, mutual_count=mutual_count)
+
+
+def rebuild_affinity(user_ids=None, batch_size=100):
+    """Recompute SearchAffinity for ``user_ids`` (default: everyone) in batches; returns how many rows were written."""
+    if user_ids is None:
+        user_ids = User.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=batch_size)
+    written = 0
+    batch = []
+    for user_id in user_ids:
+        batch.append(user_id)
+        if len(batch) >= batch_size:
+            written += _rebuild_affinity_batch(batch)
+            batch = []
+    if batch:
+        written += _rebuild_affinity_batch(batch)
+    return written
+
+
+def _rebuild_affinity_batch(user_ids):
+    rows = list(_affinity_rows(user_ids))
+    with transaction.atomic():
+        SearchAffinity.objects.filter(user_id__in=user_ids).delete()
+        SearchAffinity.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
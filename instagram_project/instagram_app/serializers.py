@@ -1,13 +1,67 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
-from .models import Post, Like, Comment, Follow, Notification, UserProfile, Story
+from django.db.models import Exists, F, OuterRef, Window
+from django.db.models.functions import RowNumber
+from .models import Post, Like, Comment, Follow, Notification, NotificationGroup, UserProfile, Story, StoryView
+from . import images
 
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserProfile
         fields = ['profile_picture', 'bio', 'profile_picture_url']
 
+def viewer_following_ids(context):
+    """Ids the requesting user follows, loaded once and shared by every serializer in the response."""
+    if 'following_ids' not in context:
+        request = context.get('request')
+        if request and request.user.is_authenticated:
+            context['following_ids'] = set(
+                Follow.objects.filter(follower=request.user).values_list('following_id', flat=True)
+            )
+        else:
+            context['following_ids'] = set()
+    return context['following_ids']
+
+class UserSummarySerializer(serializers.BaseSerializer):
+    """
+    Compact, read-only user representation for nested references.
+
+    Written by hand rather than with ModelSerializer fields: it runs once per
+    post, comment, story and notification in a response, so it touches only
+    the (select_related) profile and the shared set of followed ids.
+    """
+
+    def to_representation(self, user):
+        try:
+            picture = user.profile.profile_picture
+        except UserProfile.DoesNotExist:
+            picture = None
+        return {
+            'id': user.id,
+            'username': user.username,
+            'profile_picture_url': picture.url if picture else None,
+            'is_following': user.id in viewer_following_ids(self.context),
+        }
+
+class UserSearchHitSerializer(serializers.BaseSerializer):
+    """Compact search result built from a ``search.SearchHit``; needs no further queries."""
+
+    def to_representation(self, hit):
+        user = hit.user
+        profile = getattr(user, 'profile', None)
+        return {
+            'id': user.id,
+            'username': user.username,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'profile_picture_url': profile.profile_picture_url if profile else None,
+            'followers_count': profile.followers_count if profile else 0,
+            'is_following': hit.is_following,
+            'mutual_count': hit.mutual_count,
+        }
+
 class UserSerializer(serializers.ModelSerializer):
     followers_count = serializers.SerializerMethodField()
     following_count = serializers.SerializerMethodField()
@@ -20,19 +74,28 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 
                  'followers_count', 'following_count', 'posts_count', 'is_following', 'profile']
 
+    def _profile(self, obj):
+        try:
+            return obj.profile
+        except UserProfile.DoesNotExist:
+            return None
+
     def get_followers_count(self, obj):
-        return obj.followers.count()
+        profile = self._profile(obj)
+        return profile.followers_count if profile else obj.followers.count()
 
     def get_following_count(self, obj):
-        return obj.following.count()
+        profile = self._profile(obj)
+        return profile.following_count if profile else obj.following.count()
 
     def get_posts_count(self, obj):
-        return obj.posts.count()
+        profile = self._profile(obj)
+        return profile.posts_count if profile else obj.posts.count()
     
     def get_is_following(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated and request.user != obj:
-            return Follow.objects.filter(follower=request.user, following=obj).exists()
+            return obj.id in viewer_following_ids(self.context)
         return False
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -70,26 +133,105 @@ class UserLoginSerializer(serializers.Serializer):
         return data
 
 class CommentSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+    user = UserSummarySerializer(read_only=True)
 
     class Meta:
         model = Comment
         fields = ['id', 'text', 'user', 'created_at']
 
+COMMENT_PREVIEW_LIMIT = getattr(settings, 'COMMENT_PREVIEW_LIMIT', 2)
+
+def latest_comments(post_ids, limit=COMMENT_PREVIEW_LIMIT):
+    """Return the latest ``limit`` comments of each post, oldest first, keyed by post id."""
+    ranked = Comment.objects.filter(post_id__in=post_ids).annotate(
+        preview_rank=Window(
+            RowNumber(),
+            partition_by=F('post_id'),
+            order_by=[F('created_at').desc(), F('id').desc()],
+        )
+    ).filter(preview_rank__lte=limit).select_related('user__profile').order_by('post_id', 'created_at', 'id')
+
+    previews = {post_id: [] for post_id in post_ids}
+    for comment in ranked:
+        previews[comment.post_id].append(comment)
+    return previews
+
+def requested_image_variant(context, default):
+    """Image variant for this response: ``?image_size=`` if valid, else the view's ``image_variant`` context."""
+    request = context.get('request')
+    requested = getattr(request, 'query_params', {}).get('image_size')
+    if requested in images.VARIANTS:
+        return requested
+    return context.get('image_variant', default)
+
+def image_variant_urls(obj):
+    return {
+        name: {
+            'width': variant['width'],
+            'height': variant['height'],
+            **{image_format: obj.image.storage.url(path) for image_format, path in variant['files'].items()},
+        }
+        for name, variant in obj.image_variants.items()
+    }
+
+class PostListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        posts = list(data.all() if hasattr(data, 'all') else data)
+        # One window-function query selects the comment previews for the whole page.
+        previews = latest_comments([post.id for post in posts])
+        for post in posts:
+            post.preview_comments = previews[post.id]
+        return super().to_representation(posts)
+
 class PostSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+    user = UserSummarySerializer(read_only=True)
     likes_count = serializers.ReadOnlyField()
     comments_count = serializers.ReadOnlyField()
-    comments = CommentSerializer(many=True, read_only=True)
+    comments = serializers.SerializerMethodField()
+    has_more_comments = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
-    image_display_url = serializers.ReadOnlyField()
+    image_display_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
-        fields = ['id', 'image', 'image_url', 'image_display_url', 'caption', 'user', 'created_at', 
-                 'likes_count', 'comments_count', 'comments', 'is_liked']
+        fields = ['id', 'image', 'image_url', 'image_display_url', 'image_variants', 'image_state', 'caption', 'user', 'created_at', 
+                 'likes_count', 'comments_count', 'comments', 'has_more_comments', 'is_liked']
+        list_serializer_class = PostListSerializer
+
+    @staticmethod
+    def prepare_queryset(queryset, request):
+        queryset = queryset.select_related('user__profile')
+        if request.user.is_authenticated:
+            queryset = queryset.annotate(
+                viewer_has_liked=Exists(Like.objects.filter(user=request.user, post=OuterRef('pk')))
+            )
+        return queryset
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if instance.image_state != 'ready':
+            # The raw upload is not served until it has been processed.
+            data['image'] = None
+        return data
+
+    def get_image_display_url(self, obj):
+        return obj.image_variant_url(requested_image_variant(self.context, 'feed'))
+
+    def get_image_variants(self, obj):
+        return image_variant_urls(obj)
+
+    def get_comments(self, obj):
+        if not hasattr(obj, 'preview_comments'):
+            obj.preview_comments = latest_comments([obj.id])[obj.id]
+        return CommentSerializer(obj.preview_comments, many=True, context=self.context).data
+
+    def get_has_more_comments(self, obj):
+        return obj.comments_count > COMMENT_PREVIEW_LIMIT
 
     def get_is_liked(self, obj):
+        if hasattr(obj, 'viewer_has_liked'):
+            return obj.viewer_has_liked
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return Like.objects.filter(user=request.user, post=obj).exists()
@@ -106,13 +248,64 @@ class PostCreateSerializer(serializers.ModelSerializer):
         return data
 
 class StorySerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
-    image_display_url = serializers.ReadOnlyField()
+    user = UserSummarySerializer(read_only=True)
+    image_display_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
+    view_count = serializers.SerializerMethodField()
     is_expired = serializers.ReadOnlyField()
 
     class Meta:
         model = Story
-        fields = ['id', 'image', 'image_url', 'image_display_url', 'text', 'user', 'created_at', 'expires_at', 'is_expired']
+        fields = ['id', 'image', 'image_url', 'image_display_url', 'image_variants', 'image_state', 'text', 'user', 'view_count', 'created_at', 'expires_at', 'is_expired']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if instance.image_state != 'ready':
+            data['image'] = None
+        return data
+
+    def get_image_display_url(self, obj):
+        return obj.image_variant_url(requested_image_variant(self.context, 'full'))
+
+    def get_image_variants(self, obj):
+        return image_variant_urls(obj)
+
+    def get_view_count(self, obj):
+        # Only the author sees how many people viewed a story.
+        request = self.context.get('request')
+        if request and request.user.id == obj.user_id:
+            return obj.view_count
+        return None
+
+class StoryViewerSerializer(serializers.ModelSerializer):
+    viewer = UserSummarySerializer(read_only=True)
+
+    class Meta:
+        model = StoryView
+        fields = ['viewer', 'viewed_at']
+
+class StoryTrayListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        rows = list(data)
+        # Authors for the whole tray are loaded in one query.
+        self.context['tray_users'] = User.objects.select_related('profile').in_bulk(row['user_id'] for row in rows)
+        return [self.child.to_representation(row) for row in rows if row['user_id'] in self.context['tray_users']]
+
+class StoryTraySerializer(serializers.BaseSerializer):
+    """One story-tray entry per author, from the rows built by ``stories.tray``."""
+
+    class Meta:
+        list_serializer_class = StoryTrayListSerializer
+
+    def to_representation(self, row):
+        users = self.context.get('tray_users') or User.objects.select_related('profile').in_bulk([row['user_id']])
+        return {
+            'user': UserSummarySerializer(users[row['user_id']], context=self.context).data,
+            'story_count': row['story_count'],
+            'unseen_count': row['unseen_count'],
+            'all_seen': row['unseen_count'] == 0,
+            'latest_at': serializers.DateTimeField().to_representation(row['latest_at']),
+        }
 
 class StoryCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -125,15 +318,15 @@ class StoryCreateSerializer(serializers.ModelSerializer):
         return data
 
 class FollowSerializer(serializers.ModelSerializer):
-    follower = UserSerializer(read_only=True)
-    following = UserSerializer(read_only=True)
+    follower = UserSummarySerializer(read_only=True)
+    following = UserSummarySerializer(read_only=True)
 
     class Meta:
         model = Follow
         fields = ['id', 'follower', 'following', 'created_at']
 
 class NotificationSerializer(serializers.ModelSerializer):
-    sender = UserSerializer(read_only=True)
+    sender = UserSummarySerializer(read_only=True)
     message = serializers.ReadOnlyField()
     post_image = serializers.SerializerMethodField()
 
@@ -143,5 +336,53 @@ class NotificationSerializer(serializers.ModelSerializer):
 
     def get_post_image(self, obj):
         if obj.post:
-            return obj.post.image_display_url
-        return None
\ No newline at end of file
+            return obj.post.image_variant_url('thumbnail')
+        return None
+
+class NotificationGroupListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        groups = list(data.all() if hasattr(data, 'all') else data)
+        sender_ids = {sender_id for group in groups for sender_id in group.sample_sender_ids}
+        # Sample senders for the whole page are loaded in one query.
+        self.context['group_senders'] = User.objects.select_related('profile').in_bulk(sender_ids)
+        return super().to_representation(groups)
+
+class NotificationGroupSerializer(serializers.ModelSerializer):
+    senders = serializers.SerializerMethodField()
+    message = serializers.SerializerMethodField()
+    post_image = serializers.SerializerMethodField()
+
+    VERBS = {
+        'like': 'liked your post',
+        'comment': 'commented on your post',
+        'follow': 'started following you',
+    }
+
+    class Meta:
+        model = NotificationGroup
+        fields = ['id', 'notification_type', 'count', 'senders', 'message', 'post', 'post_image', 'is_read', 'latest_at']
+        list_serializer_class = NotificationGroupListSerializer
+
+    def _senders(self, obj):
+        if 'group_senders' not in self.context:
+            self.context['group_senders'] = User.objects.select_related('profile').in_bulk(obj.sample_sender_ids)
+        users = self.context['group_senders']
+        return [users[sender_id] for sender_id in obj.sample_sender_ids if sender_id in users]
+
+    def get_senders(self, obj):
+        return UserSummarySerializer(self._senders(obj), many=True, context=self.context).data
+
+    def get_message(self, obj):
+        names = [sender.username for sender in self._senders(obj)] or ['Someone']
+        verb = self.VERBS.get(obj.notification_type, 'sent you a notification')
+        others = obj.count - 1
+        if others <= 0:
+            return f"{names[0]} {verb}"
+        if others == 1 and len(names) > 1:
+            return f"{names[0]} and {names[1]} {verb}"
+        return f"{names[0]} and {others} others {verb}"
+
+    def get_post_image(self, obj):
+        if obj.post:
+            return obj.post.image_variant_url('thumbnail')
+        return None
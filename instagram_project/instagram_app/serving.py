@@ -0,0 +1,127 @@
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+# 'python' streams files from Django; 'x-accel-redirect' (nginx) or
+# 'x-sendfile' (Apache, lighttpd) hand them off to the front-end server.
+SERVE_MODE = getattr(settings, 'MEDIA_SERVE_MODE', 'python')
+ACCEL_PREFIX = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+MUTABLE_MAX_AGE = getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600)
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+CHUNK_SIZE = 64 * 1024
+
+HASHED_NAME = re.compile(r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(\.\w+)?$')
+RANGE = re.compile(r'^bytes=(?P<start>\d*)-(?P<end>\d*)$')
+
+
+def _etag(path, stat):
+    hashed = HASHED_NAME.match(path)
+    if hashed:
+        return f'"{hashed["digest"]}"'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        return etag in parse_etags(if_none_match) or if_none_match.strip() == '*'
+    since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return since is not None and int(mtime) <= since
+
+
+def _byte_range(request, etag, mtime, size):
+    """
+    Return ``(start, end)`` for a satisfiable single range, ``None`` to send the
+    whole file, or ``False`` when the range cannot be satisfied.
+    """
+    header = request.META.get('HTTP_RANGE')
+    if not header:
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != int(mtime):
+        return None
+    match = RANGE.match(header.strip())
+    if not match or (not match['start'] and not match['end']):
+        # Multiple or malformed ranges: the full response is always allowed.
+        return None
+    if not match['start']:
+        start, end = max(size - int(match['end']), 0), size - 1
+    else:
+        start = int(match['start'])
+        end = min(int(match['end']), size - 1) if match['end'] else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(full_path, start, end):
+    with open(full_path, 'rb') as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve a file from MEDIA_ROOT with validators, byte ranges and long-lived caching for hashed names."""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('Media not found')
+    if not os.path.isfile(full_path):
+        raise Http404('Media not found')
+
+    etag = _etag(path, stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': (
+            f'public, max-age={IMMUTABLE_MAX_AGE}, immutable' if HASHED_NAME.match(path)
+            else f'public, max-age={MUTABLE_MAX_AGE}'
+        ),
+    }
+    if _not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    if SERVE_MODE != 'python':
+        # The front-end server sends the bytes and handles Range itself.
+        response = HttpResponse(content_type=content_type, headers=headers)
+        if SERVE_MODE == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = ACCEL_PREFIX + path
+        else:
+            response['X-Sendfile'] = full_path
+        return response
+
+    byte_range = _byte_range(request, etag, stat.st_mtime, stat.st_size)
+    if byte_range is False:
+        return HttpResponse(status=416, headers={'Content-Range': f'bytes */{stat.st_size}'})
+
+    if request.method == 'HEAD':
+        return HttpResponse(content_type=content_type, headers={**headers, 'Content-Length': stat.st_size})
+    if byte_range is None:
+        return FileResponse(open(full_path, 'rb'), content_type=content_type, headers=headers)
+
+    start, end = byte_range
+    response = StreamingHttpResponse(_read_range(full_path, start, end), status=206, content_type=content_type, headers={
+        **headers,
+        'Content-Range': f'bytes {start}-{end}/{stat.st_size}',
+        'Content-Length': end - start + 1,
+    })
+    return response
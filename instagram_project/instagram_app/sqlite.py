@@ -0,0 +1,17 @@
+from django.conf import settings
+
+
+def pragmas():
+    """The pragmas applied to every new SQLite connection (settings.SQLITE_PRAGMAS)."""
+    return getattr(settings, 'SQLITE_PRAGMAS', {})
+
+
+def apply_pragmas(cursor):
+    for name, value in pragmas().items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            apply_pragmas(cursor)
@@ -0,0 +1,77 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names every file after the SHA-256 of its content.
+
+    Uploads are hashed while they are streamed to a temporary file, then moved
+    to ``blobs/ab/cd/<sha256><ext>``. Identical content is stored once: a
+    second upload of the same bytes returns the existing name. Blobs are
+    reference-counted by ``instagram_app.media`` and only removed by its
+    garbage collector, so ``delete`` is never called for a blob that is still
+    referenced.
+    """
+    prefix = 'blobs'
+    incoming_directory = '.incoming'
+
+    def hashed_name(self, digest, extension):
+        return posixpath.join(self.prefix, digest[:2], digest[2:4], f'{digest}{extension}')
+
+    def get_available_name(self, name, max_length=None):
+        # The final name depends on the content, see _save.
+        return name
+
+    def _make_directory(self, directory):
+        if self.directory_permissions_mode is None:
+            os.makedirs(directory, exist_ok=True)
+            return
+        old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+        try:
+            os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+        finally:
+            os.umask(old_umask)
+
+    def _save(self, name, content):
+        from . import media
+
+        incoming = self.path(self.incoming_directory)
+        self._make_directory(incoming)
+        digest = hashlib.sha256()
+        size = 0
+        fd, temporary_path = tempfile.mkstemp(dir=incoming)
+        try:
+            with os.fdopen(fd, 'wb') as temporary:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    size += len(chunk)
+                    temporary.write(chunk)
+
+            hashed = self.hashed_name(digest.hexdigest(), os.path.splitext(name)[1].lower())
+            full_path = self.path(hashed)
+            with transaction.atomic(savepoint=False):
+                # Register before checking for the file: a garbage collection
+                # of the same blob either finished first (the file is gone and
+                # is written again) or has to wait for this commit.
+                media.register(hashed, size)
+                if os.path.exists(full_path):
+                    os.remove(temporary_path)
+                else:
+                    self._make_directory(os.path.dirname(full_path))
+                    if self.file_permissions_mode is not None:
+                        os.chmod(temporary_path, self.file_permissions_mode)
+                    # Atomic on one file system: readers never see a partial blob,
+                    # and concurrent uploads of the same content both succeed.
+                    os.replace(temporary_path, full_path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        return hashed
@@ -0,0 +1,166 @@
+from collections import Counter, namedtuple
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef, Q
+from django.utils import timezone
+from .models import ArchivedStory, Follow, Story, StoryView
+from .workers import BatchWorker
+from . import cache as response_cache
+from . import counters, timeline
+
+BATCH_SIZE = getattr(settings, 'STORY_SWEEP_BATCH_SIZE', 200)
+# Upper bound on how stale a tray may be: trays of high-follower authors'
+# followers are not bumped individually when a story is posted.
+TRAY_CACHE_TIMEOUT = getattr(settings, 'STORY_TRAY_CACHE_TIMEOUT', 60)
+VIEW_BATCH_SIZE = getattr(settings, 'STORY_VIEW_BATCH_SIZE', 1000)
+VIEW_FLUSH_INTERVAL = getattr(settings, 'STORY_VIEW_FLUSH_INTERVAL', 2.0)
+# Keeps the existing-view lookups well under the bound-parameter limit.
+VIEW_CHUNK_SIZE = 200
+ARCHIVE_FIELDS = ('id', 'user_id', 'text', 'image_url', 'created_at', 'expires_at')
+
+
+def expired(now=None):
+    return Story.objects.filter(expires_at__lte=now or timezone.now())
+
+
+def archive_to_table(stories):
+    ArchivedStory.objects.bulk_create([
+        ArchivedStory(**{field: getattr(story, field) for field in ARCHIVE_FIELDS if field != 'id'})
+        for story in stories
+    ])
+
+
+def sweep(archive=archive_to_table, batch_size=BATCH_SIZE, max_batches=None, now=None):
+    """
+    Delete stories past ``expires_at`` in batches of ``batch_size``, oldest
+    first, and return how many were removed.
+
+    Deleting goes through the model so ``media.release_media`` releases each
+    story's image and variants; ``media.collect_garbage`` removes the files.
+    """
+    now = now or timezone.now()
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        # One short transaction per batch, so the sweeper never holds write
+        # locks on the live table for long.
+        with transaction.atomic():
+            stories = list(expired(now).order_by('expires_at')[:batch_size])
+            if not stories:
+                break
+            if archive is not None:
+                archive(stories)
+            Story.objects.filter(id__in=[story.id for story in stories]).delete()
+        for author_id in {story.user_id for story in stories}:
+            invalidate_trays(author_id)
+        total += len(stories)
+        batches += 1
+    return total
+
+
+def tray(viewer, now=None):
+    """
+    One row per author with live stories the viewer can see (their own and
+    those of accounts they follow), computed in a single grouped query:
+    ``{'user_id', 'story_count', 'unseen_count', 'latest_at'}``.
+
+    The viewer's own entry comes first, then authors with unseen stories,
+    each group newest first.
+    """
+    seen = StoryView.objects.filter(story=OuterRef('pk'), viewer=viewer)
+    rows = list(
+        Story.objects.filter(
+            Q(user__in=Follow.objects.filter(follower=viewer).values('following_id')) | Q(user=viewer),
+            expires_at__gt=now or timezone.now(),
+        )
+        .order_by()
+        .values('user_id')
+        .annotate(
+            story_count=Count('id'),
+            unseen_count=Count('id', filter=~Exists(seen)),
+            latest_at=Max('created_at'),
+        )
+    )
+    rows.sort(key=lambda row: row['latest_at'], reverse=True)
+    rows.sort(key=lambda row: (row['user_id'] != viewer.id, row['unseen_count'] == 0))
+    return rows
+
+
+def invalidate_trays(author_id):
+    """Drop the cached trays that include ``author_id``'s stories."""
+    response_cache.bump('tray', author_id)
+    if timeline.is_fanout_on_read(author_id):
+        # Too many followers to bump one by one; their trays catch up
+        # within TRAY_CACHE_TIMEOUT.
+        return
+    follower_ids = Follow.objects.filter(following_id=author_id).values_list('follower_id', flat=True)
+    batch = []
+    for follower_id in follower_ids.iterator(chunk_size=timeline.BATCH_SIZE):
+        batch.append(follower_id)
+        if len(batch) >= timeline.BATCH_SIZE:
+            response_cache.bump('tray', *batch)
+            batch = []
+    if batch:
+        response_cache.bump('tray', *batch)
+
+
+ViewEvent = namedtuple('ViewEvent', 'story_id viewer_id viewed_at')
+
+
+def write_views(events):
+    """
+    Insert a batch of buffered views and add each story's new viewers to its
+    ``view_count``; repeat views of a story by the same viewer are ignored.
+    """
+    first = {}
+    for event in events:
+        first.setdefault((event.story_id, event.viewer_id), event)
+    events = list(first.values())
+    new = []
+
+    with transaction.atomic():
+        for start in range(0, len(events), VIEW_CHUNK_SIZE):
+            chunk = events[start:start + VIEW_CHUNK_SIZE]
+            story_ids = {event.story_id for event in chunk}
+            viewer_ids = {event.viewer_id for event in chunk}
+            # Stories swept since they were viewed are dropped with their views.
+            live = set(Story.objects.filter(id__in=story_ids).values_list('id', flat=True))
+            existing = set(
+                StoryView.objects.filter(story_id__in=story_ids, viewer_id__in=viewer_ids)
+                .values_list('story_id', 'viewer_id')
+            )
+            new.extend(
+                event for event in chunk
+                if event.story_id in live and (event.story_id, event.viewer_id) not in existing
+            )
+        StoryView.objects.bulk_create([
+            StoryView(story_id=event.story_id, viewer_id=event.viewer_id, viewed_at=event.viewed_at)
+            for event in new
+        ], batch_size=VIEW_BATCH_SIZE, ignore_conflicts=True)
+        # Two processes flushing the same view at once may both count it;
+        # `manage.py rebuild_counters` recounts from StoryView.
+        for story_id, count in Counter(event.story_id for event in new).items():
+            counters.adjust_story(story_id, view_count=count)
+
+    if events:
+        response_cache.bump('tray', *{event.viewer_id for event in events})
+
+
+_view_worker = BatchWorker(
+    write_views, batch_size=VIEW_BATCH_SIZE, flush_interval=VIEW_FLUSH_INTERVAL, name='story-view-worker'
+)
+
+
+def flush_views():
+    """Write story views still buffered in this process."""
+    _view_worker.flush()
+
+
+def record_view(story, viewer):
+    if story.user_id == viewer.id:
+        return
+    event = ViewEvent(story.id, viewer.id, timezone.now())
+    if getattr(settings, 'STORY_VIEW_QUEUE', 'memory') == 'memory':
+        _view_worker.submit(event)
+    else:
+        write_views([event])
@@ -1 +1,1043 @@
-from django.test import TestCase
+import asyncio
+import base64
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.db import connection
+from django.db.utils import ConnectionHandler
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from .models import ArchivedNotification, ArchivedStory, ImageJob, MediaBlob, Post, Comment, Follow, Like, Notification, NotificationJob, Story, TimelineEntry, UserProfile, UserSearchEntry
+from . import counters, image_jobs, media, notifications, realtime, retention, routers, search, stories, timeline, uploads
+from .management.commands import reprocess_images
+from .views import FeedView, LoginView
+
+
+def create_user(username, **fields):
+    user = User.objects.create_user(username, **fields)
+    UserProfile.objects.create(user=user)
+    return user
+
+
+def jpeg_upload(name='photo.jpg', size=(40, 40), **options):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, format='JPEG', **options)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class AuthorPostMixin:
+    """An author with one post, and a fan; both have profiles."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.fan = create_user('fan')
+        self.post = Post.objects.create(user=self.author, image_url='https://example.com/p.jpg')
+
+
+class MediaRootMixin:
+    """Point MEDIA_ROOT at a temporary directory for the duration of each test."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media_settings = self.settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+
+class FeedQueryCountTests(APITestCase):
+    def setUp(self):
+        self.viewer = User.objects.create_user('viewer')
+        UserProfile.objects.create(user=self.viewer)
+        for i in range(12):
+            author = User.objects.create_user(f'author{i}')
+            UserProfile.objects.create(user=author)
+            Follow.objects.create(follower=self.viewer, following=author)
+            post = Post.objects.create(user=author, image_url=f'https://example.com/{i}.jpg', caption=f'post {i}')
+            timeline.fan_out_post(post)
+            Like.objects.create(user=self.viewer, post=post)
+            for j in range(3):
+                commenter = User.objects.create_user(f'commenter{i}_{j}')
+                UserProfile.objects.create(user=commenter)
+                Comment.objects.create(post=post, user=commenter, text=f'comment {j}')
+        counters.rebuild_posts()
+        self.client.force_authenticate(self.viewer)
+
+    def count_feed_queries(self, page_size):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/feed/', {'page_size': page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(queries)
+
+    def test_feed_query_count_does_not_grow_with_page_size(self):
+        self.assertEqual(self.count_feed_queries(2), self.count_feed_queries(10))
+
+    def test_feed_reports_viewer_state(self):
+        response = self.client.get('/api/feed/', {'page_size': 1})
+        post = response.data['results'][0]
+        self.assertTrue(post['is_liked'])
+        self.assertTrue(post['user']['is_following'])
+
+    def test_feed_embeds_latest_comment_previews(self):
+        response = self.client.get('/api/feed/', {'page_size': 1})
+        post = response.data['results'][0]
+        self.assertEqual([comment['text'] for comment in post['comments']], ['comment 1', 'comment 2'])
+        self.assertEqual(set(post['comments'][0]['user']), {'id', 'username', 'profile_picture_url', 'is_following'})
+        self.assertTrue(post['has_more_comments'])
+
+
+@override_settings(IMAGE_QUEUE='sync', NOTIFICATION_QUEUE='sync', TIMELINE_QUEUE='sync')
+class TimelineTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.reader = create_user('reader')
+        self.author = create_user('author')
+        self.client.force_authenticate(self.reader)
+
+    def publish(self, user):
+        post = Post.objects.create(user=user, image_url='https://example.com/p.jpg')
+        timeline.fan_out_post(post)
+        return post
+
+    def feed_ids(self, page_size=20):
+        ids = []
+        url = f'/api/feed/?page_size={page_size}'
+        while url:
+            response = self.client.get(url)
+            ids.extend(post['id'] for post in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_new_posts_are_fanned_out_to_followers(self):
+        self.client.post(f'/api/follow/{self.author.id}/')
+        self.client.force_authenticate(self.author)
+        post_id = self.client.post('/api/posts/', {'image': jpeg_upload()}, format='multipart').data['id']
+
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(post_id=post_id).values_list('user_id', flat=True)),
+            {self.reader.id, self.author.id},
+        )
+        self.client.force_authenticate(self.reader)
+        self.assertEqual(self.feed_ids(), [post_id])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        posts = [self.publish(self.author) for _ in range(5)]
+        self.assertEqual(self.feed_ids(), [])
+
+        self.client.post(f'/api/follow/{self.author.id}/')
+        self.assertEqual(self.feed_ids(page_size=2), [post.id for post in reversed(posts)])
+
+        self.client.delete(f'/api/unfollow/{self.author.id}/')
+        self.assertEqual(self.feed_ids(), [])
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+
+    def test_accounts_over_the_fanout_limit_are_merged_on_read(self):
+        celebrity = create_user('celebrity')
+        self.client.post(f'/api/follow/{self.author.id}/')
+        self.client.post(f'/api/follow/{celebrity.id}/')
+        UserProfile.objects.filter(user=celebrity).update(followers_count=timeline.FANOUT_FOLLOWER_LIMIT)
+        posts = [self.publish(user) for user in (self.author, celebrity, self.author, celebrity, celebrity)]
+
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader, post__user=celebrity).exists())
+        with self.assertNumQueries(5):
+            # Timeline page, pulled authors, their page, comment previews
+            # and followed ids.
+            self.client.get('/api/feed/', {'page_size': 2})
+        self.assertEqual(self.feed_ids(page_size=2), [post.id for post in reversed(posts)])
+
+    def test_posts_stay_in_feeds_when_the_author_drops_under_the_fanout_limit(self):
+        self.client.post(f'/api/follow/{self.author.id}/')
+        UserProfile.objects.filter(user=self.author).update(followers_count=timeline.FANOUT_FOLLOWER_LIMIT)
+        pulled = self.publish(self.author)
+        UserProfile.objects.filter(user=self.author).update(followers_count=1)
+        pushed = self.publish(self.author)
+
+        self.assertEqual((pulled.timeline_fanout, pushed.timeline_fanout), ('pull', 'push'))
+        self.assertEqual(self.feed_ids(), [pushed.id, pulled.id])
+
+    @override_settings(TIMELINE_QUEUE='memory')
+    def test_posts_are_fanned_out_off_the_request_path(self):
+        self.client.post(f'/api/follow/{self.author.id}/')
+        post_id = Post.objects.create(user=self.author, image_url='https://example.com/p.jpg').id
+        with self.captureOnCommitCallbacks() as callbacks:
+            timeline.enqueue(Post.objects.get(id=post_id))
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(list(TimelineEntry.objects.values_list('user_id', flat=True)), [self.author.id])
+
+        # Until it is fanned out, followers' feeds merge the pending post on read.
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed_ids(), [post_id])
+
+        # The process died before the worker ran: maintain_timelines finishes it.
+        call_command('maintain_timelines', once=True, grace_seconds=0, stdout=StringIO())
+        self.assertEqual(Post.objects.get().timeline_fanout, 'push')
+        self.assertTrue(TimelineEntry.objects.filter(user=self.reader, post_id=post_id).exists())
+        self.assertEqual(self.feed_ids(), [post_id])
+
+    def test_timelines_are_trimmed_off_the_write_path(self):
+        self.client.post(f'/api/follow/{self.author.id}/')
+        with mock.patch.object(timeline, 'MAX_ENTRIES', 3):
+            posts = [self.publish(self.author) for _ in range(5)]
+            self.assertEqual(TimelineEntry.objects.filter(user=self.author).count(), 5)
+            out = StringIO()
+            call_command('maintain_timelines', once=True, stdout=out)
+            self.assertIn('trimmed 4 timeline entries', out.getvalue())
+            self.assertEqual(self.feed_ids(), [post.id for post in reversed(posts)][:3])
+            self.assertEqual(TimelineEntry.objects.filter(user=self.author).count(), 3)
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.viewer = User.objects.create_user('viewer')
+        UserProfile.objects.create(user=self.viewer)
+        self.client.force_authenticate(self.viewer)
+
+    def collect(self, url, page_size=2):
+        ids = []
+        url = f'{url}?page_size={page_size}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_pages_round_trip_through_identical_timestamps(self):
+        posts = [Post.objects.create(user=self.viewer, image_url='https://example.com/p.jpg') for _ in range(7)]
+        # Four posts share one timestamp; only the id orders them.
+        Post.objects.filter(id__in=[post.id for post in posts[1:5]]).update(created_at=posts[0].created_at)
+        expected = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.collect('/api/posts/'), expected)
+        self.assertEqual(self.collect(f'/api/posts/user/{self.viewer.id}/', page_size=3), expected)
+
+    def test_follow_lists_page_most_recent_first(self):
+        fans = [User.objects.create_user(f'fan{i}') for i in range(5)]
+        for fan in fans:
+            Follow.objects.create(follower=fan, following=self.viewer)
+            Follow.objects.create(follower=self.viewer, following=fan)
+        Follow.objects.filter(following=self.viewer).update(created_at=timezone.now())
+        self.assertEqual(self.collect('/api/followers/'), [fan.id for fan in reversed(fans)])
+        self.assertEqual(self.collect('/api/following/'), [fan.id for fan in reversed(fans)])
+
+    def test_invalid_or_tampered_cursors_are_rejected(self):
+        Post.objects.create(user=self.viewer, image_url='https://example.com/p.jpg')
+        for payload in (b'not a cursor', b'["yesterday", 1]', b'["2024-01-01T00:00:00+00:00", "x"]', b'[1]', b'{}'):
+            cursor = base64.urlsafe_b64encode(payload).decode('ascii')
+            self.assertEqual(self.client.get('/api/posts/', {'cursor': cursor}).status_code, 404)
+        self.assertEqual(self.client.get('/api/posts/', {'cursor': '%%%'}).status_code, 404)
+
+
+@override_settings(NOTIFICATION_QUEUE='sync')
+class ListQueryCountTests(APITestCase):
+    """Query counts of the list endpoints, which must not grow with the page or the data."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.viewer = User.objects.create_user('viewer')
+        UserProfile.objects.create(user=self.viewer)
+        self.authors = []
+        for i in range(6):
+            author = User.objects.create_user(f'author{i}')
+            UserProfile.objects.create(user=author)
+            self.authors.append(author)
+            self.client.force_authenticate(self.viewer)
+            self.client.post(f'/api/follow/{author.id}/')
+            self.client.force_authenticate(author)
+            self.client.post(f'/api/follow/{self.viewer.id}/')
+            Story.objects.create(user=author, image_url='https://example.com/s.jpg', expires_at=timezone.now() + timedelta(hours=1))
+            for j in range(2):
+                post = Post.objects.create(user=author, image_url='https://example.com/p.jpg')
+                timeline.fan_out_post(post)
+                self.client.post(f'/api/posts/{post.id}/comments/', {'text': f'comment {j}'})
+                self.client.force_authenticate(self.viewer)
+                self.client.post(f'/api/posts/{post.id}/like/')
+                self.client.force_authenticate(author)
+            self.client.post(f'/api/posts/{post.id}/like/')
+        self.post = post
+        self.client.force_authenticate(self.viewer)
+
+    def assertQueries(self, expected, url, paginated=True, **params):
+        """Fetch ``url`` in ``expected`` queries; paginated lists at two page sizes."""
+        for page_size in (2, 10) if paginated else (None,):
+            if page_size:
+                params['page_size'] = page_size
+            with self.subTest(url=url, page_size=page_size), self.assertNumQueries(expected):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.data['results'] if paginated else response.data)
+
+    def test_post_lists(self):
+        # Page, comment previews and followed ids; the feed also checks
+        # for accounts fanned out on read, the user's posts look up the user.
+        self.assertQueries(4, '/api/feed/')
+        self.assertQueries(3, '/api/posts/')
+        self.assertQueries(4, f'/api/posts/user/{self.authors[0].id}/')
+        self.assertQueries(2, f'/api/posts/{self.post.id}/comments/')
+
+    def test_story_lists(self):
+        self.assertQueries(3, '/api/stories/', paginated=False)
+        self.assertQueries(3, f'/api/stories/user/{self.authors[0].id}/', paginated=False)
+        self.assertQueries(3, '/api/stories/tray/', paginated=False)
+
+    def test_notification_lists(self):
+        self.assertQueries(2, '/api/notifications/')
+        self.assertQueries(3, '/api/notifications/groups/')
+
+    def test_people_lists(self):
+        self.assertQueries(2, '/api/followers/')
+        self.assertQueries(2, '/api/following/')
+        # Five text-match steps (shared between searchers through the
+        # cache), then follows, affinity and users of the candidates.
+        self.assertQueries(8, '/api/users/search/', paginated=False, q='author')
+
+
+@override_settings(NOTIFICATION_QUEUE='sync')
+class CounterTests(AuthorPostMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.fan)
+
+    def counts(self):
+        self.post.refresh_from_db()
+        author, fan = UserProfile.objects.get(user=self.author), UserProfile.objects.get(user=self.fan)
+        return self.post.likes_count, self.post.comments_count, author.followers_count, fan.following_count
+
+    def test_writes_keep_counters_in_step(self):
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.client.post(f'/api/posts/{self.post.id}/comments/', {'text': 'nice'})
+        self.client.post(f'/api/follow/{self.author.id}/')
+        self.client.post(f'/api/follow/{self.author.id}/')
+        self.assertEqual(self.counts(), (1, 1, 1, 1))
+
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.client.delete(f'/api/unfollow/{self.author.id}/')
+        self.client.delete(f'/api/unfollow/{self.author.id}/')
+        self.assertEqual(self.counts(), (0, 1, 0, 0))
+
+    def test_rebuild_counters_reports_and_repairs_drift(self):
+        # Direct writes skip the counter updates the views make.
+        Like.objects.create(user=self.fan, post=self.post)
+        Follow.objects.create(follower=self.fan, following=self.author)
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_counters', '--check', stdout=out)
+        self.assertIn(f'Post {self.post.id}: likes_count: stored 0, actual 1', out.getvalue())
+        self.assertIn('followers_count: stored 0, actual 1', out.getvalue())
+
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(self.counts(), (1, 0, 1, 1))
+        out = StringIO()
+        call_command('rebuild_counters', '--check', stdout=out)
+        self.assertIn('All counters are consistent.', out.getvalue())
+
+    def test_cascade_deletes_keep_counters_in_step(self):
+        counters.rebuild_profiles()
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.client.post(f'/api/posts/{self.post.id}/comments/', {'text': 'nice'})
+        self.client.post(f'/api/posts/{self.post.id}/comments/', {'text': 'again'})
+        self.client.post(f'/api/follow/{self.author.id}/')
+        other = Post.objects.create(user=self.fan, image_url='https://example.com/q.jpg')
+        Notification.objects.create(recipient=self.author, sender=self.fan, notification_type='like', post=other)
+        counters.rebuild_profiles()
+
+        other.delete()
+        self.assertEqual(list(counters.profile_mismatches()), [])
+        self.fan.delete()
+        self.assertEqual(list(counters.post_mismatches()), [])
+        self.assertEqual(list(counters.profile_mismatches()), [])
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (0, 0))
+        self.assertEqual(UserProfile.objects.get(user=self.author).followers_count, 0)
+
+
+@override_settings(IMAGE_QUEUE='sync', NOTIFICATION_QUEUE='sync')
+class ResponseCacheTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.author = create_user('author')
+        self.viewer = create_user('viewer')
+        self.post = Post.objects.create(user=self.author, image_url='https://example.com/p.jpg')
+
+    def get(self, url, user=None, **params):
+        self.client.force_authenticate(user or self.viewer)
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def act(self, user, method, url, data=None, **kwargs):
+        self.client.force_authenticate(user)
+        response = getattr(self.client, method)(url, data, **kwargs)
+        self.assertLess(response.status_code, 300)
+        return response
+
+    def test_repeat_reads_are_served_from_the_cache(self):
+        urls = [
+            f'/api/profile/{self.author.id}/',
+            f'/api/posts/user/{self.author.id}/',
+            f'/api/followers/{self.author.id}/',
+            f'/api/following/{self.author.id}/',
+            '/api/stories/tray/',
+            '/api/users/search/?q=auth',
+        ]
+        for url in urls:
+            self.get(url)
+            with self.subTest(url=url), self.assertNumQueries(0):
+                self.get(url)
+        self.get(f'/api/posts/{self.post.id}/')
+        # Only the author lookup behind the cache key.
+        with self.assertNumQueries(1):
+            self.get(f'/api/posts/{self.post.id}/')
+
+    def test_profile_edit(self):
+        self.get(f'/api/profile/{self.author.id}/')
+        self.get(f'/api/posts/{self.post.id}/')
+        self.act(self.author, 'patch', '/api/profile/', {'first_name': 'Ada'})
+        self.assertEqual(self.get(f'/api/profile/{self.author.id}/')['first_name'], 'Ada')
+
+        self.assertIsNone(self.get(f'/api/posts/{self.post.id}/')['user']['profile_picture_url'])
+        self.act(self.author, 'patch', '/api/profile/picture/', {'profile_picture': jpeg_upload('me.jpg')}, format='multipart')
+        self.assertIsNotNone(self.get(f'/api/posts/{self.post.id}/')['user']['profile_picture_url'])
+
+    def test_post_create_and_delete(self):
+        posts_url = f'/api/posts/user/{self.author.id}/'
+        self.assertEqual(len(self.get(posts_url)['results']), 1)
+        self.assertEqual(self.get(f'/api/profile/{self.author.id}/')['posts_count'], 0)
+
+        self.act(self.author, 'post', '/api/posts/', {'image': jpeg_upload('photo.jpg')}, format='multipart')
+        self.assertEqual(len(self.get(posts_url)['results']), 2)
+        self.assertEqual(self.get(f'/api/profile/{self.author.id}/')['posts_count'], 1)
+
+        self.get(f'/api/posts/{self.post.id}/')
+        self.post.delete()
+        self.assertEqual(len(self.get(posts_url)['results']), 1)
+        self.client.force_authenticate(self.viewer)
+        self.assertEqual(self.client.get(f'/api/posts/{self.post.id}/').status_code, 404)
+
+    def test_like_and_comment(self):
+        detail_url = f'/api/posts/{self.post.id}/'
+        posts_url = f'/api/posts/user/{self.author.id}/'
+        self.get(detail_url)
+        self.get(posts_url, user=self.author)
+
+        self.act(self.viewer, 'post', f'/api/posts/{self.post.id}/like/')
+        post = self.get(detail_url)
+        self.assertEqual((post['likes_count'], post['is_liked']), (1, True))
+        self.assertEqual(self.get(posts_url, user=self.author)['results'][0]['likes_count'], 1)
+
+        self.act(self.viewer, 'post', f'/api/posts/{self.post.id}/comments/', {'text': 'nice'})
+        self.assertEqual(self.get(detail_url)['comments_count'], 1)
+        self.assertEqual(self.get(posts_url, user=self.author)['results'][0]['comments'][0]['text'], 'nice')
+
+    def test_follow(self):
+        profile_url = f'/api/profile/{self.author.id}/'
+        search_url = '/api/users/search/'
+        self.assertFalse(self.get(profile_url)['is_following'])
+        self.assertEqual(self.get(f'/api/followers/{self.author.id}/')['results'], [])
+        self.assertEqual(self.get('/api/following/')['results'], [])
+        self.assertFalse(self.get(search_url, q='auth')[0]['is_following'])
+
+        self.act(self.viewer, 'post', f'/api/follow/{self.author.id}/')
+        profile = self.get(profile_url)
+        self.assertEqual((profile['followers_count'], profile['is_following']), (1, True))
+        self.assertEqual([user['id'] for user in self.get(f'/api/followers/{self.author.id}/')['results']], [self.viewer.id])
+        self.assertEqual([user['id'] for user in self.get('/api/following/')['results']], [self.author.id])
+        self.assertTrue(self.get(search_url, q='auth')[0]['is_following'])
+
+    def test_story_create_and_expire(self):
+        self.act(self.viewer, 'post', f'/api/follow/{self.author.id}/')
+        self.assertEqual(self.get('/api/stories/tray/'), [])
+
+        self.act(self.author, 'post', '/api/stories/', {'image': jpeg_upload('story.jpg')}, format='multipart')
+        self.assertEqual([entry['user']['id'] for entry in self.get('/api/stories/tray/')], [self.author.id])
+
+        stories.sweep(now=Story.objects.get().expires_at)
+        self.assertEqual(self.get('/api/stories/tray/'), [])
+
+
+@override_settings(NOTIFICATION_QUEUE='sync')
+class UnreadNotificationCountTests(AuthorPostMixin, APITestCase):
+    def unread_count(self, **headers):
+        self.client.force_authenticate(self.author)
+        return self.client.get('/api/notifications/unread-count/', headers=headers)
+
+    def test_counter_follows_notification_writes(self):
+        self.client.force_authenticate(self.fan)
+        self.client.post(f'/api/follow/{self.author.id}/')
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.client.post(f'/api/posts/{self.post.id}/comments/', {'text': 'nice'})
+        self.assertEqual(self.unread_count().data['unread_count'], 3)
+
+        self.client.force_authenticate(self.fan)
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.assertEqual(self.unread_count().data['unread_count'], 2)
+
+        self.client.post('/api/notifications/read-all/')
+        self.assertEqual(self.unread_count().data['unread_count'], 0)
+
+    def test_unchanged_count_returns_not_modified(self):
+        etag = self.unread_count()['ETag']
+        response = self.unread_count(if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.content)
+
+
+@override_settings(NOTIFICATION_QUEUE='database')
+class NotificationQueueTests(AuthorPostMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.fan)
+
+    def test_writes_are_queued_and_flapping_likes_coalesce(self):
+        for _ in range(3):
+            self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.client.post(f'/api/posts/{self.post.id}/comments/', {'text': 'nice'})
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(NotificationJob.objects.count(), 4)
+
+        self.assertEqual(notifications.process_database_jobs(), 4)
+        self.assertEqual(
+            sorted(Notification.objects.values_list('notification_type', flat=True)), ['comment', 'like']
+        )
+        self.assertEqual(notifications.unread_count(self.author), 2)
+        self.assertFalse(NotificationJob.objects.exists())
+
+
+@override_settings(NOTIFICATION_QUEUE='sync')
+class RealtimeTests(AuthorPostMixin, APITestCase):
+    def follow(self):
+        self.client.force_authenticate(self.fan)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/follow/{self.author.id}/')
+
+    async def test_notification_writes_reach_stream_subscribers(self):
+        events = asyncio.Queue()
+        disconnect = asyncio.Event()
+
+        async def send(message):
+            if message.get('body'):
+                await events.put(message['body'].decode())
+
+        async def receive():
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        scope = {'type': 'http', 'query_string': f'token={AccessToken.for_user(self.author)}'.encode()}
+        stream = asyncio.create_task(realtime.notification_stream(scope, receive, send))
+        self.assertIn('"unread_count": 0', await asyncio.wait_for(events.get(), 5))
+
+        await sync_to_async(self.follow)()
+        received = [await asyncio.wait_for(events.get(), 5) for _ in range(2)]
+        disconnect.set()
+        await asyncio.wait_for(stream, 5)
+
+        self.assertTrue(received[0].startswith('event: notification\n'))
+        self.assertIn('"notification_type": "follow"', received[0])
+        self.assertEqual(received[1], 'event: unread_count\ndata: {"unread_count": 1}\n\n')
+
+    def test_in_memory_broker_is_rejected_with_the_database_queue(self):
+        self.assertEqual(realtime.check_broker(), [])
+        with self.settings(NOTIFICATION_QUEUE='database'):
+            self.assertEqual([error.id for error in realtime.check_broker()], ['instagram_app.E001'])
+        with self.settings(NOTIFICATION_QUEUE='database', REALTIME_BROKER='instagram_app.realtime.RedisBroker'):
+            self.assertEqual(realtime.check_broker(), [])
+
+
+@override_settings(NOTIFICATION_QUEUE='sync')
+class NotificationGroupTests(APITestCase):
+    def setUp(self):
+        self.author = create_user('author')
+        self.fans = [create_user(f'fan{i}') for i in range(5)]
+        self.post = Post.objects.create(user=self.author, image_url='https://example.com/p.jpg')
+
+    def like(self, fan):
+        self.client.force_authenticate(fan)
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+
+    def groups(self):
+        self.client.force_authenticate(self.author)
+        return self.client.get('/api/notifications/groups/').data['results']
+
+    def test_likes_on_a_post_collapse_into_one_group(self):
+        for fan in self.fans:
+            self.like(fan)
+        [group] = self.groups()
+        self.assertEqual(group['count'], 5)
+        self.assertEqual([sender['username'] for sender in group['senders']], ['fan4', 'fan3', 'fan2'])
+        self.assertEqual(group['message'], 'fan4 and 4 others liked your post')
+
+        self.like(self.fans[4])
+        [group] = self.groups()
+        self.assertEqual(group['count'], 4)
+        self.assertEqual([sender['username'] for sender in group['senders']], ['fan3', 'fan2', 'fan1'])
+
+        response = self.client.post(f"/api/notifications/groups/{group['id']}/read/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(notifications.unread_count(self.author), 0)
+
+    def test_rows_written_by_a_concurrent_batch_are_not_counted_twice(self):
+        events = [
+            notifications.NotificationEvent('create', self.author.id, fan.id, 'like', self.post.id) for fan in self.fans[:2]
+        ]
+        bulk_create = Notification.objects.bulk_create
+
+        def concurrent_batch_first(objs, **kwargs):
+            # Another batch writes the first like after this one checked for it.
+            with mock.patch.object(Notification.objects, 'bulk_create', bulk_create):
+                notifications.process_events(events[:1])
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(Notification.objects, 'bulk_create', side_effect=concurrent_batch_first):
+            notifications.process_events(events)
+        [group] = self.groups()
+        self.assertEqual(group['count'], 2)
+        self.assertEqual(notifications.unread_count(self.author), 2)
+
+
+@override_settings(NOTIFICATION_QUEUE='sync')
+class NotificationRetentionTests(APITestCase):
+    def setUp(self):
+        self.author = create_user('author')
+        self.post = Post.objects.create(user=self.author, image_url='https://example.com/p.jpg')
+        for name in ('old_read', 'old_unread', 'new_read'):
+            notifications.notify(self.author, create_user(name), 'like', self.post)
+        long_ago = timezone.now() - timedelta(days=365)
+        Notification.objects.exclude(sender__username='new_read').update(created_at=long_ago)
+        Notification.objects.exclude(sender__username='old_unread').update(is_read=True)
+        counters.rebuild_profiles(fields=['unread_notifications_count'])
+
+    def test_compaction_archives_only_expired_read_notifications(self):
+        results = retention.compact(batch_size=1)
+        self.assertEqual(results['like'], (1, 0))
+        self.assertEqual(
+            sorted(Notification.objects.values_list('sender__username', flat=True)), ['new_read', 'old_unread']
+        )
+        self.assertEqual(ArchivedNotification.objects.get().sender.username, 'old_read')
+        self.assertEqual(notifications.unread_count(self.author), 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'])
+class ReplicaRoutingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def route(self, method, view_class, cookies=None, user=None):
+        """Run a request through the middleware and return (read alias inside the view, response)."""
+        headers = {'authorization': f'Bearer {AccessToken.for_user(user)}'} if user else {}
+        request = getattr(RequestFactory(), method)('/', headers=headers)
+        request.COOKIES.update(cookies or {})
+        routed_to = []
+
+        def get_response(request):
+            middleware.process_view(request, view_class.as_view(), (), {})
+            routed_to.append(routers.PrimaryReplicaRouter().db_for_read(Post))
+            return HttpResponse()
+
+        middleware = routers.ReplicaRoutingMiddleware(get_response)
+        response = middleware(request)
+        return routed_to[0], response
+
+    def test_marked_views_read_from_replicas(self):
+        self.assertEqual(self.route('get', FeedView)[0], 'replica_0')
+        self.assertEqual(self.route('get', LoginView)[0], 'default')
+        self.assertEqual(self.route('post', FeedView)[0], 'default')
+        self.assertEqual(routers.PrimaryReplicaRouter().db_for_read(Post), 'default')
+
+    def test_writes_pin_reads_to_the_primary(self):
+        cookie = self.route('post', LoginView)[1].cookies[routers.STICKY_COOKIE].value
+        self.assertEqual(self.route('get', FeedView, {routers.STICKY_COOKIE: cookie})[0], 'default')
+
+    def test_writes_pin_the_token_users_reads_without_cookies(self):
+        # The cross-origin client sends a bearer token but no cookies.
+        writer = User.objects.create_user('writer')
+        other = User.objects.create_user('other')
+        self.assertEqual(self.route('get', FeedView, user=writer)[0], 'replica_0')
+
+        self.route('post', FeedView, user=writer)
+        self.assertEqual(self.route('get', FeedView, user=writer)[0], 'default')
+        self.assertEqual(self.route('get', FeedView, user=other)[0], 'replica_0')
+        self.assertEqual(self.route('get', FeedView)[0], 'replica_0')
+
+        request = RequestFactory().get('/', headers={'authorization': 'Bearer not-a-token'})
+        self.assertIsNone(routers.request_user_id(request))
+
+
+class SqlitePragmaTests(APITestCase):
+    def setUp(self):
+        # Test databases may be in memory, where WAL does not apply.
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_new_connections_use_the_pragma_profile(self):
+        database = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(Path(self.directory) / 'db.sqlite3')}
+        new_connection = ConnectionHandler({'default': database})['default']
+        self.addCleanup(new_connection.close)
+        with new_connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+
+@override_settings(IMAGE_QUEUE='sync')
+class ImagePipelineTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('author')
+        self.client.force_authenticate(self.user)
+
+    def upload(self):
+        # A landscape photo stored sideways, with an EXIF "rotate 90" orientation.
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        return jpeg_upload(size=(2000, 1000), exif=exif)
+
+    @override_settings(IMAGE_QUEUE='database')
+    def test_upload_and_media_query_counts(self):
+        for _ in range(2):
+            with self.assertNumQueries(13):
+                response = self.client.post('/api/posts/', {'image': self.upload()}, format='multipart')
+            self.assertEqual(response.status_code, 201)
+        for job_id in image_jobs.claim(10):
+            # Two queries register each of the six variant files.
+            with self.assertNumQueries(22):
+                self.assertTrue(image_jobs.run_job(job_id))
+
+        post = Post.objects.latest('id')
+        # Author lookup for the cache key, post, comment previews and followed ids.
+        with self.assertNumQueries(4):
+            self.assertEqual(self.client.get(f'/api/posts/{post.id}/').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(post.image_variant_url('full', 'webp')).status_code, 200)
+
+    def test_upload_is_oriented_stripped_and_resized(self):
+        response = self.client.post('/api/posts/', {'image': self.upload(), 'caption': 'hi'}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        post = Post.objects.get()
+
+        sizes = {name: (variant['width'], variant['height']) for name, variant in post.image_variants.items()}
+        self.assertEqual(sizes, {'full': (720, 1440), 'feed': (320, 640), 'thumbnail': (80, 160)})
+        self.assertEqual(response.data['image_display_url'], response.data['image_variants']['feed']['webp'])
+        self.assertTrue(response.data['image_display_url'].endswith('.webp'))
+        self.assertEqual(set(response.data['image_variants']['thumbnail']), {'width', 'height', 'webp', 'jpeg'})
+
+        with post.image.open('rb') as file, Image.open(file) as stored:
+            self.assertEqual(stored.size, (720, 1440))
+            self.assertFalse(stored.getexif())
+        media.collect_garbage(grace_period=timedelta(0))
+        stored = {
+            path.relative_to(self.media_root).as_posix()
+            for path in Path(self.media_root, 'blobs').rglob('*') if path.is_file()
+        }
+        # The raw upload is gone; only the referenced variants remain.
+        self.assertEqual(stored, media.media_names(post))
+
+    @override_settings(IMAGE_QUEUE='database')
+    def test_failing_jobs_are_retried_then_dead_lettered(self):
+        response = self.client.post('/api/posts/', {'image': self.upload()}, format='multipart')
+        self.assertEqual((response.data['image_state'], response.data['image_display_url']), ('processing', None))
+        post = Post.objects.get()
+        post.image.storage.delete(post.image.name)
+
+        job = ImageJob.objects.get()
+        with self.assertLogs('instagram_app.image_jobs', 'WARNING'):
+            for attempt in range(image_jobs.MAX_ATTEMPTS):
+                self.assertFalse(image_jobs.run_job(job.id))
+        job.refresh_from_db()
+        self.assertTrue(job.failed)
+        self.assertIn('FileNotFoundError', job.last_error)
+        self.assertEqual(Post.objects.get().image_state, 'failed')
+        self.assertFalse(image_jobs.run_job(job.id))
+
+    def test_reprocessing_skips_images_that_already_have_a_job(self):
+        self.client.post('/api/posts/', {'image': self.upload()}, format='multipart')
+        post = Post.objects.get()
+        reprocess = reprocess_images.Command()
+        [job_id] = reprocess.create_jobs('all', missing=False)
+        self.assertEqual(reprocess.create_jobs('all', missing=False), [])
+        ImageJob.objects.filter(id=job_id).update(failed=True)
+        self.assertEqual(reprocess.create_jobs('post', missing=False), [])
+        self.assertEqual(list(ImageJob.objects.values_list('post_id', flat=True)), [post.id])
+
+    @override_settings(IMAGE_QUEUE='memory')
+    def test_jobs_orphaned_by_a_dead_process_are_resumed_after_their_lease(self):
+        with mock.patch.object(image_jobs, '_submit') as submit:
+            # The job is never submitted: the process dies before its commit callbacks run.
+            self.client.post('/api/posts/', {'image': self.upload()}, format='multipart')
+            self.assertEqual(image_jobs.resume(), [])
+
+            job = ImageJob.objects.get()
+            ImageJob.objects.update(available_at=timezone.now())
+            submit.side_effect = image_jobs.run_job
+            with self.assertLogs('instagram_app.image_jobs', 'WARNING'):
+                self.assertEqual(image_jobs.resume(), [job.id])
+            submit.assert_called_once_with(job.id)
+            self.assertEqual(Post.objects.get().image_state, 'ready')
+            self.assertFalse(ImageJob.objects.exists())
+
+    def test_invalid_and_oversized_images_are_rejected_while_streaming(self):
+        fake = SimpleUploadedFile('photo.jpg', b'<html>' + b'x' * 100_000, content_type='image/jpeg')
+        response = self.client.post('/api/posts/', {'image': fake}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('valid image', response.data['image'][0])
+
+        buffer = BytesIO()
+        Image.new('1', (10_000, 6_000)).save(buffer, format='PNG')
+        huge = SimpleUploadedFile('huge.png', buffer.getvalue(), content_type='image/png')
+        response = self.client.patch('/api/profile/picture/', {'profile_picture': huge}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('megapixels', response.data['profile_picture'][0])
+        self.assertFalse(Post.objects.exists())
+
+    def test_large_webp_uploads_are_accepted(self):
+        # Noise does not compress: each file is past the header bytes the handler inspects.
+        for mode, options in (('RGB', {'quality': 100}), ('RGB', {'lossless': True}), ('RGBA', {'quality': 100})):
+            buffer = BytesIO()
+            Image.frombytes(mode, (600, 500), os.urandom(600 * 500 * len(mode))).save(buffer, 'WEBP', **options)
+            self.assertGreater(len(buffer.getvalue()), uploads.HEADER_LIMIT)
+            upload = SimpleUploadedFile('photo.webp', buffer.getvalue(), content_type='image/webp')
+            response = self.client.post('/api/posts/', {'image': upload}, format='multipart')
+            self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(
+            {tuple(post.image_variants['full'][key] for key in ('width', 'height')) for post in Post.objects.all()},
+            {(600, 500)},
+        )
+
+    def test_identical_uploads_share_one_blob_until_unreferenced(self):
+        content = self.upload().read()
+        for _ in range(2):
+            upload = SimpleUploadedFile('photo.jpg', content, content_type='image/jpeg')
+            self.client.post('/api/posts/', {'image': upload}, format='multipart')
+        first, second = Post.objects.order_by('id')
+        self.assertEqual(first.image_variants, second.image_variants)
+        self.assertEqual(MediaBlob.objects.get(name=first.image.name).refcount, 2)
+
+        storage = first.image.storage
+        first.delete()
+        media.collect_garbage(grace_period=timedelta(0))
+        self.assertTrue(storage.exists(second.image.name))
+
+        second.delete()
+        media.collect_garbage(grace_period=timedelta(0))
+        self.assertFalse(storage.exists(second.image.name))
+        self.assertFalse(MediaBlob.objects.filter(refcount__gt=0).exists())
+
+    def test_garbage_collection_spares_a_blob_uploaded_again_meanwhile(self):
+        name = default_storage.save('photo.jpg', ContentFile(b'same bytes'))
+        collect = media._collect
+
+        def upload_again_then_collect(*args):
+            # The same content is uploaded after the collector selected the blob.
+            self.assertEqual(default_storage.save('again.jpg', ContentFile(b'same bytes')), name)
+            return collect(*args)
+
+        with mock.patch.object(media, '_collect', side_effect=upload_again_then_collect):
+            self.assertEqual(media.collect_garbage(grace_period=timedelta(0)), 0)
+        self.assertTrue(default_storage.exists(name))
+        self.assertTrue(MediaBlob.objects.filter(name=name).exists())
+
+        # Once collected, uploading the content again writes the file again.
+        self.assertEqual(media.collect_garbage(grace_period=timedelta(0)), 1)
+        self.assertFalse(default_storage.exists(name))
+        self.assertEqual(default_storage.save('again.jpg', ContentFile(b'same bytes')), name)
+        self.assertTrue(default_storage.exists(name))
+
+
+class StorySweeperTests(MediaRootMixin, APITestCase):
+    def test_expired_stories_are_archived_and_their_media_collected(self):
+        user = User.objects.create_user('author')
+        now = timezone.now()
+        expired = Story.objects.create(
+            user=user, text='old', expires_at=now - timedelta(hours=1),
+            image=SimpleUploadedFile('old.jpg', b'old image'),
+        )
+        live = Story.objects.create(
+            user=user, text='new', expires_at=now + timedelta(hours=1),
+            image=SimpleUploadedFile('new.jpg', b'new image'),
+        )
+        storage = expired.image.storage
+
+        self.assertEqual(stories.sweep(batch_size=1, now=now), 1)
+        media.collect_garbage(grace_period=timedelta(0))
+
+        self.assertEqual(list(Story.objects.all()), [live])
+        self.assertEqual(ArchivedStory.objects.get().text, 'old')
+        self.assertFalse(storage.exists(expired.image.name))
+        self.assertTrue(storage.exists(live.image.name))
+
+
+@override_settings(STORY_VIEW_QUEUE='sync')
+class StoryTrayTests(APITestCase):
+    def test_tray_groups_stories_per_author_with_seen_state(self):
+        viewer = User.objects.create_user('viewer')
+        alice = User.objects.create_user('alice')
+        bob = User.objects.create_user('bob')
+        stranger = User.objects.create_user('stranger')
+        for user in (viewer, alice, bob, stranger):
+            UserProfile.objects.create(user=user)
+        Follow.objects.create(follower=viewer, following=alice)
+        Follow.objects.create(follower=viewer, following=bob)
+        expires_at = timezone.now() + timedelta(hours=1)
+        for user in (alice, alice, bob, stranger):
+            Story.objects.create(user=user, image_url='https://example.com/s.jpg', expires_at=expires_at)
+        Story.objects.create(user=alice, expires_at=timezone.now() - timedelta(hours=1))
+        bob_story = Story.objects.get(user=bob)
+        self.client.force_authenticate(viewer)
+
+        response = self.client.get('/api/stories/tray/')
+        self.assertEqual(
+            [(entry['user']['username'], entry['story_count'], entry['all_seen']) for entry in response.data],
+            [('bob', 1, False), ('alice', 2, False)],
+        )
+
+        self.client.post(f'/api/stories/{bob_story.id}/view/')
+        response = self.client.get('/api/stories/tray/')
+        self.assertEqual(
+            [(entry['user']['username'], entry['all_seen']) for entry in response.data],
+            [('alice', False), ('bob', True)],
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/stories/tray/').data, response.data)
+
+
+class StoryViewTests(APITestCase):
+    def test_buffered_views_are_written_once_and_listed_for_the_author(self):
+        author = User.objects.create_user('author')
+        viewers = [User.objects.create_user(f'viewer{i}') for i in range(3)]
+        for user in [author, *viewers]:
+            UserProfile.objects.create(user=user)
+        story = Story.objects.create(user=author, expires_at=timezone.now() + timedelta(hours=1))
+        now = timezone.now()
+
+        stories.write_views([
+            stories.ViewEvent(story.id, viewers[0].id, now - timedelta(minutes=2)),
+            stories.ViewEvent(story.id, viewers[1].id, now - timedelta(minutes=1)),
+            stories.ViewEvent(story.id, viewers[0].id, now),
+            stories.ViewEvent(story.id + 1, viewers[0].id, now),
+        ])
+        stories.write_views([
+            stories.ViewEvent(story.id, viewers[1].id, now),
+            stories.ViewEvent(story.id, viewers[2].id, now),
+        ])
+        story.refresh_from_db()
+        self.assertEqual(story.view_count, 3)
+        self.assertFalse(list(counters.story_mismatches()))
+
+        self.client.force_authenticate(author)
+        response = self.client.get(f'/api/stories/{story.id}/viewers/', {'page_size': 2})
+        self.assertEqual([row['viewer']['username'] for row in response.data['results']], ['viewer2', 'viewer1'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['viewer']['username'] for row in response.data['results']], ['viewer0'])
+
+        self.client.force_authenticate(viewers[0])
+        self.assertEqual(self.client.get(f'/api/stories/{story.id}/viewers/').status_code, 404)
+
+
+class UserSearchTests(APITestCase):
+    def setUp(self):
+        # Candidate lists are cached by query across tests.
+        cache.clear()
+
+    def test_prefix_matches_rank_before_infix_matches(self):
+        searcher = User.objects.create_user('searcher')
+        UserProfile.objects.create(user=searcher)
+        for username, first_name, last_name in [
+            ('blacksmith', '', ''),
+            ('jdoe', 'John', 'Smith'),
+            ('smithers', '', ''),
+            ('zed', 'Smitty', 'Werben'),
+            ('smi', '', ''),
+        ]:
+            UserProfile.objects.create(user=User.objects.create_user(username, first_name=first_name, last_name=last_name))
+        self.client.force_authenticate(searcher)
+
+        response = self.client.get('/api/users/search/', {'q': 'SMI'})
+        self.assertEqual([user['username'] for user in response.data], ['smi', 'smithers', 'zed', 'jdoe', 'blacksmith'])
+        self.assertEqual([user['username'] for user in self.client.get('/api/users/search/', {'q': 'john sm'}).data], ['jdoe'])
+
+        renamed = User.objects.get(username='zed')
+        renamed.first_name = 'Zed'
+        renamed.save()
+        self.assertNotIn(renamed.id, search.search('smi'))
+        self.assertEqual(search.search('search', exclude=searcher.id), [])
+
+    def test_names_that_grow_when_normalized_are_cut_to_fit(self):
+        user = User.objects.create_user('straße', first_name='ß' * 150, last_name='ß' * 150)
+        entry = UserSearchEntry.objects.get(user=user)
+        self.assertEqual((entry.username, len(entry.full_name), len(entry.last_name)), ('strasse', 301, 150))
+
+        self.assertEqual(search.search('STRASS'), [user.id])
+        self.assertEqual(search.search('ss' * 200), [user.id])
+        self.assertEqual(search.search('straß' + 'e' * 200), [])
+
+    def test_results_are_ranked_by_social_graph(self):
+        users = {}
+        for username in ('viewer', 'friend', 'anna_a', 'anna_b', 'anna_c', 'anna_d'):
+            users[username] = User.objects.create_user(username)
+            UserProfile.objects.create(user=users[username])
+        Follow.objects.create(follower=users['viewer'], following=users['friend'])
+        Follow.objects.create(follower=users['viewer'], following=users['anna_c'])
+        Follow.objects.create(follower=users['friend'], following=users['anna_b'])
+        UserProfile.objects.filter(user=users['anna_a']).update(followers_count=10)
+        search.rebuild_affinity()
+        self.client.force_authenticate(users['viewer'])
+
+        response = self.client.get('/api/users/search/', {'q': 'anna'})
+        self.assertEqual([hit['username'] for hit in response.data], ['anna_c', 'anna_b', 'anna_a', 'anna_d'])
+        self.assertEqual(
+            {key: response.data[1][key] for key in ('is_following', 'mutual_count', 'followers_count')},
+            {'is_following': False, 'mutual_count': 1, 'followers_count': 0},
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/users/search/', {'q': 'anna'}).data, response.data)
+
+
+class MediaServingTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.name = default_storage.save('photo.jpg', ContentFile(b'0123456789'))
+
+    def test_hashed_blobs_are_immutable_and_revalidate(self):
+        response = self.client.get(f'/media/{self.name}')
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['ETag'], f'"{Path(self.name).stem}"')
+
+        response = self.client.get(f'/media/{self.name}', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.client.get(f'/media/{self.name}', HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+
+        response = self.client.get(f'/media/{self.name}', HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+        response = self.client.get(f'/media/{self.name}', HTTP_RANGE='bytes=20-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */10'))
+
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
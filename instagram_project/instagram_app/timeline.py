@@ -0,0 +1,190 @@
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef
+from django.utils import timezone
+from .models import Post, Follow, Like, TimelineEntry, UserProfile
+from .pagination import after_cursor
+from .workers import BatchWorker
+
+FANOUT_FOLLOWER_LIMIT = getattr(settings, 'TIMELINE_FANOUT_FOLLOWER_LIMIT', 10000)
+BACKFILL_LIMIT = getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 200)
+BATCH_SIZE = getattr(settings, 'TIMELINE_BATCH_SIZE', 1000)
+# Entries kept per timeline by `manage.py maintain_timelines`; older posts
+# drop out of the feed.
+MAX_ENTRIES = getattr(settings, 'TIMELINE_MAX_ENTRIES', 800)
+# Posts still pending this long were left behind by a dead process.
+PENDING_GRACE = timedelta(seconds=getattr(settings, 'TIMELINE_PENDING_GRACE_SECONDS', 60))
+# Posts that feeds merge on read: not fanned out yet, or never will be.
+UNPUSHED = ('pending', 'pull')
+
+
+def is_fanout_on_read(user_id):
+    # Accounts with very many followers are merged into feeds at read time
+    # instead of writing one timeline row per follower on every post.
+    return UserProfile.objects.filter(user_id=user_id, followers_count__gte=FANOUT_FOLLOWER_LIMIT).exists()
+
+
+def _write(user_ids, post):
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post=post, created_at=post.created_at) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+
+
+def trim(user_ids):
+    """Drop the entries past the newest MAX_ENTRIES of each of ``user_ids``' timelines; returns how many."""
+    full = (
+        TimelineEntry.objects.filter(user_id__in=user_ids)
+        .values('user_id')
+        .annotate(entries=Count('id'))
+        .filter(entries__gt=MAX_ENTRIES)
+        .values_list('user_id', flat=True)
+    )
+    trimmed = 0
+    for user_id in list(full):
+        stale = list(
+            TimelineEntry.objects.filter(user_id=user_id)
+            .order_by('-created_at', '-post_id')
+            .values_list('id', flat=True)[MAX_ENTRIES:]
+        )
+        trimmed += TimelineEntry.objects.filter(id__in=stale).delete()[0]
+    return trimmed
+
+
+def trim_all(batch_size=BATCH_SIZE):
+    """``trim`` every timeline, ``batch_size`` users at a time; returns how many entries were dropped."""
+    trimmed = 0
+    batch = []
+    for user_id in User.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=batch_size):
+        batch.append(user_id)
+        if len(batch) >= batch_size:
+            trimmed += trim(batch)
+            batch = []
+    if batch:
+        trimmed += trim(batch)
+    return trimmed
+
+
+def fan_out_post(post):
+    """
+    Write ``post`` to its author's and followers' timelines, or, for
+    accounts over FANOUT_FOLLOWER_LIMIT, mark it to be merged on read. The
+    choice is stored on the post, so it stays right when the author's
+    follower count later changes.
+    """
+    _write([post.user_id], post)
+    fanout = 'pull' if is_fanout_on_read(post.user_id) else 'push'
+    if fanout == 'push':
+        follower_ids = Follow.objects.filter(following_id=post.user_id).values_list('follower_id', flat=True)
+        batch = []
+        for follower_id in follower_ids.iterator(chunk_size=BATCH_SIZE):
+            batch.append(follower_id)
+            if len(batch) >= BATCH_SIZE:
+                _write(batch, post)
+                batch = []
+        if batch:
+            _write(batch, post)
+    Post.objects.filter(pk=post.pk).update(timeline_fanout=fanout)
+    post.timeline_fanout = fanout
+
+
+def fan_out_posts(post_ids):
+    for post in Post.objects.filter(id__in=post_ids, timeline_fanout='pending').only('id', 'user_id', 'created_at'):
+        fan_out_post(post)
+
+
+_worker = BatchWorker(fan_out_posts, batch_size=100, name='timeline-fanout-worker')
+
+
+def enqueue(post):
+    """
+    Fan ``post`` out off the request path (TIMELINE_QUEUE = 'memory'). The
+    author sees it at once; until it is fanned out, followers' feeds merge
+    it on read.
+    """
+    if getattr(settings, 'TIMELINE_QUEUE', 'memory') == 'memory':
+        _write([post.user_id], post)
+        transaction.on_commit(lambda: _worker.submit(post.id))
+    else:
+        fan_out_post(post)
+
+
+def flush():
+    """Fan out posts still queued in this process."""
+    _worker.flush()
+
+
+def fan_out_pending(grace=PENDING_GRACE):
+    """Fan out posts still pending after ``grace``, left by a process that died; returns how many."""
+    posts = Post.objects.filter(timeline_fanout='pending', created_at__lt=timezone.now() - grace)
+    fanned_out = 0
+    for post in posts.only('id', 'user_id', 'created_at').iterator(chunk_size=BATCH_SIZE):
+        fan_out_post(post)
+        fanned_out += 1
+    return fanned_out
+
+
+def backfill(follower, following):
+    # Bounded, so it is written even for accounts whose new posts are merged on read.
+    posts = Post.objects.filter(user=following).only('id', 'created_at')[:BACKFILL_LIMIT]
+    entries = [TimelineEntry(user=follower, post=post, created_at=post.created_at) for post in posts]
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True, batch_size=BATCH_SIZE)
+
+
+def prune(follower, following):
+    TimelineEntry.objects.filter(user=follower, post__user=following).delete()
+
+
+def fanout_on_read_author_ids(user):
+    """Followed accounts with posts that are not in ``user``'s timeline: pending, or merged on read."""
+    return (
+        Post.objects.filter(
+            user_id__in=Follow.objects.filter(follower=user).values('following_id'), timeline_fanout__in=UNPUSHED
+        )
+        .order_by()
+        .values_list('user_id', flat=True)
+        .distinct()
+    )
+
+
+def timeline_page(user, cursor=None, limit=20):
+    """Up to ``limit`` of ``user``'s timeline entries after ``cursor``, with the post, author and profile joined in."""
+    return (
+        after_cursor(TimelineEntry.objects.filter(user=user), 'created_at', cursor, tiebreak='post_id')
+        .select_related('post__user__profile')
+        .annotate(viewer_has_liked=Exists(Like.objects.filter(user=user, post=OuterRef('post_id'))))
+        .order_by('-created_at', '-post_id')[:limit]
+    )
+
+
+def author_page(user, author_id, cursor=None, limit=20):
+    """Up to ``limit`` posts by ``author_id`` after ``cursor``, as seen by ``user``."""
+    return (
+        after_cursor(Post.objects.filter(user_id=author_id), 'created_at', cursor)
+        .select_related('user__profile')
+        .annotate(viewer_has_liked=Exists(Like.objects.filter(user=user, post=OuterRef('pk'))))
+        .order_by('-created_at', '-id')[:limit]
+    )
+
+
+def feed_page(user, cursor=None, limit=20):
+    """
+    Up to ``limit`` posts of ``user``'s feed after ``cursor`` (a
+    ``(created_at, post_id)`` pair), newest first.
+
+    The page is a keyset range of the user's timeline entries, merged with
+    the same range of each followed account that is fanned out on read:
+    one bounded index range per query, where a single query over all of
+    them would sort every post of those accounts.
+    """
+    posts = {}
+    for entry in timeline_page(user, cursor, limit):
+        entry.post.viewer_has_liked = entry.viewer_has_liked
+        posts[entry.post_id] = entry.post
+    for author_id in fanout_on_read_author_ids(user):
+        # Posts the author made while under the fan-out limit are in both.
+        for post in author_page(user, author_id, cursor, limit):
+            posts.setdefault(post.id, post)
+    return sorted(posts.values(), key=lambda post: (post.created_at, post.id), reverse=True)[:limit]
@@ -0,0 +1,139 @@
+from io import BytesIO
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image
+from rest_framework import exceptions, status
+
+MAX_BYTES = getattr(settings, 'IMAGE_UPLOAD_MAX_BYTES', 20 * 1024 * 1024)
+MAX_PIXELS = getattr(settings, 'IMAGE_UPLOAD_MAX_PIXELS', 50_000_000)
+FORMATS = getattr(settings, 'IMAGE_UPLOAD_FORMATS', ('JPEG', 'PNG', 'WEBP', 'GIF'))
+# Room for the multipart framing and the form's other fields.
+FORM_OVERHEAD = 64 * 1024
+# EXIF blocks and embedded thumbnails come before the JPEG frame header, so
+# the dimensions may only be known after a few chunks.
+HEADER_LIMIT = 256 * 1024
+
+SIGNATURES = {
+    b'\xff\xd8\xff': 'JPEG',
+    b'\x89PNG\r\n\x1a\n': 'PNG',
+    b'GIF87a': 'GIF',
+    b'GIF89a': 'GIF',
+}
+INVALID_IMAGE = 'Upload a valid image. The file you uploaded was either not an image or a corrupted image.'
+
+
+class UploadTooLarge(exceptions.APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = f'Uploads are limited to {MAX_BYTES // (1024 * 1024)} MB.'
+    default_code = 'upload_too_large'
+
+
+def sniff(header):
+    """Return the image format announced by the first bytes of a file, or None."""
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'WEBP'
+    for signature, image_format in SIGNATURES.items():
+        if header.startswith(signature):
+            return image_format
+    return None
+
+
+def webp_dimensions(header):
+    """
+    ``(width, height)`` from the first chunk of a WebP file, or None. Pillow
+    cannot open a WebP cut off before its end, so the header is read here.
+    """
+    if len(header) < 30:
+        return None
+    chunk = header[12:16]
+    if chunk == b'VP8X':
+        # Extended format: 24-bit canvas width and height, minus one.
+        return (int.from_bytes(header[24:27], 'little') + 1, int.from_bytes(header[27:30], 'little') + 1)
+    if chunk == b'VP8 ' and header[23:26] == b'\x9d\x01\x2a':
+        # Lossy key frame: 14-bit width and height after the start code.
+        return (int.from_bytes(header[26:28], 'little') & 0x3fff, int.from_bytes(header[28:30], 'little') & 0x3fff)
+    if chunk == b'VP8L' and header[20] == 0x2f:
+        # Lossless: 14-bit width and height, minus one, packed after the signature.
+        bits = int.from_bytes(header[21:25], 'little')
+        return ((bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1)
+    return None
+
+
+def dimensions(header):
+    """Read ``(width, height)`` from the start of an image without decoding it; None if more bytes are needed."""
+    if sniff(header) == 'WEBP':
+        return webp_dimensions(header)
+    try:
+        with Image.open(BytesIO(header), formats=FORMATS) as image:
+            return image.size
+    except Image.DecompressionBombError:
+        return (MAX_PIXELS + 1, 1)
+    except (OSError, EOFError, ValueError):
+        return None
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """
+    Reject oversized or invalid images while the request body is still arriving.
+
+    Installed in front of Django's memory and temporary-file handlers, which
+    keep storing the chunks this handler passes through. The request fails
+    as soon as the declared or received size passes IMAGE_UPLOAD_MAX_BYTES,
+    the first bytes are not a supported image, or the header declares more
+    than IMAGE_UPLOAD_MAX_PIXELS, without reading the rest of the body.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > MAX_BYTES + FORM_OVERHEAD:
+            raise UploadTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = b''
+        self.image_format = None
+        self.size = None
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > MAX_BYTES:
+            raise UploadTooLarge()
+        if self.size is None:
+            self.header += raw_data[:HEADER_LIMIT - len(self.header)]
+            self.inspect(complete=len(self.header) >= HEADER_LIMIT)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.size is None:
+            self.inspect(complete=True)
+        # Let the next handler build the uploaded file.
+        return None
+
+    def inspect(self, complete):
+        if self.image_format is None:
+            if len(self.header) < 12 and not complete:
+                return
+            self.image_format = sniff(self.header)
+            if self.image_format not in FORMATS:
+                self.reject(INVALID_IMAGE)
+        size = dimensions(self.header)
+        if size is None:
+            if complete:
+                self.reject(INVALID_IMAGE)
+            return
+        self.size = size
+        self.header = b''
+        if size[0] * size[1] > MAX_PIXELS:
+            self.reject(f'Images are limited to {MAX_PIXELS // 1_000_000} megapixels.')
+
+    def reject(self, message):
+        raise exceptions.ValidationError({self.field_name: [message]})
+
+
+class ImageUploadMixin:
+    """Validate image uploads with ImageUploadHandler as they are received."""
+
+    def initial(self, request, *args, **kwargs):
+        if request.method in ('POST', 'PUT', 'PATCH'):
+            request.upload_handlers.insert(0, ImageUploadHandler(request))
+        super().initial(request, *args, **kwargs)
@@ -26,6 +26,9 @@ urlpatterns = [
     path('posts/<int:post_id>/comments/', views.CommentListCreateView.as_view(), name='post-comments'),
     
     path('stories/', views.StoryListCreateView.as_view(), name='stories'),
+    path('stories/tray/', views.StoryTrayView.as_view(), name='story-tray'),
+    path('stories/<int:story_id>/view/', views.mark_story_viewed, name='mark-story-viewed'),
+    path('stories/<int:story_id>/viewers/', views.StoryViewersView.as_view(), name='story-viewers'),
     path('stories/user/<int:user_id>/', views.UserStoriesView.as_view(), name='user-stories'),
     path('stories/my/', views.UserStoriesView.as_view(), name='my-stories'),
     
@@ -37,4 +40,9 @@ urlpatterns = [
     path('notifications/', views.NotificationListView.as_view(), name='notifications'),
     path('notifications/<int:notification_id>/read/', views.mark_notification_read, name='mark-notification-read'),
     path('notifications/read-all/', views.mark_all_notifications_read, name='mark-all-notifications-read'),
+    path('notifications/unread-count/', views.unread_notification_count, name='unread-notification-count'),
+    path('notifications/groups/', views.NotificationGroupListView.as_view(), name='notification-groups'),
+    path('notifications/groups/<int:group_id>/read/', views.mark_notification_group_read, name='mark-notification-group-read'),
+    
+    path('cache/stats/', views.cache_stats, name='cache-stats'),
 ]
\ No newline at end of file
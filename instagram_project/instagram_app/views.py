@@ -4,16 +4,22 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.http import parse_etags
 from datetime import timedelta
-from .models import Post, Like, Comment, Follow, Notification, UserProfile, Story
+from .models import Post, Like, Comment, Follow, Notification, NotificationGroup, UserProfile, Story, StoryView
 from .serializers import (
-    UserRegistrationSerializer, UserLoginSerializer, UserSerializer,
+    UserRegistrationSerializer, UserLoginSerializer, UserSerializer, UserSearchHitSerializer,
     PostSerializer, PostCreateSerializer, CommentSerializer, 
-    FollowSerializer, NotificationSerializer, UserProfileSerializer,
-    StorySerializer, StoryCreateSerializer
+    FollowSerializer, NotificationSerializer, NotificationGroupSerializer, UserProfileSerializer,
+    StorySerializer, StoryCreateSerializer, StoryTraySerializer, StoryViewerSerializer
 )
+from . import counters, image_jobs, notifications, search, stories, timeline
+from . import cache as response_cache
+from .cache import CachedResponseMixin
+from .uploads import ImageUploadMixin
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -47,17 +53,27 @@ class LoginView(APIView):
             'access': str(refresh.access_token),
         })
 
-class ProfileView(generics.RetrieveUpdateAPIView):
+def _target_user_id(view):
+    return view.kwargs.get('user_id') or view.request.user.id
+
+class ProfileView(CachedResponseMixin, generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_cache_dependencies(self):
+        return [('user', _target_user_id(self)), ('user', self.request.user.id)]
+
     def get_object(self):
         user_id = self.kwargs.get('user_id')
         if user_id:
             return get_object_or_404(User, id=user_id)
         return self.request.user
 
-class ProfilePictureUpdateView(generics.UpdateAPIView):
+    def perform_update(self, serializer):
+        user = serializer.save()
+        response_cache.bump('user', user.id)
+
+class ProfilePictureUpdateView(ImageUploadMixin, generics.UpdateAPIView):
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -65,17 +81,21 @@ class ProfilePictureUpdateView(generics.UpdateAPIView):
         profile, created = UserProfile.objects.get_or_create(user=self.request.user)
         return profile
 
-class UserSearchView(generics.ListAPIView):
-    serializer_class = UserSerializer
+    def perform_update(self, serializer):
+        serializer.save()
+        response_cache.bump('user', self.request.user.id)
+
+class UserSearchView(CachedResponseMixin, generics.ListAPIView):
+    serializer_class = UserSearchHitSerializer
     permission_classes = [permissions.IsAuthenticated]
+    replica_reads = True
+    pagination_class = None
+    # Keyed by query and searcher; following or unfollowing bumps the
+    # searcher's version.
+    cache_timeout = search.CACHE_TIMEOUT
 
     def get_queryset(self):
-        query = self.request.query_params.get('q', '')
-        if query:
-            return User.objects.filter(
-                username__icontains=query
-            ).exclude(id=self.request.user.id)[:10]
-        return User.objects.none()
+        return search.rank(self.request.query_params.get('q', ''), self.request.user)
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -85,17 +105,19 @@ def follow_user(request, user_id):
     if user_to_follow == request.user:
         return Response({'error': 'Cannot follow yourself'}, status=status.HTTP_400_BAD_REQUEST)
     
-    follow, created = Follow.objects.get_or_create(
-        follower=request.user,
-        following=user_to_follow
-    )
+    with transaction.atomic():
+        follow, created = Follow.objects.get_or_create(
+            follower=request.user,
+            following=user_to_follow
+        )
+        if created:
+            counters.adjust_profile(request.user.id, following_count=1)
+            counters.adjust_profile(user_to_follow.id, followers_count=1)
+            response_cache.bump('user', request.user.id, user_to_follow.id)
     
     if created:
-        Notification.objects.get_or_create(
-            recipient=user_to_follow,
-            sender=request.user,
-            notification_type='follow'
-        )
+        timeline.backfill(request.user, user_to_follow)
+        notifications.notify(user_to_follow, request.user, 'follow')
         return Response({'message': 'Successfully followed user', 'following': True}, status=status.HTTP_201_CREATED)
     else:
         return Response({'message': 'Already following this user', 'following': True}, status=status.HTTP_200_OK)
@@ -107,7 +129,12 @@ def unfollow_user(request, user_id):
     
     try:
         follow = Follow.objects.get(follower=request.user, following=user_to_unfollow)
-        follow.delete()
+        with transaction.atomic():
+            if follow.delete()[0]:
+                counters.adjust_profile(request.user.id, following_count=-1)
+                counters.adjust_profile(user_to_unfollow.id, followers_count=-1)
+                response_cache.bump('user', request.user.id, user_to_unfollow.id)
+        timeline.prune(request.user, user_to_unfollow)
         return Response({'message': 'Successfully unfollowed user', 'following': False}, status=status.HTTP_200_OK)
     except Follow.DoesNotExist:
         return Response({'error': 'Not following this user', 'following': False}, status=status.HTTP_400_BAD_REQUEST)
@@ -119,9 +146,22 @@ def check_follow_status(request, user_id):
     is_following = Follow.objects.filter(follower=request.user, following=user_to_check).exists()
     return Response({'following': is_following})
 
-class FollowersListView(generics.ListAPIView):
+class FollowListView(CachedResponseMixin, generics.ListAPIView):
+    """
+    Users on one side of a user's follows, most recently followed first.
+
+    Pages the Follow rows themselves, so each page is a range of the
+    ``(<user>, created_at, id)`` index named by the subclass.
+    """
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = '-created_at'
+    # Follow field holding the user whose list this is, and the listed side.
+    owner_field = None
+    listed_field = None
+
+    def get_cache_dependencies(self):
+        return [('user', _target_user_id(self)), ('user', self.request.user.id)]
 
     def get_queryset(self):
         user_id = self.kwargs.get('user_id')
@@ -129,30 +169,27 @@ class FollowersListView(generics.ListAPIView):
             user = get_object_or_404(User, id=user_id)
         else:
             user = self.request.user
-        
-        follower_ids = Follow.objects.filter(following=user).values_list('follower', flat=True)
-        return User.objects.filter(id__in=follower_ids)
+        return Follow.objects.filter(**{self.owner_field: user}).select_related(f'{self.listed_field}__profile')
 
-class FollowingListView(generics.ListAPIView):
-    serializer_class = UserSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    def list(self, request, *args, **kwargs):
+        follows = self.paginate_queryset(self.get_queryset())
+        users = [getattr(follow, self.listed_field) for follow in follows]
+        return self.get_paginated_response(self.get_serializer(users, many=True).data)
 
-    def get_queryset(self):
-        user_id = self.kwargs.get('user_id')
-        if user_id:
-            user = get_object_or_404(User, id=user_id)
-        else:
-            user = self.request.user
-        
-        following_ids = Follow.objects.filter(follower=user).values_list('following', flat=True)
-        return User.objects.filter(id__in=following_ids)
+class FollowersListView(FollowListView):
+    owner_field = 'following'
+    listed_field = 'follower'
+
+class FollowingListView(FollowListView):
+    owner_field = 'follower'
+    listed_field = 'following'
 
-class PostListCreateView(generics.ListCreateAPIView):
+class PostListCreateView(ImageUploadMixin, generics.ListCreateAPIView):
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Post.objects.all()
+        return PostSerializer.prepare_queryset(Post.objects.all(), self.request)
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -165,26 +202,47 @@ class PostListCreateView(generics.ListCreateAPIView):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        post = serializer.save(user=request.user)
+        with transaction.atomic():
+            post = serializer.save(user=request.user, image_state='processing')
+            image_jobs.enqueue(post)
+            counters.adjust_profile(request.user.id, posts_count=1)
+            response_cache.bump('user', request.user.id)
+        timeline.enqueue(post)
         return Response(PostSerializer(post, context={'request': request}).data, status=status.HTTP_201_CREATED)
 
-class PostDetailView(generics.RetrieveAPIView):
-    queryset = Post.objects.all()
+class PostDetailView(CachedResponseMixin, generics.RetrieveAPIView):
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_cache_dependencies(self):
+        # The author's name and picture are part of the response.
+        author_id = Post.objects.filter(pk=self.kwargs['pk']).values_list('user_id', flat=True).first()
+        return [('post', self.kwargs['pk']), ('user', author_id), ('user', self.request.user.id)]
+
+    def get_queryset(self):
+        return PostSerializer.prepare_queryset(Post.objects.all(), self.request)
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'image_variant': 'full'}
+
 class FeedView(generics.ListAPIView):
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
+    replica_reads = True
 
-    def get_queryset(self):
-        user = self.request.user
-        following_users = Follow.objects.filter(follower=user).values_list('following', flat=True)
-        return Post.objects.filter(user__in=list(following_users) + [user.id])
+    def list(self, request, *args, **kwargs):
+        posts = self.paginator.paginate_rows(
+            lambda cursor, limit: timeline.feed_page(request.user, cursor, limit), request, 'created_at'
+        )
+        return self.get_paginated_response(self.get_serializer(posts, many=True).data)
 
-class UserPostsView(generics.ListAPIView):
+class UserPostsView(CachedResponseMixin, generics.ListAPIView):
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
+    replica_reads = True
+
+    def get_cache_dependencies(self):
+        return [('user', _target_user_id(self)), ('user', self.request.user.id)]
 
     def get_queryset(self):
         user_id = self.kwargs.get('user_id')
@@ -192,33 +250,29 @@ class UserPostsView(generics.ListAPIView):
             user = get_object_or_404(User, id=user_id)
         else:
             user = self.request.user
-        return Post.objects.filter(user=user)
+        return PostSerializer.prepare_queryset(Post.objects.filter(user=user), self.request)
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def toggle_like(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     
-    like, created = Like.objects.get_or_create(user=request.user, post=post)
+    with transaction.atomic():
+        like, created = Like.objects.get_or_create(user=request.user, post=post)
+        if created:
+            counters.adjust_post(post.id, likes_count=1)
+        elif like.delete()[0]:
+            counters.adjust_post(post.id, likes_count=-1)
+        response_cache.bump('post', post.id)
+        response_cache.bump('user', post.user_id, request.user.id)
     
     if created:
         if post.user != request.user:
-            Notification.objects.get_or_create(
-                recipient=post.user,
-                sender=request.user,
-                notification_type='like',
-                post=post
-            )
+            notifications.notify(post.user, request.user, 'like', post)
         return Response({'message': 'Post liked', 'liked': True}, status=status.HTTP_201_CREATED)
     else:
-        like.delete()
         if post.user != request.user:
-            Notification.objects.filter(
-                recipient=post.user,
-                sender=request.user,
-                notification_type='like',
-                post=post
-            ).delete()
+            notifications.retract(post.user, request.user, 'like', post)
         return Response({'message': 'Post unliked', 'liked': False}, status=status.HTTP_200_OK)
 
 class CommentListCreateView(generics.ListCreateAPIView):
@@ -227,24 +281,24 @@ class CommentListCreateView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         post_id = self.kwargs['post_id']
-        return Comment.objects.filter(post_id=post_id)
+        return Comment.objects.filter(post_id=post_id).select_related('user__profile')
 
     def perform_create(self, serializer):
         post_id = self.kwargs['post_id']
         post = get_object_or_404(Post, id=post_id)
-        comment = serializer.save(user=self.request.user, post=post)
+        with transaction.atomic():
+            comment = serializer.save(user=self.request.user, post=post)
+            counters.adjust_post(post.id, comments_count=1)
+            response_cache.bump('post', post.id)
+            response_cache.bump('user', post.user_id)
         
         if post.user != self.request.user:
-            Notification.objects.get_or_create(
-                recipient=post.user,
-                sender=self.request.user,
-                notification_type='comment',
-                post=post
-            )
-
-class StoryListCreateView(generics.ListCreateAPIView):
+            notifications.notify(post.user, self.request.user, 'comment', post)
+
+class StoryListCreateView(ImageUploadMixin, generics.ListCreateAPIView):
     serializer_class = StorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
 
     def get_queryset(self):
         user = self.request.user
@@ -252,7 +306,7 @@ class StoryListCreateView(generics.ListCreateAPIView):
         return Story.objects.filter(
             user__in=list(following_users) + [user.id],
             expires_at__gt=timezone.now()
-        ).order_by('-created_at')
+        ).select_related('user__profile').order_by('-created_at')
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -261,11 +315,44 @@ class StoryListCreateView(generics.ListCreateAPIView):
 
     def perform_create(self, serializer):
         expires_at = timezone.now() + timedelta(hours=24)
-        serializer.save(user=self.request.user, expires_at=expires_at)
+        with transaction.atomic():
+            story = serializer.save(user=self.request.user, expires_at=expires_at, image_state='processing')
+            image_jobs.enqueue(story)
+        stories.invalidate_trays(self.request.user.id)
+
+class StoryTrayView(CachedResponseMixin, generics.ListAPIView):
+    serializer_class = StoryTraySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+    cache_timeout = stories.TRAY_CACHE_TIMEOUT
+
+    def get_cache_dependencies(self):
+        return [('tray', self.request.user.id)]
+
+    def get_queryset(self):
+        return stories.tray(self.request.user)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def mark_story_viewed(request, story_id):
+    story = get_object_or_404(Story, id=story_id, expires_at__gt=timezone.now())
+    stories.record_view(story, request.user)
+    return Response({'message': 'Story viewed'})
+
+class StoryViewersView(generics.ListAPIView):
+    serializer_class = StoryViewerSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = '-viewed_at'
+
+    def get_queryset(self):
+        # Only the author may list a story's viewers.
+        story = get_object_or_404(Story, id=self.kwargs['story_id'], user=self.request.user)
+        return StoryView.objects.filter(story=story).select_related('viewer__profile')
 
 class UserStoriesView(generics.ListAPIView):
     serializer_class = StorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
 
     def get_queryset(self):
         user_id = self.kwargs.get('user_id')
@@ -273,28 +360,63 @@ class UserStoriesView(generics.ListAPIView):
             user = get_object_or_404(User, id=user_id)
         else:
             user = self.request.user
-        return Story.objects.filter(user=user, expires_at__gt=timezone.now())
+        # Stories expire a fixed time after creation, so newest first is
+        # latest expiry first: the order of story_user_expires_idx.
+        return (
+            Story.objects.filter(user=user, expires_at__gt=timezone.now())
+            .select_related('user__profile')
+            .order_by('-expires_at', '-id')
+        )
 
 class NotificationListView(generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    replica_reads = True
 
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user)
+        return Notification.objects.filter(recipient=self.request.user).select_related('sender__profile', 'post')
+
+class NotificationGroupListView(generics.ListAPIView):
+    serializer_class = NotificationGroupSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    replica_reads = True
+    keyset_ordering = '-latest_at'
+
+    def get_queryset(self):
+        return NotificationGroup.objects.filter(recipient=self.request.user).select_related('post')
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def mark_notification_group_read(request, group_id):
+    if notifications.mark_group_read(request.user, group_id):
+        return Response({'message': 'Notifications marked as read'})
+    return Response({'error': 'Notification group not found'}, status=status.HTTP_404_NOT_FOUND)
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def mark_notification_read(request, notification_id):
-    try:
-        notification = Notification.objects.get(id=notification_id, recipient=request.user)
-        notification.is_read = True
-        notification.save()
+    if notifications.mark_read(request.user, notification_id):
         return Response({'message': 'Notification marked as read'})
-    except Notification.DoesNotExist:
-        return Response({'error': 'Notification not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({'error': 'Notification not found'}, status=status.HTTP_404_NOT_FOUND)
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def mark_all_notifications_read(request):
-    Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
-    return Response({'message': 'All notifications marked as read'})
\ No newline at end of file
+    notifications.mark_all_read(request.user)
+    return Response({'message': 'All notifications marked as read'})
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def unread_notification_count(request):
+    count = notifications.unread_count(request.user)
+    # The body is just the count, so the count itself is a strong validator.
+    etag = f'"unread-{count}"'
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response({'unread_count': count}, headers=headers)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def cache_stats(request):
+    return Response(response_cache.stats())
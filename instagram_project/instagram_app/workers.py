@@ -0,0 +1,79 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWorker:
+    """
+    In-process background worker that hands queued items to ``handler`` in batches.
+
+    A daemon thread collects items until ``batch_size`` is reached or
+    ``flush_interval`` seconds have passed since the first item of the batch,
+    then calls ``handler(items)`` off the request path. Pending items are
+    flushed at interpreter exit.
+    """
+
+    def __init__(self, handler, batch_size=500, flush_interval=1.0, name='batch-worker'):
+        self.handler = handler
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def submit(self, item):
+        self._ensure_started()
+        self._queue.put(item)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect(self, first):
+        items = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(items) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _drain(self):
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                return items
+
+    def _handle(self, items):
+        close_old_connections()
+        try:
+            self.handler(items)
+        except Exception:
+            logger.exception('%s failed to process a batch of %d items', self.name, len(items))
+        finally:
+            close_old_connections()
+
+    def _run(self):
+        while True:
+            self._handle(self._collect(self._queue.get()))
+
+    def flush(self):
+        """Process everything queued so far in the calling thread."""
+        items = self._drain()
+        for start in range(0, len(items), self.batch_size):
+            self._handle(items[start:start + self.batch_size])
@@ -13,4 +13,22 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'instagram_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from instagram_app import image_jobs  # noqa: E402 (needs apps loaded)
+from instagram_app.realtime import STREAM_PATH, get_broker, notification_stream  # noqa: E402
+
+# Fail at startup, not on the first stream, if the broker cannot work with
+# the configured notification queue.
+get_broker()
+# Pick up image jobs that a crashed server process left unfinished.
+image_jobs.resume()
+
+
+async def application(scope, receive, send):
+    # The notification stream is a long-lived Server-Sent Events response,
+    # served directly so it holds an open connection rather than a worker thread.
+    if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+        await notification_stream(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
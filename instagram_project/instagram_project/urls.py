@@ -14,10 +14,11 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.urls import path, include
+import re
+from django.urls import path, include, re_path
 from django.http import HttpResponse
 from django.conf import settings
-from django.conf.urls.static import static
+from instagram_app.serving import serve_media
 
 def home(request):
     return HttpResponse('''
@@ -55,8 +56,7 @@ urlpatterns = [
     path('api/', include('instagram_app.urls')),
     path('app/', include('instagram_app.frontend_urls')),
     path('', home, name='home'),
+    # Media is served with validators, byte ranges and long-lived caching;
+    # set MEDIA_SERVE_MODE to hand the bytes off to the front-end server.
+    re_path(rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}(?P<path>.*)$', serve_media, name='media'),
 ]
-
-# Serve media files during development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'instagram_project.settings')
 
 application = get_wsgi_application()
+
+from instagram_app import image_jobs  # noqa: E402 (needs apps loaded)
+
+# Pick up image jobs that a crashed server process left unfinished.
+image_jobs.resume()